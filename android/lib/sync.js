@@ -6,6 +6,9 @@ import { Q } from '@nozbe/watermelondb';
 
 let isSyncing = false;
 
+// Must stay <= MAX_BATCH_SIZE in backend/data_collection/services.py
+const SYNC_BATCH_SIZE = 200;
+
 // Pushes locally created reports to the server
 export const syncPendingReports = async () => {
   if (isSyncing) return;
@@ -25,25 +28,43 @@ export const syncPendingReports = async () => {
       return;
     }
 
-    for (const report of pendingReports) {
+    // Upload queued reports in batches instead of one request per report
+    for (let start = 0; start < pendingReports.length; start += SYNC_BATCH_SIZE) {
+        const chunk = pendingReports.slice(start, start + SYNC_BATCH_SIZE);
+
         // Exclude internal fields before sending to API
-        const reportData = {
+        const payload = chunk.map(report => ({
             patient_name: report.patient_name, age: report.age, gender: report.gender,
             symptoms: report.symptoms, severity: report.severity, water_source: report.water_source,
             treatment_given: report.treatment_given, state: report.state, district: report.district,
-            village: report.village, asha_worker_id: report.asha_worker_id,
+            village: report.village, village_id: report.village_id, asha_worker_id: report.asha_worker_id,
             date_of_reporting: report.date_of_reporting,
-        };
-        
-        const response = await api.post('/data_collection/health-reports/', reportData);
+            // UUID assigned when the report was saved offline; makes retries idempotent
+            client_submission_id: report.client_submission_id,
+        }));
 
-        // Mark the local report as 'synced' and store its server-side ID
+        // 207 = some rows failed validation, those stay pending; 200 = whole batch was a replay
+        const response = await api.post('/data_collection/health-reports/batch/', { reports: payload }, {
+            validateStatus: status => [200, 201, 207, 400].includes(status),
+        });
+        const results = response.data.results || [];
+
+        // Mark the synced local reports and store their server-side IDs
         await database.write(async () => {
-          await report.update(record => {
-            record.status = 'synced';
-            record.remote_id = response.data.id;
-          });
+          const updates = results
+            .filter(result => result.status === 'created' || result.status === 'duplicate')
+            .map(result => chunk[result.index].prepareUpdate(record => {
+              record.status = 'synced';
+              record.remote_id = result.report_id;
+            }));
+          if (updates.length > 0) {
+            await database.batch(...updates);
+          }
         });
+
+        results
+          .filter(result => result.status === 'error')
+          .forEach(result => console.warn(`Report ${chunk[result.index].id} rejected:`, result.errors));
     }
   } catch (error) {
     console.error('Failed to sync pending reports:', error);
@@ -52,48 +73,69 @@ export const syncPendingReports = async () => {
   }
 };
 
-// Fetches the latest reports from the server and updates the local DB
+const LAST_PULLED_AT_KEY = 'reports_last_pulled_at';
+
+// Fetches only the reports changed since the last pull and applies them to the local DB
 export const pullLatestReports = async (user) => {
     if (!user) return;
     const netState = await NetInfo.fetch();
     if (!netState.isConnected) return;
 
-    console.log("Pulling latest reports from server...");
+    console.log("Pulling report changes from server...");
     try {
-        const response = await api.get('/data_collection/aasha_worker_reports/', {
-            params: { asha_worker_id: user.user_id, reportPeriod: 'total' },
+        const lastPulledAt = await database.localStorage.get(LAST_PULLED_AT_KEY);
+        const response = await api.get('/data_collection/sync/pull/', {
+            params: { asha_worker_id: user.user_id, last_pulled_at: lastPulledAt || undefined },
         });
-        const serverReports = response.data.reports;
+        const { changes, timestamp } = response.data;
+        const { created, updated, deleted } = changes.reports;
         const reportsCollection = database.collections.get('reports');
 
+        const applyServerFields = (r, report) => {
+            r.remote_id = report.report_id;
+            r.patient_name = report.patient_name;
+            r.age = report.age;
+            r.gender = report.gender;
+            r.symptoms = report.symptoms;
+            r.severity = report.severity;
+            r.water_source = report.water_source;
+            r.treatment_given = report.treatment_given;
+            r.state = report.state || user.state;
+            r.district = report.district || user.district;
+            r.village = report.village || user.village;
+            r.asha_worker_id = report.asha_worker_id || user.user_id;
+            r.date_of_reporting = report.date_of_reporting;
+            r.status = 'synced';
+        };
+
         await database.write(async () => {
-            // A simple but effective sync strategy: find which server reports are missing locally
-            const localReports = await reportsCollection.query().fetch();
-            const localRemoteIds = new Set(localReports.map(r => r.remote_id));
-
-            const newReportsToCreate = serverReports
-                .filter(serverReport => !localRemoteIds.has(serverReport.id))
-                .map(report => reportsCollection.prepareCreate(r => {
-                    r.remote_id = report.id;
-                    r.patient_name = report.patient_name;
-                    r.age = report.age;
-                    r.gender = report.gender;
-                    r.symptoms = report.symptoms;
-                    r.severity = report.severity;
-                    r.water_source = report.water_source;
-                    r.state = report.state || user.state;
-                    r.district = report.district || user.district;
-                    r.village = report.village || user.village;
-                    r.asha_worker_id = report.asha_worker_id || user.user_id;
-                    r.date_of_reporting = report.date_of_reporting;
-                    r.status = 'synced';
-                }));
-            
-            if (newReportsToCreate.length > 0) {
-                await database.batch(...newReportsToCreate);
-                console.log(`Synced ${newReportsToCreate.length} new reports from server.`);
+            // Only the rows touched by this pull are looked up locally
+            const changedIds = [...created, ...updated].map(report => report.report_id)
+                .concat(deleted.map(Number));
+            const localReports = changedIds.length > 0
+                ? await reportsCollection.query(Q.where('remote_id', Q.oneOf(changedIds))).fetch()
+                : [];
+            const localByRemoteId = new Map(localReports.map(r => [r.remote_id, r]));
+
+            const operations = [];
+            for (const report of [...created, ...updated]) {
+                const local = localByRemoteId.get(report.report_id);
+                operations.push(local
+                    ? local.prepareUpdate(r => applyServerFields(r, report))
+                    : reportsCollection.prepareCreate(r => applyServerFields(r, report)));
+            }
+            for (const remoteId of deleted) {
+                const local = localByRemoteId.get(Number(remoteId));
+                if (local) operations.push(local.prepareDestroyPermanently());
+            }
+
+            if (operations.length > 0) {
+                await database.batch(...operations);
+                console.log(`Applied ${operations.length} report changes from server.`);
             }
         });
+
+        await database.localStorage.set(LAST_PULLED_AT_KEY, timestamp);
     } catch (error) {
         console.error("Could not pull latest reports:", error);
     }
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:10
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_dashboards(apps, schema_editor):
+    # keep the newest row per village (highest id), the next refresh rewrites it anyway
+    VillageDashboard = apps.get_model('admindashboard', 'VillageDashboard')
+    keep_ids = VillageDashboard.objects.values('village_id').annotate(keep=Max('id')).values_list('keep', flat=True)
+    VillageDashboard.objects.exclude(id__in=list(keep_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admindashboard', '0003_villagedashboard_population'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_dashboards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='villagedashboard',
+            constraint=models.UniqueConstraint(fields=('village',), name='villagedashboard_unique_village'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admindashboard', '0004_villagedashboard_unique_village'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyVillage',
+            fields=[
+                ('village_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -50,8 +50,25 @@ class VillageDashboard(models.Model):
 
     class Meta:
         ordering = ["-last_aggregated_at"]
+        constraints = [
+            # one dashboard row per village, the aggregator upserts on it
+            models.UniqueConstraint(fields=["village"], name="villagedashboard_unique_village"),
+        ]
 
     def __str__(self):
         return f"{self.village.village_name} — {self.risk_level} ({self.risk_percentage or 0:.1f}%)"
 
+
+class DirtyVillage(models.Model):
+    """
+    Villages whose dashboard is stale: new reports / surveys / alerts arrived
+    after their VillageDashboard.last_aggregated_at. The refresh task
+    recomputes only these and then clears them.
+    """
+    village_id = models.IntegerField(primary_key=True)
+    marked_at = models.DateTimeField()  # last time something changed for this village
+
+    def __str__(self):
+        return f"village {self.village_id} dirty since {self.marked_at}"
+
 # Create your models here.
@@ -1,14 +1,17 @@
 # admindashboard/services.py
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-from django.db.models import Count, Q, Sum
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Lower, TruncMonth
 from django.utils.timezone import now
 from django.db import transaction
 
 # Import your real models (adjust import paths if your apps/models differ)
-from data_collection.models import HealthReport, ClinicReport, NgoSurvey, Village
+from data_collection.models import HealthReport, NgoSurvey, Village, VillageDailyRollup
+from data_collection.rollups import REPORTS, SOURCE_ASHA, SOURCE_CLINIC, SOURCE_NGO
+from data_collection.symptoms import SYMPTOM_BITS
 from prediction.models import EarlyWarningAlert  # rbalert source
-from .models import VillageDashboard
+from .models import DirtyVillage, VillageDashboard
 
 # ---------- Helper utilities ----------
 def normalize_symptom(s: str) -> str:
@@ -41,109 +44,161 @@ def parse_symptoms_text(txt: str):
     return [normalize_symptom(p) for p in parts]
 
 # ---------- Core aggregator ----------
-def aggregate_for_village(village_obj: Village, months_back: int = 6):
+# VillageDashboard columns rewritten on every refresh (created_at is kept)
+DASHBOARD_UPDATE_FIELDS = [
+    "total_cases", "total_deaths", "hospitalized_cases", "risk_level", "risk_percentage",
+    "latest_rb_alerts", "symptom_distribution", "severity_distribution", "monthly_trend",
+    "last_aggregated_at", "population", "latest_water_assessment_status",
+    "latest_water_assessment_date", "current_admissions", "critical_cases", "recovered_cases",
+    "completed_campaigns", "ongoing_campaigns", "planned_campaigns", "updated_at",
+]
+
+# villages handled per round of grouped queries
+AGGREGATE_CHUNK_SIZE = 2000
+
+
+def _new_metrics():
+    return {
+        "symptoms": Counter(),
+        "severity": Counter(),
+        "clinic": Counter(),
+        "ngo": Counter(),
+        "monthly": Counter(),
+        "health_count": 0,
+        "awareness_any": 0,
+        "water_risk": False,
+    }
+
+
+def _collect_metrics(villages, start_dt, end_dt):
     """
-    Aggregate data for one village and upsert into VillageDashboard.
-    months_back: how far back to pull for monthly trend and counts.
+    Raw numbers for a list of villages, with a fixed number of grouped queries
+    no matter how many villages there are:
+      rollups by (village, source, symptom, severity), rollups by (village, month),
+      free-text symptoms of the reports that had any, NGO flags by village,
+      and the latest rule-based alert per village name.
+    Latest NGO survey is annotated on the village query by the caller.
     """
-    end_dt = now()
-    start_dt = end_dt - timedelta(days=30 * months_back)
+    village_ids = [v.village_id for v in villages]
+    metrics = {vid: _new_metrics() for vid in village_ids}
 
-    # 1) HealthReports for this village
-    hq = HealthReport.objects.filter(village_id=village_obj.village_id, created_at__gte=start_dt, created_at__lte=end_dt)
-    health_count = hq.count()
-
-    # Parse symptoms and severity
-    symptom_counter = Counter()
-    severity_counter = Counter()
-    monthly_counter = Counter()
-
-    for hr in hq.iterator():
-        # Symptoms
-        for tok in parse_symptoms_text(hr.symptoms):
-            symptom_counter[tok] += 1
-
-        # Severity
-        sev = getattr(hr, "severity", None)
-        if sev:
-            severity_counter[sev] += 1
-
-        # Monthly trend key
-        dt = hr.date_of_reporting if getattr(hr, "date_of_reporting", None) else hr.created_at
-        if dt:
-            key = dt.strftime("%Y-%m")
-            monthly_counter[key] += 1
-
-    # 2) Clinic reports aggregates (they have numeric fields)
-    cq = ClinicReport.objects.filter(village=village_obj, created_at__gte=start_dt, created_at__lte=end_dt)
-    clinic_agg = cq.aggregate(
-        typhoid_sum=Sum("typhoid_cases"),
-        fever_sum=Sum("fever_cases"),
-        diarrhea_sum=Sum("diarrhea_cases"),
-        cholera_sum=Sum("cholera_cases"),
-        hospitalized_sum=Sum("hospitalized_cases"),
-        deaths_sum=Sum("deaths_reported"),
+    # 1) Pre-summed daily rollups (HealthReport / ClinicReport / NgoSurvey)
+    rollups = VillageDailyRollup.objects.filter(
+        village_id__in=village_ids, date__gte=start_dt.date(), date__lte=end_dt.date()
+    )
+    grouped = (
+        rollups.values("village_id", "source", "symptom", "severity")
+        .annotate(total=Sum("count"))
+        .order_by()
+    )
+    for row in grouped.iterator():
+        m = metrics[row["village_id"]]
+        if row["source"] == SOURCE_ASHA:
+            if row["symptom"] == REPORTS:
+                m["health_count"] += row["total"]
+                if row["severity"]:
+                    m["severity"][row["severity"]] += row["total"]
+            elif row["symptom"] != "Other":  # listed by name below
+                m["symptoms"][normalize_symptom(row["symptom"])] += row["total"]
+        elif row["source"] == SOURCE_CLINIC:
+            m["clinic"][row["symptom"]] += row["total"]
+        elif row["source"] == SOURCE_NGO:
+            m["ngo"][row["symptom"]] += row["total"]
+
+    # 1b) The rollups only know free-text symptoms as "Other"; the dashboard lists
+    #     them by name, so read just the reports that had one (partial index)
+    free_text = HealthReport.objects.filter(
+        village_id__in=village_ids, date_of_reporting__gte=start_dt.date(), date_of_reporting__lte=end_dt.date(),
+        other_symptom_count__gt=0,
+    ).values_list("village_id", "symptoms")
+    for village_id, text in free_text.iterator():
+        for entry in text.split(", "):  # the split encode_symptoms uses
+            if entry not in SYMPTOM_BITS:
+                for tok in parse_symptoms_text(entry):
+                    metrics[village_id]["symptoms"][tok] += 1
+
+    # 2) Monthly trend: health report count + clinic cases per month
+    monthly_rows = (
+        rollups.filter(
+            Q(source=SOURCE_ASHA, symptom=REPORTS)
+            | Q(source=SOURCE_CLINIC, symptom__in=["typhoid", "fever", "diarrhea", "cholera"])
+        )
+        .annotate(month=TruncMonth("date"))
+        .values("village_id", "month")
+        .annotate(total=Sum("count"))
+        .order_by()
     )
-    # safely convert None -> 0
-    clinic_counts = {k: (clinic_agg.get(k) or 0) for k in clinic_agg}
-
-    # add clinic counts into symptom_counter (map field names -> symptom keys)
-    symptom_counter["typhoid"] += clinic_counts["typhoid_sum"]
-    symptom_counter["fever"] += clinic_counts["fever_sum"]
-    symptom_counter["diarrhea"] += clinic_counts["diarrhea_sum"]
-    symptom_counter["cholera"] += clinic_counts["cholera_sum"]
-
-    # Add clinic monthly cases too (if clinic has created_at)
-    for cr in cq.iterator():
-        # sum the numeric cases to monthly trend
-        total_cases_this_clinic = (cr.typhoid_cases or 0) + (cr.fever_cases or 0) + (cr.diarrhea_cases or 0) + (cr.cholera_cases or 0)
-        if cr.created_at:
-            monthly_counter[cr.created_at.strftime("%Y-%m")] += total_cases_this_clinic
-
-    # 3) NGO surveys aggregates
-    nq = NgoSurvey.objects.filter(village=village_obj, created_at__gte=start_dt, created_at__lte=end_dt)
-    ngo_agg = nq.aggregate(
-        typhoid_sum=Sum("typhoid_cases"),
-        fever_sum=Sum("fever_cases"),
-        diarrhea_sum=Sum("diarrhea_cases"),
-        awareness_any=Count("id", filter=Q(awareness_campaigns=True))
+    for row in monthly_rows.iterator():
+        metrics[row["village_id"]]["monthly"][row["month"].strftime("%Y-%m")] += row["total"]
+
+    # 3) NGO survey flags (case numbers come from the rollups)
+    ngo_rows = (
+        NgoSurvey.objects.filter(village_id__in=village_ids, created_at__gte=start_dt, created_at__lte=end_dt)
+        .values("village_id")
+        .annotate(
+            awareness_any=Count("id", filter=Q(awareness_campaigns=True)),
+            unclean_water=Count("id", filter=Q(clean_drinking_water=False)),
+        )
+        .order_by()
     )
-    ngo_counts = {k: (ngo_agg.get(k) or 0) for k in ngo_agg}
-    symptom_counter["typhoid"] += ngo_counts["typhoid_sum"]
-    symptom_counter["fever"] += ngo_counts["fever_sum"]
-    symptom_counter["diarrhea"] += ngo_counts["diarrhea_sum"]
-
-    # 4) Rule-based alerts (raw text) - get latest for village
-    latest_rb = EarlyWarningAlert.objects.filter(
-        village_name__iexact=village_obj.village_name
-    ).order_by("-created_at").first()
-    latest_rb_text = latest_rb.rbalert if latest_rb else ""
-
-    # 5) Compose final numbers
+    for row in ngo_rows:
+        m = metrics[row["village_id"]]
+        m["awareness_any"] = row["awareness_any"]
+        m["water_risk"] = row["unclean_water"] > 0
+
+    return metrics
+
+
+def _latest_rb_alerts(villages):
+    """
+    {lowercased village name: rbalert text of its newest EarlyWarningAlert}
+    Two queries: newest alert id per name, then the texts for those ids.
+    """
+    names = {v.village_name.lower() for v in villages}
+    latest_ids = (
+        EarlyWarningAlert.objects.annotate(name=Lower("village_name"))
+        .filter(name__in=names)
+        .values("name")
+        .annotate(latest_id=Max("id"))
+        .values_list("latest_id", flat=True)
+    )
+    return {
+        name.lower(): text
+        for name, text in EarlyWarningAlert.objects.filter(id__in=list(latest_ids)).values_list("village_name", "rbalert")
+    }
+
+
+def _score_village(village, m, rb_text, months, aggregated_at):
+    """Turn one village's raw numbers into an (unsaved) VillageDashboard row"""
+    symptom_counter = m["symptoms"]
+    severity_counter = m["severity"]
+    clinic_counts = m["clinic"]
+    ngo_counts = m["ngo"]
+
+    # Clinic / NGO case columns -> symptom keys
+    symptom_counter["typhoid"] += clinic_counts["typhoid"] + ngo_counts["typhoid"]
+    symptom_counter["fever"] += clinic_counts["fever"] + ngo_counts["fever"]
+    symptom_counter["diarrhea"] += clinic_counts["diarrhea"] + ngo_counts["diarrhea"]
+    symptom_counter["cholera"] += clinic_counts["cholera"]
+
     # Total cases: healthreport rows + clinic sums + ngo sums (you can tune to avoid double counting)
-    clinic_sum_cases = sum([clinic_counts["typhoid_sum"], clinic_counts["fever_sum"], clinic_counts["diarrhea_sum"], clinic_counts["cholera_sum"]])
-    ngo_sum_cases = sum([ngo_counts["typhoid_sum"], ngo_counts["fever_sum"], ngo_counts["diarrhea_sum"]])
-    total_cases = health_count + clinic_sum_cases + ngo_sum_cases
+    clinic_sum_cases = sum([clinic_counts["typhoid"], clinic_counts["fever"], clinic_counts["diarrhea"], clinic_counts["cholera"]])
+    ngo_sum_cases = sum([ngo_counts["typhoid"], ngo_counts["fever"], ngo_counts["diarrhea"]])
+    total_cases = m["health_count"] + clinic_sum_cases + ngo_sum_cases
 
-    total_deaths = clinic_counts["deaths_sum"] or 0
-    hospitalized_cases = clinic_counts["hospitalized_sum"] or 0
+    total_deaths = clinic_counts["deaths"] or 0
+    hospitalized_cases = clinic_counts["hospitalized"] or 0
 
-    # 6) severity distribution -> convert counts to percentages (if desired)
+    # severity distribution -> convert counts to percentages
     total_severity_reports = sum(severity_counter.values()) or 1
     severity_pct = {
         k: round((v / total_severity_reports) * 100, 1)
         for k, v in severity_counter.items()
     }
 
-    # 7) monthly trend -> sort last months_back months
-    # ensure keys for each month exist for continuity
-    months = []
-    for i in range(months_back - 1, -1, -1):
-        dt = end_dt - timedelta(days=30 * i)
-        months.append(dt.strftime("%Y-%m"))
-    monthly_trend = {m: monthly_counter.get(m, 0) for m in months}
+    monthly_trend = {month: m["monthly"].get(month, 0) for month in months}
 
-    # 8) risk score calculation (tweakable)
+    # risk score calculation (tweakable)
     # Simple formula: base from severity + scale from case counts + environment flags
     severe_count = severity_counter.get("Severe", 0)
     moderate_count = severity_counter.get("Moderate", 0)
@@ -155,16 +210,14 @@ def aggregate_for_village(village_obj: Village, months_back: int = 6):
     case_score = min(100, (total_cases / 50) * 100)
 
     # water risk: if any NGO reports clean_drinking_water == False -> add penalty
-    water_risk_flag = nq.filter(clean_drinking_water=False).exists()
-    water_penalty = 10 if water_risk_flag else 0
+    water_penalty = 10 if m["water_risk"] else 0
 
     # untreated risk: if rb text contains 'untreated' or 'no treatment' -> penalty
-    untreated_flag = "no treatment" in (latest_rb_text or "").lower() or "untreated" in (latest_rb_text or "").lower()
+    untreated_flag = "no treatment" in (rb_text or "").lower() or "untreated" in (rb_text or "").lower()
     untreated_penalty = 10 if untreated_flag else 0
 
     # final risk percentage aggregate
     risk_percentage = min(100.0, (0.5 * severity_score) + (0.2 * case_score) + water_penalty + untreated_penalty)
-    # normalize to 0-100
     if risk_percentage > 90:
         risk_level = "Very High"
     elif risk_percentage > 60:
@@ -176,68 +229,203 @@ def aggregate_for_village(village_obj: Village, months_back: int = 6):
     else:
         risk_level = "Very Low"
 
-    # --- New Fields Calculation ---
-
-    # Water Quality Assessment
-    latest_ngo_survey = nq.order_by('-created_at').first()
-    if latest_ngo_survey and latest_ngo_survey.clean_drinking_water is not None:
-        latest_water_assessment_status = "Good" if latest_ngo_survey.clean_drinking_water else "Poor"
-        latest_water_assessment_date = latest_ngo_survey.created_at.date() # Extract date part
+    # Water Quality Assessment (latest survey in the window, annotated on the village)
+    if village.latest_clean_water is not None:
+        latest_water_assessment_status = "Good" if village.latest_clean_water else "Poor"
+        latest_water_assessment_date = village.latest_survey_at.date()
     else:
         latest_water_assessment_status = None
         latest_water_assessment_date = None
 
-    # Detailed Hospitalized Cases (placeholders)
-    current_admissions = clinic_counts["hospitalized_sum"] or 0
-    critical_cases = 0 # Placeholder
-    recovered_cases = 0 # Placeholder
+    return VillageDashboard(
+        village_id=village.village_id,
+        total_cases=total_cases,
+        total_deaths=total_deaths,
+        hospitalized_cases=hospitalized_cases,
+        risk_level=risk_level,
+        risk_percentage=round(risk_percentage, 1),
+        latest_rb_alerts=rb_text,
+        symptom_distribution=dict(symptom_counter),
+        severity_distribution=severity_pct,
+        monthly_trend=monthly_trend,
+        last_aggregated_at=aggregated_at,
+        population=village.population or 0,
+        latest_water_assessment_status=latest_water_assessment_status,
+        latest_water_assessment_date=latest_water_assessment_date,
+        current_admissions=hospitalized_cases,
+        critical_cases=0,  # Placeholder
+        recovered_cases=0,  # Placeholder
+        completed_campaigns=m["awareness_any"],  # Count of surveys with awareness_campaigns=True
+        ongoing_campaigns=0,  # Placeholder
+        planned_campaigns=0,  # Placeholder
+    )
+
+
+def _with_latest_survey(villages_qs, start_dt, end_dt):
+    """Annotate each village with its newest NGO survey in the window (clean water flag + time)"""
+    latest = NgoSurvey.objects.filter(
+        village_id=OuterRef("village_id"), created_at__gte=start_dt, created_at__lte=end_dt
+    ).order_by("-created_at", "-id")
+    return villages_qs.annotate(
+        latest_clean_water=Subquery(latest.values("clean_drinking_water")[:1]),
+        latest_survey_at=Subquery(latest.values("created_at")[:1]),
+    )
+
+
+def aggregate_villages(villages, months_back: int = 6, end_dt=None):
+    """
+    Compute dashboards for a list of villages (annotated by _with_latest_survey)
+    and upsert them with one INSERT .. ON CONFLICT (village_id) DO UPDATE.
+    Returns the VillageDashboard objects.
+    """
+    if not villages:
+        return []
+
+    end_dt = end_dt or now()
+    start_dt = end_dt - timedelta(days=30 * months_back)
 
-    # Awareness Campaigns (placeholders)
-    completed_campaigns = ngo_agg["awareness_any"] or 0 # Count of surveys with awareness_campaigns=True
-    ongoing_campaigns = 0 # Placeholder
-    planned_campaigns = 0 # Placeholder
+    # monthly trend keys, one per month so the chart has no gaps
+    months = []
+    for i in range(months_back - 1, -1, -1):
+        dt = end_dt - timedelta(days=30 * i)
+        months.append(dt.strftime("%Y-%m"))
 
-    # --- End New Fields Calculation ---
+    metrics = _collect_metrics(villages, start_dt, end_dt)
+    rb_alerts = _latest_rb_alerts(villages)
+    aggregated_at = now()
+
+    rows = [
+        _score_village(v, metrics[v.village_id], rb_alerts.get(v.village_name.lower(), ""), months, aggregated_at)
+        for v in villages
+    ]
+    # ordered by village id so concurrent refreshes lock rows in the same order
+    rows.sort(key=lambda row: row.village_id)
 
-    # 9) Save/update VillageDashboard (atomic)
     with transaction.atomic():
-        obj, created = VillageDashboard.objects.update_or_create(
-            village=village_obj,
-            defaults={
-                "total_cases": total_cases,
-                "total_deaths": total_deaths,
-                "hospitalized_cases": hospitalized_cases,
-                "risk_level": risk_level,
-                "risk_percentage": round(risk_percentage, 1),
-                "latest_rb_alerts": latest_rb_text,
-                "symptom_distribution": dict(symptom_counter),
-                "severity_distribution": severity_pct,
-                "monthly_trend": monthly_trend,
-                "last_aggregated_at": now(),
-                "population": village_obj.population or 0, # New field
-                "latest_water_assessment_status": latest_water_assessment_status, # New field
-                "latest_water_assessment_date": latest_water_assessment_date, # New field
-                "current_admissions": current_admissions, # New field
-                "critical_cases": critical_cases, # New field
-                "recovered_cases": recovered_cases, # New field
-                "completed_campaigns": completed_campaigns, # New field
-                "ongoing_campaigns": ongoing_campaigns, # New field
-                "planned_campaigns": planned_campaigns, # New field
-            }
+        return VillageDashboard.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["village"],
+            update_fields=DASHBOARD_UPDATE_FIELDS,
         )
 
-    return obj
 
-def aggregate_all_villages(months_back: int = 6, filter_village_ids: list | None = None):
+def aggregate_for_village(village_obj: Village, months_back: int = 6):
+    """
+    Aggregate data for one village and upsert into VillageDashboard.
+    months_back: how far back to pull for monthly trend and counts.
+    """
+    return aggregate_all_villages(months_back=months_back, filter_village_ids=[village_obj.village_id])[0]
+
+
+def aggregate_all_villages(months_back: int = 6, filter_village_ids: list | None = None,
+                           chunk_size: int = AGGREGATE_CHUNK_SIZE, shard: dict | None = None, end_dt=None):
     """
     Aggregate for all villages (or filtered list) and return list of updated objects.
     This is what Celery task or management command will call.
+
+    Villages are walked in village_id order, chunk_size at a time; each chunk
+    costs a handful of grouped queries plus one bulk upsert.
+    shard: Village filter from village_shards(), used by the parallel rebuild.
+    end_dt: pass the same value to every shard so they share one window.
     """
-    q = Village.objects.all()
+    end_dt = end_dt or now()
+    start_dt = end_dt - timedelta(days=30 * months_back)
+
+    q = Village.objects.only("village_id", "village_name", "population")
     if filter_village_ids:
         q = q.filter(village_id__in=filter_village_ids)
+    if shard:
+        q = q.filter(**shard)
+    q = _with_latest_survey(q, start_dt, end_dt).order_by("village_id")
 
     results = []
-    for v in q.iterator():
-        results.append(aggregate_for_village(v, months_back=months_back))
-    return results
\ No newline at end of file
+    last_id = 0
+    while True:
+        villages = list(q.filter(village_id__gt=last_id)[:chunk_size])
+        if not villages:
+            break
+        results.extend(aggregate_villages(villages, months_back=months_back, end_dt=end_dt))
+        last_id = villages[-1].village_id
+    return results
+
+
+# ---------- Sharding for the parallel rebuild ----------
+def village_shards(shard_size: int = AGGREGATE_CHUNK_SIZE, by: str = "id"):
+    """
+    Split all villages into disjoint Village filters (JSON-safe dicts, one per Celery subtask).
+      by="id"       : consecutive village_id ranges of shard_size villages
+      by="district" : one shard per (state, district)
+    Disjoint shards never upsert the same VillageDashboard row, so they can run concurrently.
+    """
+    if by == "district":
+        districts = Village.objects.values_list("state_name", "district_name").distinct().order_by("state_name", "district_name")
+        return [{"state_name": state, "district_name": district} for state, district in districts]
+    if by != "id":
+        raise ValueError(f"Unknown shard mode: {by}")
+
+    ids = list(Village.objects.order_by("village_id").values_list("village_id", flat=True))
+    return [
+        {"village_id__gte": ids[start], "village_id__lte": ids[min(start + shard_size, len(ids)) - 1]}
+        for start in range(0, len(ids), shard_size)
+    ]
+
+
+def clear_dirty_villages(before):
+    """Drop dirty flags a full rebuild started at `before` has covered"""
+    DirtyVillage.objects.filter(marked_at__lte=before).delete()
+
+
+# ---------- Incremental refresh ----------
+def _upsert_dirty(village_ids):
+    marked_at = now()
+    rows = [DirtyVillage(village_id=vid, marked_at=marked_at) for vid in village_ids]
+    if rows:
+        DirtyVillage.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=["village_id"], update_fields=["marked_at"]
+        )
+
+
+def mark_villages_dirty(village_ids):
+    """
+    Flag villages for the next refresh_dirty_villages run (upsert, bumps marked_at).
+    Inside a transaction the flags are stamped again once it commits: a refresh
+    clears flags stamped before it started, and one that ran while our rows were
+    still uncommitted did not see them.
+    """
+    village_ids = sorted(set(village_ids))
+    _upsert_dirty(village_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _upsert_dirty(village_ids))
+
+
+def refresh_dirty_villages(months_back: int = 6, chunk_size: int = AGGREGATE_CHUNK_SIZE):
+    """
+    Recompute dashboards only for villages flagged since their last refresh.
+    A village marked again while we were aggregating keeps its flag (its
+    marked_at is newer than our start time) and is picked up next run; writes
+    still uncommitted when we read re-stamp their flags on commit (mark_villages_dirty).
+    Returns the number of villages refreshed.
+    """
+    started = now()
+    dirty_ids = list(
+        DirtyVillage.objects.filter(marked_at__lte=started).order_by("village_id").values_list("village_id", flat=True)
+    )
+
+    refreshed = 0
+    for start in range(0, len(dirty_ids), chunk_size):
+        chunk = dirty_ids[start:start + chunk_size]
+        refreshed += len(aggregate_all_villages(months_back=months_back, filter_village_ids=chunk, chunk_size=chunk_size))
+        DirtyVillage.objects.filter(village_id__in=chunk, marked_at__lte=started).delete()
+    return refreshed
+
+
+def refresh_all_villages(months_back: int = 6):
+    """
+    Full sweep over every village (reports also have to roll out of the
+    months_back window, which no write announces). Clears the dirty set it covered.
+    """
+    started = now()
+    refreshed = len(aggregate_all_villages(months_back=months_back))
+    clear_dirty_villages(started)
+    return refreshed
@@ -0,0 +1,41 @@
+# admindashboard/signals.py
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from data_collection.models import HealthReport, ClinicReport, NgoSurvey, Village
+from data_collection.signals import reports_edited, reports_ingested
+from prediction.models import EarlyWarningAlert
+from prediction.signals import alerts_created
+from .services import mark_villages_dirty
+
+
+@receiver(reports_ingested)
+@receiver(reports_edited)
+def mark_ingested_villages_dirty(sender, village_ids, **kwargs):
+    mark_villages_dirty(village_ids)
+
+
+@receiver(post_delete, sender=HealthReport)
+@receiver(post_delete, sender=ClinicReport)
+@receiver(post_delete, sender=NgoSurvey)
+def mark_deleted_report_village_dirty(sender, instance, **kwargs):
+    if instance.village_id is not None:
+        mark_villages_dirty([instance.village_id])
+
+
+# alerts only carry the village name, the dashboard picks the latest one by name
+@receiver(post_save, sender=EarlyWarningAlert)
+def mark_alert_village_dirty(sender, instance, **kwargs):
+    mark_villages_dirty(
+        Village.objects.filter(village_name__iexact=instance.village_name).values_list("village_id", flat=True)
+    )
+
+
+@receiver(alerts_created)
+def mark_bulk_alert_villages_dirty(sender, alerts, **kwargs):
+    names = {alert.village_name.lower() for alert in alerts if alert.village_name}
+    if names:
+        mark_villages_dirty(
+            Village.objects.annotate(name=Lower("village_name")).filter(name__in=names).values_list("village_id", flat=True)
+        )
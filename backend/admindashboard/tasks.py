@@ -0,0 +1,68 @@
+# admindashboard/tasks.py
+import time
+
+from celery import chord, shared_task
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from .services import (
+    AGGREGATE_CHUNK_SIZE, aggregate_all_villages, clear_dirty_villages,
+    refresh_all_villages, refresh_dirty_villages, village_shards,
+)
+
+
+@shared_task
+def refresh_dirty_villages_task():
+    refreshed = refresh_dirty_villages()
+    return f"Refreshed {refreshed} dirty villages"
+
+
+@shared_task
+def refresh_all_villages_task():
+    # full sweep: also rolls old reports out of the months_back window
+    refreshed = refresh_all_villages()
+    return f"Refreshed {refreshed} villages"
+
+
+# ---------- Parallel (sharded) full rebuild ----------
+@shared_task
+def aggregate_village_shard_task(shard, end_dt, months_back=6):
+    """Aggregate one disjoint shard of villages, return its count and timing"""
+    t0 = time.monotonic()
+    villages = len(aggregate_all_villages(months_back=months_back, shard=shard, end_dt=parse_datetime(end_dt)))
+    return {"shard": shard, "villages": villages, "seconds": round(time.monotonic() - t0, 2)}
+
+
+@shared_task
+def report_sharded_rebuild_task(results, started_at):
+    """chord callback: clear the dirty flags the rebuild covered and sum up the shards"""
+    started = parse_datetime(started_at)
+    clear_dirty_villages(started)
+
+    shard_seconds = [r["seconds"] for r in results]
+    summary = {
+        "shards": len(results),
+        "villages": sum(r["villages"] for r in results),
+        "wall_seconds": round((now() - started).total_seconds(), 2),
+        "shard_seconds_total": round(sum(shard_seconds), 2),
+        "slowest_shard_seconds": max(shard_seconds, default=0),
+    }
+    return summary
+
+
+@shared_task
+def refresh_all_villages_sharded_task(shard_size=AGGREGATE_CHUNK_SIZE, by="id", months_back=6):
+    """
+    Full rebuild split into village shards that run on all available workers
+    (group of aggregate_village_shard_task + report_sharded_rebuild_task as chord callback).
+    Every shard uses the same end of window so month buckets line up.
+    """
+    started_at = now().isoformat()
+    shards = village_shards(shard_size=shard_size, by=by)
+    if not shards:
+        return "No villages to aggregate"
+
+    chord(
+        aggregate_village_shard_task.s(shard, started_at, months_back) for shard in shards
+    )(report_sharded_rebuild_task.s(started_at))
+    return f"Dispatched {len(shards)} dashboard shards"
@@ -1,3 +1,155 @@
 from django.test import TestCase
+from django.utils.timezone import localdate
 
-# Create your tests here.
+from data_collection.models import ClinicReport, NgoSurvey, Village
+from data_collection.services import ingest_health_reports
+from sentinel.celery import app as celery_app
+from .models import DirtyVillage, VillageDashboard
+from .services import aggregate_all_villages, aggregate_for_village, refresh_dirty_villages, village_shards
+from .tasks import refresh_all_villages_sharded_task
+
+
+def report_row(village, symptoms, severity="Mild", **extra):
+    return {
+        "patient_name": "P", "age": 30, "gender": "F", "village_id": village.village_id, "symptoms": symptoms,
+        "severity": severity, "date_of_reporting": localdate().isoformat(), "water_source": "Well",
+        "treatment_given": "ORS", "asha_worker_id": 1, "state": village.state_name,
+        "district": village.district_name, "village": village.village_name, **extra,
+    }
+
+
+def make_village(name="Alpha"):
+    return Village.objects.create(state_name="S1", district_name="D1", village_name=name, latitude=20, longitude=85)
+
+
+class VillageDashboardTests(TestCase):
+
+    def test_free_text_symptoms_are_listed_by_name(self):
+        village = make_village()
+        ingest_health_reports([
+            report_row(village, "Fever, Itching"),
+            report_row(village, "FEVER"),
+            report_row(village, "Cough, Joint pain and Itching"),
+            report_row(village, ""),
+        ])
+        dashboard = aggregate_for_village(village)
+        listed = {name: n for name, n in dashboard.symptom_distribution.items() if n}
+        self.assertEqual(listed, {"fever": 2, "itching": 2, "cough": 1, "joint pain": 1})
+
+
+class AggregateAllVillagesTests(TestCase):
+
+    def setUp(self):
+        self.alpha, self.beta, self.gamma = make_village("Alpha"), make_village("Beta"), make_village("Gamma")
+        ingest_health_reports([
+            report_row(self.alpha, "Fever, Cough", "Severe"),
+            report_row(self.alpha, "Diarrhea"),
+            report_row(self.beta, "Fever", "Moderate"),
+        ])
+        ClinicReport.objects.create(
+            village=self.alpha, cholera_cases=2, hospitalized_cases=1, deaths_reported=1, date_of_reporting=localdate(),
+        )
+        NgoSurvey.objects.create(village=self.beta, typhoid_cases=3, clean_drinking_water=False, awareness_campaigns=True)
+
+    def snapshot(self, dashboards):
+        return {
+            d.village_id: (d.total_cases, d.total_deaths, d.hospitalized_cases, d.risk_level, d.risk_percentage,
+                           {k: n for k, n in d.symptom_distribution.items() if n}, d.severity_distribution,
+                           d.latest_water_assessment_status, d.completed_campaigns)
+            for d in dashboards
+        }
+
+    def test_each_village_gets_its_own_numbers(self):
+        by_village = {d.village_id: d for d in aggregate_all_villages()}
+        self.assertEqual(set(by_village), {self.alpha.village_id, self.beta.village_id, self.gamma.village_id})
+
+        alpha = by_village[self.alpha.village_id]
+        self.assertEqual((alpha.total_cases, alpha.total_deaths, alpha.hospitalized_cases), (4, 1, 1))
+        self.assertEqual(alpha.symptom_distribution["cholera"], 2)
+        self.assertEqual(alpha.severity_distribution, {"Severe": 50.0, "Mild": 50.0})
+
+        beta = by_village[self.beta.village_id]
+        self.assertEqual((beta.total_cases, beta.symptom_distribution["typhoid"]), (4, 3))
+        self.assertEqual((beta.latest_water_assessment_status, beta.completed_campaigns), ("Poor", 1))
+
+        self.assertEqual(by_village[self.gamma.village_id].total_cases, 0)
+        self.assertEqual(VillageDashboard.objects.count(), 3)
+
+    def test_chunk_size_does_not_change_the_result(self):
+        one_chunk = self.snapshot(aggregate_all_villages())
+        per_village = self.snapshot(aggregate_all_villages(chunk_size=1))
+        self.assertEqual(per_village, one_chunk)
+        self.assertEqual(VillageDashboard.objects.count(), 3)  # upserted, not duplicated
+
+
+class ShardedRebuildTests(TestCase):
+
+    def setUp(self):
+        self.villages = [make_village(f"V{i}") for i in range(5)]
+        self.villages.append(Village.objects.create(
+            state_name="S1", district_name="D2", village_name="Other", latitude=21, longitude=86,
+        ))
+
+    def test_id_shards_are_disjoint_and_cover_every_village(self):
+        shards = village_shards(shard_size=2)
+        self.assertEqual(len(shards), 3)
+        covered = [list(Village.objects.filter(**shard).values_list("village_id", flat=True)) for shard in shards]
+        flat = [vid for ids in covered for vid in ids]
+        self.assertEqual(sorted(flat), sorted(v.village_id for v in self.villages))
+        self.assertEqual(len(flat), len(set(flat)))
+
+    def test_district_shards(self):
+        self.assertEqual(village_shards(by="district"), [
+            {"state_name": "S1", "district_name": "D1"}, {"state_name": "S1", "district_name": "D2"},
+        ])
+        with self.assertRaises(ValueError):
+            village_shards(by="block")
+
+    def test_sharded_task_rebuilds_every_village_and_clears_flags(self):
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True  # shards and callback run here, in order
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+        ingest_health_reports([report_row(self.villages[0], "Fever"), report_row(self.villages[3], "Cough")])
+        self.assertEqual(DirtyVillage.objects.count(), 2)
+
+        self.assertEqual(refresh_all_villages_sharded_task(shard_size=4), "Dispatched 2 dashboard shards")
+        self.assertEqual(VillageDashboard.objects.count(), len(self.villages))
+        self.assertEqual(VillageDashboard.objects.get(village=self.villages[3]).symptom_distribution["cough"], 1)
+        self.assertFalse(DirtyVillage.objects.exists())
+
+
+class DirtyVillageRefreshTests(TestCase):
+
+    def test_refresh_rebuilds_only_dirty_villages(self):
+        alpha, beta = make_village("Alpha"), make_village("Beta")
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_health_reports([report_row(alpha, "Fever"), report_row(alpha, "Cough")])
+        self.assertEqual(list(DirtyVillage.objects.values_list("village_id", flat=True)), [alpha.village_id])
+
+        self.assertEqual(refresh_dirty_villages(), 1)
+        self.assertFalse(DirtyVillage.objects.exists())
+        dashboard = VillageDashboard.objects.get(village=alpha)
+        self.assertEqual((dashboard.symptom_distribution["fever"], dashboard.symptom_distribution["cough"]), (1, 1))
+        self.assertFalse(VillageDashboard.objects.filter(village=beta).exists())
+
+    def test_created_and_edited_rows_mark_their_villages(self):
+        alpha, beta = make_village("Alpha"), make_village("Beta")
+        survey = NgoSurvey.objects.create(village=alpha, typhoid_cases=1)  # admin / seed script path
+        self.assertEqual(list(DirtyVillage.objects.values_list("village_id", flat=True)), [alpha.village_id])
+
+        DirtyVillage.objects.all().delete()
+        survey.village = beta
+        survey.save()
+        self.assertEqual(sorted(DirtyVillage.objects.values_list("village_id", flat=True)),
+                         [alpha.village_id, beta.village_id])
+
+    def test_refresh_during_an_uncommitted_ingest_keeps_its_flag(self):
+        village = make_village()
+        with self.captureOnCommitCallbacks() as on_commit:
+            ingest_health_reports([report_row(village, "Fever")])
+            # a refresh that ran before the ingest committed clears the flag stamped inside it
+            refresh_dirty_villages()
+            self.assertFalse(DirtyVillage.objects.exists())
+        for callback in on_commit:  # the ingest commits
+            callback()
+        self.assertTrue(DirtyVillage.objects.filter(village_id=village.village_id).exists())
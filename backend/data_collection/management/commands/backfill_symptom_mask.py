@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from data_collection.models import HealthReport
+from data_collection.symptoms import encode_symptoms
+
+
+class Command(BaseCommand):
+    help = "Fill HealthReport.symptom_mask / other_symptom_count for rows written before those columns existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        updated = 0
+
+        # keyset pagination on the primary key, only the columns we need
+        while True:
+            batch = list(
+                HealthReport.objects.filter(report_id__gt=last_id)
+                .order_by("report_id")
+                .only("report_id", "symptoms", "symptom_mask", "other_symptom_count")[:batch_size]
+            )
+            if not batch:
+                break
+
+            changed = []
+            for report in batch:
+                mask, other = encode_symptoms(report.symptoms)
+                if (mask, other) != (report.symptom_mask, report.other_symptom_count):
+                    report.symptom_mask, report.other_symptom_count = mask, other
+                    changed.append(report)
+
+            if changed:
+                HealthReport.objects.bulk_update(changed, ["symptom_mask", "other_symptom_count"])
+                updated += len(changed)
+
+            last_id = batch[-1].report_id
+            self.stdout.write(f"... up to report_id {last_id}, {updated} rows updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfill done, {updated} rows updated"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from data_collection.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the VillageDailyRollup table from raw HealthReport / ClinicReport / NgoSurvey rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_rollups(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup rows in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0007_remove_clinicreport_id_clinicreport_report_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinicreport',
+            name='client_submission_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='healthreport',
+            name='client_submission_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='ngosurvey',
+            name='client_submission_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
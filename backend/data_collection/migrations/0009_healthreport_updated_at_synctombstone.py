@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # existing rows were never edited, so their last change is their creation
+    HealthReport = apps.get_model('data_collection', 'HealthReport')
+    HealthReport.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0008_clinicreport_client_submission_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthreport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='healthreport',
+            index=models.Index(fields=['asha_worker_id', 'updated_at'], name='data_collec_asha_wo_a7ca87_idx'),
+        ),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=50)),
+                ('record_id', models.CharField(max_length=64)),
+                ('asha_worker_id', models.IntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['asha_worker_id', 'deleted_at'], name='data_collec_asha_wo_ac8f85_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0009_healthreport_updated_at_synctombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthreport',
+            name='other_symptom_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='healthreport',
+            name='symptom_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
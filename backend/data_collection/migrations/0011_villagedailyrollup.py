@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0010_healthreport_symptom_mask_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VillageDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village_id', models.IntegerField()),
+                ('date', models.DateField()),
+                ('source', models.CharField(max_length=10)),
+                ('asha_worker_id', models.IntegerField(default=0)),
+                ('symptom', models.CharField(max_length=50)),
+                ('severity', models.CharField(default='', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['asha_worker_id', 'date'], name='data_collec_asha_wo_e46ad1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('village_id', 'date', 'source', 'asha_worker_id', 'symptom', 'severity'), name='village_daily_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0011_villagedailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthreport',
+            index=models.Index(condition=models.Q(('other_symptom_count__gt', 0)), fields=['village_id', 'date_of_reporting'], name='healthreport_free_text_idx'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 
+from .symptoms import encode_symptoms
+
 
 # ---------------- Village ----------------
 
@@ -53,12 +55,59 @@ class HealthReport(models.Model):
         blank=True, 
         default=None
     )
+    # generated on the device, lets a retried sync return the original row
+    client_submission_id = models.UUIDField(unique=True, null=True, blank=True)
+
+    # filled from `symptoms` on write (see data_collection/symptoms.py) so stats can be counted in SQL
+    symptom_mask = models.PositiveIntegerField(default=0)
+    other_symptom_count = models.PositiveSmallIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # delta sync: "this worker's rows changed since <watermark>"
+            models.Index(fields=["asha_worker_id", "updated_at"]),
+            # village dashboards list free-text symptoms by name; only the few reports that have one
+            models.Index(
+                fields=["village_id", "date_of_reporting"],
+                condition=models.Q(other_symptom_count__gt=0),
+                name="healthreport_free_text_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.patient_name} - {self.report_id}"
 
+    def set_symptom_fields(self):
+        """Refresh symptom_mask / other_symptom_count from the symptoms text"""
+        self.symptom_mask, self.other_symptom_count = encode_symptoms(self.symptoms)
+
+    def save(self, *args, **kwargs):
+        self.set_symptom_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "symptoms" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"symptom_mask", "other_symptom_count"}
+        super().save(*args, **kwargs)
+
+
+# ---------------- SyncTombstone ----------------
+class SyncTombstone(models.Model):
+    """Remembers deleted rows so offline clients can drop them on the next pull"""
+    table_name = models.CharField(max_length=50)   # client side table, e.g. "reports"
+    record_id = models.CharField(max_length=64)
+    asha_worker_id = models.IntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["asha_worker_id", "deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.table_name}:{self.record_id} deleted {self.deleted_at}"
+
 # ---------------- NgoSurvey ----------------
 class NgoSurvey(models.Model):
     ngo = models.ForeignKey('users.User', on_delete=models.CASCADE, null=True, blank=True)
@@ -72,6 +121,7 @@ class NgoSurvey(models.Model):
     typhoid_cases = models.PositiveIntegerField(default=0)
     fever_cases = models.PositiveIntegerField(default=0)
     diarrhea_cases = models.PositiveIntegerField(default=0)
+    client_submission_id = models.UUIDField(unique=True, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -114,6 +164,7 @@ class ClinicReport(models.Model):
 
   
     date_of_reporting = models.DateField()
+    client_submission_id = models.UUIDField(unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -124,3 +175,32 @@ class ClinicReport(models.Model):
 
     def __str__(self):
         return f"Clinic Report (Village: {self.village.village_name}, Date: {self.date_of_reporting})"
+
+
+# ---------------- VillageDailyRollup ----------------
+class VillageDailyRollup(models.Model):
+    """
+    Pre-summed daily counters per village, maintained on every report write
+    (see data_collection/rollups.py for the meaning of each dimension).
+    """
+    village_id = models.IntegerField()
+    date = models.DateField()
+    source = models.CharField(max_length=10)          # asha / clinic / ngo
+    asha_worker_id = models.IntegerField(default=0)   # 0 for clinic and ngo rows
+    symptom = models.CharField(max_length=50)         # "*" = report count
+    severity = models.CharField(max_length=10, default="")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["village_id", "date", "source", "asha_worker_id", "symptom", "severity"],
+                name="village_daily_rollup_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["asha_worker_id", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.village_id} {self.date} {self.source}/{self.symptom}/{self.severity}: {self.count}"
@@ -0,0 +1,205 @@
+# data_collection/rollups.py
+"""
+Daily per-village counters (VillageDailyRollup), kept up to date on every
+report write so dashboards sum a few pre-aggregated rows instead of
+rescanning raw reports.
+
+One rollup row = (village_id, date, source, asha_worker_id, symptom, severity) -> count
+
+  source "asha"   : HealthReport rows. symptom REPORTS ("*") counts reports,
+                    the FIXED_SYMPTOMS names count reports having that symptom,
+                    "Other" counts unrecognised symptom entries.
+  source "clinic" : ClinicReport case columns (typhoid, fever, diarrhea,
+                    cholera, hospitalized, deaths), severity "".
+  source "ngo"    : NgoSurvey case columns (typhoid, fever, diarrhea), severity "".
+
+asha_worker_id is 0 for clinic / ngo rows so the unique key never contains NULL.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from . import signals
+from .models import HealthReport, ClinicReport, NgoSurvey, VillageDailyRollup
+from .symptoms import SYMPTOM_BITS, symptom_count_aggregates
+
+REPORTS = "*"
+
+SOURCE_ASHA = "asha"
+SOURCE_CLINIC = "clinic"
+SOURCE_NGO = "ngo"
+
+# rollup symptom name -> model field
+CLINIC_FIELDS = {
+    "typhoid": "typhoid_cases",
+    "fever": "fever_cases",
+    "diarrhea": "diarrhea_cases",
+    "cholera": "cholera_cases",
+    "hospitalized": "hospitalized_cases",
+    "deaths": "deaths_reported",
+}
+NGO_FIELDS = {
+    "typhoid": "typhoid_cases",
+    "fever": "fever_cases",
+    "diarrhea": "diarrhea_cases",
+}
+
+KEY_COLUMNS = ["village_id", "date", "source", "asha_worker_id", "symptom", "severity"]
+INSERT_CHUNK = 500
+
+
+# ---------- per-row deltas ----------
+def health_report_deltas(reports, sign=1):
+    # objects.create() leaves whatever the client sent (e.g. "2025-09-20") on the instance
+    to_date = HealthReport._meta.get_field("date_of_reporting").to_python
+
+    deltas = Counter()
+    for r in reports:
+        if r.village_id is None:
+            continue
+        base = (int(r.village_id), to_date(r.date_of_reporting), SOURCE_ASHA, int(r.asha_worker_id or 0))
+        deltas[base + (REPORTS, r.severity)] += sign
+        for symptom, bit in SYMPTOM_BITS.items():
+            if r.symptom_mask & bit:
+                deltas[base + (symptom, r.severity)] += sign
+        if r.other_symptom_count:
+            deltas[base + ("Other", r.severity)] += sign * r.other_symptom_count
+    return deltas
+
+
+def clinic_report_deltas(reports, sign=1):
+    to_date = ClinicReport._meta.get_field("date_of_reporting").to_python
+
+    deltas = Counter()
+    for r in reports:
+        base = (r.village_id, to_date(r.date_of_reporting), SOURCE_CLINIC, 0)
+        for symptom, field in CLINIC_FIELDS.items():
+            value = getattr(r, field) or 0
+            if value:
+                deltas[base + (symptom, "")] += sign * value
+    return deltas
+
+
+def ngo_survey_deltas(surveys, sign=1):
+    deltas = Counter()
+    for s in surveys:
+        base = (s.village_id, s.created_at.date(), SOURCE_NGO, 0)
+        for symptom, field in NGO_FIELDS.items():
+            value = getattr(s, field) or 0
+            if value:
+                deltas[base + (symptom, "")] += sign * value
+    return deltas
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Add the deltas with INSERT .. ON CONFLICT DO UPDATE (count = count + delta),
+    so concurrent writers never lose an increment. Call inside the same
+    transaction as the report insert.
+    """
+    rows = [key + (n,) for key, n in deltas.items() if n]
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(VillageDailyRollup._meta.db_table)
+    columns = ", ".join(qn(c) for c in KEY_COLUMNS + ["count"])
+    conflict = ", ".join(qn(c) for c in KEY_COLUMNS)
+    row_sql = "(" + ", ".join(["%s"] * (len(KEY_COLUMNS) + 1)) + ")"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_CHUNK):
+            chunk = rows[start:start + INSERT_CHUNK]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row_sql] * len(chunk))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {qn('count')} = {table}.{qn('count')} + EXCLUDED.{qn('count')}",
+                [value for row in chunk for value in row],
+            )
+
+
+def _announce(sender, reports):
+    village_ids = {int(r.village_id) for r in reports if r.village_id is not None}
+    if village_ids:
+        signals.reports_ingested.send(sender=sender, reports=reports, village_ids=village_ids)
+
+
+# New rows go through one of these, which is also where reports_ingested is
+# sent: save() / objects.create() via the post_save receivers in signals.py,
+# bulk_create by calling them directly after the insert.
+def record_health_reports(reports):
+    apply_rollup_deltas(health_report_deltas(reports))
+    _announce(HealthReport, reports)
+
+
+def record_clinic_reports(reports):
+    apply_rollup_deltas(clinic_report_deltas(reports))
+    _announce(ClinicReport, reports)
+
+
+def record_ngo_surveys(surveys):
+    apply_rollup_deltas(ngo_survey_deltas(surveys))
+    _announce(NgoSurvey, surveys)
+
+
+# ---------- full rebuild ----------
+def _health_report_rollup_rows():
+    grouped = (
+        HealthReport.objects.filter(village_id__isnull=False)
+        .values("village_id", "date_of_reporting", "asha_worker_id", "severity")
+        .annotate(**symptom_count_aggregates())
+        .order_by()
+    )
+    for g in grouped.iterator():
+        key = (g["village_id"], g["date_of_reporting"], SOURCE_ASHA, g["asha_worker_id"] or 0)
+        yield key + (REPORTS, g["severity"], g["total"])
+        for i, symptom in enumerate(SYMPTOM_BITS):
+            if g[f"symptom_{i}"]:
+                yield key + (symptom, g["severity"], g[f"symptom_{i}"])
+        if g["other"]:
+            yield key + ("Other", g["severity"], g["other"])
+
+
+def _case_column_rollup_rows(queryset, date_field, source, fields):
+    grouped = (
+        queryset.values("village_id", date_field)
+        .annotate(**{symptom: Sum(field) for symptom, field in fields.items()})
+        .order_by()
+    )
+    for g in grouped.iterator():
+        key = (g["village_id"], g[date_field], source, 0)
+        for symptom in fields:
+            if g[symptom]:
+                yield key + (symptom, "", g[symptom])
+
+
+def rebuild_rollups(batch_size=2000):
+    """
+    Recompute the whole rollup table from raw reports with grouped queries.
+    Runs in one transaction so readers see either the old or the new table.
+    Returns the number of rollup rows written.
+    """
+    sources = [
+        _health_report_rollup_rows(),
+        _case_column_rollup_rows(ClinicReport.objects.all(), "date_of_reporting", SOURCE_CLINIC, CLINIC_FIELDS),
+        _case_column_rollup_rows(
+            NgoSurvey.objects.annotate(day=TruncDate("created_at")), "day", SOURCE_NGO, NGO_FIELDS
+        ),
+    ]
+
+    written = 0
+    with transaction.atomic():
+        VillageDailyRollup.objects.all().delete()
+        batch = []
+        for rows in sources:
+            for row in rows:
+                batch.append(VillageDailyRollup(**dict(zip(KEY_COLUMNS + ["count"], row))))
+                if len(batch) >= batch_size:
+                    VillageDailyRollup.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+        if batch:
+            VillageDailyRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
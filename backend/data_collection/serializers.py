@@ -35,6 +35,39 @@ class HealthReportSerializer(serializers.ModelSerializer):
         ]
 
 
+# ---------------- HealthReport Sync Serializer ----------------
+class HealthReportSyncSerializer(serializers.ModelSerializer):
+    # WatermelonDB expects a string "id" on every raw record
+    id = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HealthReport
+        fields = [
+            "id",
+            "report_id",
+            "client_submission_id",
+            "patient_name",
+            "age",
+            "gender",
+            "village_id",
+            "village",
+            "district",
+            "state",
+            "symptoms",
+            "severity",
+            "water_source",
+            "water_quality",
+            "treatment_given",
+            "asha_worker_id",
+            "date_of_reporting",
+            "created_at",
+            "updated_at",
+        ]
+
+    def get_id(self, obj):
+        return str(obj.report_id)
+
+
 # ---------------- NgoSurvey Serializer ----------------
 class NgoSurveySerializer(serializers.ModelSerializer):
     # ngo_id field → maps to Ngo model FK
@@ -62,6 +95,7 @@ class NgoSurveySerializer(serializers.ModelSerializer):
             'typhoid_cases',
             'fever_cases',
             'diarrhea_cases',
+            'client_submission_id',
             'created_at',
         )
 
@@ -92,6 +126,7 @@ class ClinicReportSerializer(serializers.ModelSerializer):
             "hospitalized_cases",
             "deaths_reported",
             "date_of_reporting",
+            "client_submission_id",
             "created_at",
         )
         read_only_fields = ("report_id", "created_at")
@@ -0,0 +1,135 @@
+# data_collection/services.py
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import HealthReport
+from .rollups import record_health_reports
+
+# Fields every ASHA worker submission must carry (same list the single-report API checks)
+HEALTH_REPORT_REQUIRED_FIELDS = [
+    "patient_name", "age", "gender", "village_id", "symptoms",
+    "severity", "date_of_reporting", "water_source",
+    "treatment_given", "asha_worker_id", "state", "district", "village"
+]
+HEALTH_REPORT_OPTIONAL_FIELDS = ["water_quality", "client_submission_id"]
+
+# Upper bound for one batch request, keeps a single transaction reasonably small
+MAX_BATCH_SIZE = 500
+
+
+def build_health_report(data):
+    """
+    Validate one submitted report dict and return (unsaved HealthReport, None)
+    or (None, {field: [errors]}). Nothing is written to the database here.
+    """
+    if not isinstance(data, dict):
+        return None, {"non_field_errors": ["Expected an object."]}
+
+    missing = [field for field in HEALTH_REPORT_REQUIRED_FIELDS if field not in data]
+    if missing:
+        return None, {field: ["This field is required."] for field in missing}
+
+    fields = HEALTH_REPORT_REQUIRED_FIELDS + HEALTH_REPORT_OPTIONAL_FIELDS
+    report = HealthReport(**{field: data[field] for field in fields if field in data})
+
+    try:
+        # full_clean also converts "12" -> 12 and "2025-09-20" -> date
+        report.full_clean(validate_unique=False, validate_constraints=False)
+    except ValidationError as e:
+        return None, e.message_dict
+
+    report.set_symptom_fields()  # bulk_create skips save()
+    return report, None
+
+
+def find_existing_submission(model, key):
+    """
+    Return the row already stored under this client_submission_id, or None.
+    Malformed keys return None so the serializer can report the field error.
+    """
+    if not key:
+        return None
+    try:
+        key = uuid.UUID(str(key))
+    except ValueError:
+        return None
+    return model.objects.filter(client_submission_id=key).first()
+
+
+def _split_known_submissions(pending, results):
+    """
+    One lookup for every client_submission_id in the batch. Rows whose key is
+    already stored are answered with the original report_id; repeats of a key
+    inside the same batch are returned separately and resolved after insert.
+    """
+    keys = {report.client_submission_id for _, report in pending if report.client_submission_id}
+    existing = {}
+    if keys:
+        existing = dict(
+            HealthReport.objects.filter(client_submission_id__in=keys)
+            .values_list("client_submission_id", "report_id")
+        )
+
+    fresh, repeats, first_by_key = [], [], {}
+    for index, report in pending:
+        key = report.client_submission_id
+        if key in existing:
+            results[index] = {"index": index, "status": "duplicate", "report_id": existing[key]}
+        elif key and key in first_by_key:
+            repeats.append((index, key))
+        else:
+            if key:
+                first_by_key[key] = report
+            fresh.append((index, report))
+    return fresh, repeats, first_by_key
+
+
+def ingest_health_reports(rows):
+    """
+    Validate every row in one pass, then insert all valid rows with a single
+    bulk_create inside one transaction (the daily rollups are bumped in the
+    same transaction).
+
+    Rows carrying a client_submission_id that is already stored are not
+    written again, the original report_id is returned instead, so the app
+    can safely retry a whole batch after a lost response.
+
+    Returns a list of per-row outcomes in input order:
+      {"index": i, "status": "created", "report_id": 12}
+      {"index": i, "status": "duplicate", "report_id": 7}
+      {"index": i, "status": "error", "errors": {...}}
+    """
+    results = [None] * len(rows)
+    pending = []  # (index, report)
+
+    for index, data in enumerate(rows):
+        report, errors = build_health_report(data)
+        if errors:
+            results[index] = {"index": index, "status": "error", "errors": errors}
+        else:
+            pending.append((index, report))
+
+    if not pending:
+        return results
+
+    # A concurrent retry of the same batch can insert a key between our lookup
+    # and our insert; the unique index catches it and the second pass sees it.
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                fresh, repeats, first_by_key = _split_known_submissions(pending, results)
+                HealthReport.objects.bulk_create([report for _, report in fresh])
+                record_health_reports([report for _, report in fresh])
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    for index, report in fresh:
+        results[index] = {"index": index, "status": "created", "report_id": report.report_id}
+    for index, key in repeats:
+        results[index] = {"index": index, "status": "duplicate", "report_id": first_by_key[key].report_id}
+
+    return results
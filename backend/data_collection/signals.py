@@ -0,0 +1,90 @@
+# data_collection/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import rollups
+from .models import HealthReport, ClinicReport, NgoSurvey, SyncTombstone
+
+# Sent after new HealthReport / ClinicReport / NgoSurvey rows are stored,
+# inside the inserting transaction. Fires for bulk_create as well, unlike post_save.
+#   sender      : the model class
+#   reports     : list of saved instances
+#   village_ids : set of village ids they belong to
+reports_ingested = Signal()
+
+# Sent after an existing HealthReport / ClinicReport / NgoSurvey row is saved
+# again and its rollups were adjusted.
+#   sender      : the model class
+#   reports     : [the saved instance]
+#   village_ids : its village before and after the edit
+reports_edited = Signal()
+
+
+@receiver(post_delete, sender=HealthReport)
+def record_health_report_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone so the mobile delta sync can delete the local copy"""
+    SyncTombstone.objects.create(
+        table_name="reports",
+        record_id=str(instance.report_id),
+        asha_worker_id=instance.asha_worker_id,
+    )
+
+
+# keep the daily rollups in step when raw rows are removed
+@receiver(post_delete, sender=HealthReport)
+def remove_health_report_from_rollup(sender, instance, **kwargs):
+    rollups.apply_rollup_deltas(rollups.health_report_deltas([instance], sign=-1))
+
+
+@receiver(post_delete, sender=ClinicReport)
+def remove_clinic_report_from_rollup(sender, instance, **kwargs):
+    rollups.apply_rollup_deltas(rollups.clinic_report_deltas([instance], sign=-1))
+
+
+@receiver(post_delete, sender=NgoSurvey)
+def remove_ngo_survey_from_rollup(sender, instance, **kwargs):
+    rollups.apply_rollup_deltas(rollups.ngo_survey_deltas([instance], sign=-1))
+
+
+# Inserts and in-place edits made with save() / objects.create() (views,
+# admin, seed scripts, shell). bulk_create sends no post_save, that path calls
+# rollups.record_* itself. Fixtures (raw) and queryset.update() are left to
+# rebuild_rollups.
+ROLLUP_WRITERS = {
+    HealthReport: (rollups.record_health_reports, rollups.health_report_deltas),
+    ClinicReport: (rollups.record_clinic_reports, rollups.clinic_report_deltas),
+    NgoSurvey: (rollups.record_ngo_surveys, rollups.ngo_survey_deltas),
+}
+
+
+@receiver(pre_save, sender=HealthReport)
+@receiver(pre_save, sender=ClinicReport)
+@receiver(pre_save, sender=NgoSurvey)
+def snapshot_report_before_edit(sender, instance, raw=False, **kwargs):
+    """The stored row, so post_save can take it out of the rollups again"""
+    if raw or instance._state.adding:
+        return
+    instance._rollup_before = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=HealthReport)
+@receiver(post_save, sender=ClinicReport)
+@receiver(post_save, sender=NgoSurvey)
+def add_saved_report_to_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    record, deltas_for = ROLLUP_WRITERS[sender]
+    if created:
+        record([instance])
+        return
+
+    before = instance.__dict__.pop("_rollup_before", None)
+    if before is None:
+        return
+    # -old +new, only the counters that really changed are touched
+    deltas = deltas_for([instance])
+    deltas.subtract(deltas_for([before]))
+    rollups.apply_rollup_deltas(deltas)
+    village_ids = {int(vid) for vid in (before.village_id, instance.village_id) if vid is not None}
+    if village_ids:
+        reports_edited.send(sender=sender, reports=[instance], village_ids=village_ids)
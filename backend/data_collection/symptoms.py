@@ -0,0 +1,47 @@
+# data_collection/symptoms.py
+from django.db.models import Count, F, Sum
+from django.db.models.lookups import GreaterThan
+
+# Symptom checklist used by the ASHA app; anything else is counted as "Other"
+FIXED_SYMPTOMS = [
+    "Fever", "Diarrhea", "Vomiting", "Headache", "Stomach Pain",
+    "Cough", "Cold", "Fatigue", "Nausea", "Skin Rash", "Other"
+]
+
+# bit i of HealthReport.symptom_mask <=> FIXED_SYMPTOMS[i]
+# ("Other" has no bit, HealthReport.other_symptom_count keeps how many unknown entries a report had)
+SYMPTOM_BITS = {symptom: 1 << i for i, symptom in enumerate(FIXED_SYMPTOMS[:-1])}
+
+
+def encode_symptoms(symptoms_text):
+    """
+    "Fever, Cough, Itching" -> (mask with Fever+Cough bits, 1)
+    Uses the same ", " split the app writes with.
+    """
+    mask = 0
+    other = 0
+    for symptom in (symptoms_text or "").split(", "):
+        bit = SYMPTOM_BITS.get(symptom)
+        if bit:
+            mask |= bit
+        else:
+            other += 1
+    return mask, other
+
+
+def symptom_count_aggregates():
+    """
+    Aggregate expressions for HealthReport querysets:
+    report count + one conditional count per fixed symptom + sum of "Other" entries.
+    Keys are "total", "other" and "symptom_<bit index>".
+    """
+    aggregates = {
+        "total": Count("report_id"),
+        "other": Sum("other_symptom_count"),
+    }
+    for i, (symptom, bit) in enumerate(SYMPTOM_BITS.items()):
+        aggregates[f"symptom_{i}"] = Count(
+            "report_id", filter=GreaterThan(F("symptom_mask").bitand(bit), 0)
+        )
+    return aggregates
+
@@ -1,3 +1,237 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.timezone import localdate
+
+from .models import ClinicReport, HealthReport, NgoSurvey, Village, VillageDailyRollup
+from .rollups import rebuild_rollups
+from .services import find_existing_submission, ingest_health_reports
+from .symptoms import SYMPTOM_BITS, encode_symptoms
+from rest_framework.test import APIClient
+
+
+def report_row(village, symptoms="Fever", severity="Mild", **extra):
+    return {
+        "patient_name": "P", "age": 30, "gender": "F", "village_id": village.village_id, "symptoms": symptoms,
+        "severity": severity, "date_of_reporting": localdate().isoformat(), "water_source": "Well",
+        "treatment_given": "ORS", "asha_worker_id": 1, "state": village.state_name,
+        "district": village.district_name, "village": village.village_name, **extra,
+    }
+
+
+def make_village(name="Alpha"):
+    return Village.objects.create(state_name="S1", district_name="D1", village_name=name, latitude=20, longitude=85)
+
+
+class SingleReportSubmissionTests(TestCase):
+    URL = "/api/data_collection/health-reports/"
+
+    def setUp(self):
+        self.village = make_village()
+
+    def post(self, row):
+        return self.client.post(self.URL, row, content_type="application/json")
+
+    def test_retry_returns_the_original_report(self):
+        row = report_row(self.village, client_submission_id=str(uuid.uuid4()))
+        first = self.post(row)
+        second = self.post(row)
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(first.json()["report_id"], second.json()["report_id"])
+        self.assertEqual(HealthReport.objects.count(), 1)
+
+    def test_malformed_key_is_a_client_error(self):
+        response = self.post(report_row(self.village, client_submission_id="not-a-uuid"))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(HealthReport.objects.exists())
+
+    def test_concurrent_retry_gets_the_original_report(self):
+        row = report_row(self.village, client_submission_id=str(uuid.uuid4()))
+        original = self.post(row).json()["report_id"]
+        # the other request inserted after our lookup: the lookup misses, the unique index does not
+        stored = find_existing_submission(HealthReport, row["client_submission_id"])
+        with mock.patch("data_collection.views.find_existing_submission", side_effect=[None, stored]):
+            response = self.post(row)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["report_id"], original)
+        self.assertEqual(HealthReport.objects.count(), 1)
+
+
+class SyncPullTests(TestCase):
+    URL = "/api/data_collection/sync/pull/"
+
+    def setUp(self):
+        self.village = make_village()
+
+    def pull(self, **params):
+        return self.client.get(self.URL, params)
+
+    def test_first_pull_then_delta(self):
+        first_report = self.client.post(
+            SingleReportSubmissionTests.URL, report_row(self.village), content_type="application/json"
+        ).json()["report_id"]
+        first = self.pull(asha_worker_id=1)
+        self.assertEqual(first.status_code, 200)
+        changes = first.json()["changes"]["reports"]
+        self.assertEqual([r["report_id"] for r in changes["created"]], [first_report])
+
+        HealthReport.objects.filter(report_id=first_report).update(updated_at=timezone.now() + timedelta(seconds=1))
+        second_report = self.client.post(
+            SingleReportSubmissionTests.URL, report_row(self.village, symptoms="Cough"), content_type="application/json"
+        ).json()["report_id"]
+        HealthReport.objects.filter(report_id=second_report).update(
+            created_at=timezone.now() + timedelta(seconds=1), updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        changes = self.pull(asha_worker_id=1, last_pulled_at=first.json()["timestamp"]).json()["changes"]["reports"]
+        self.assertEqual([r["report_id"] for r in changes["created"]], [second_report])
+        self.assertEqual([r["report_id"] for r in changes["updated"]], [first_report])
+        self.assertEqual(changes["deleted"], [])
+
+        HealthReport.objects.get(report_id=second_report).delete()
+        changes = self.pull(asha_worker_id=1, last_pulled_at=first.json()["timestamp"]).json()["changes"]["reports"]
+        self.assertEqual([str(record_id) for record_id in changes["deleted"]], [str(second_report)])
+
+        self.assertEqual(self.pull(asha_worker_id=2).json()["changes"]["reports"]["created"], [])
+
+    def test_bad_parameters_are_client_errors(self):
+        self.assertEqual(self.pull().status_code, 400)
+        self.assertEqual(self.pull(asha_worker_id="abc").status_code, 400)
+        self.assertEqual(self.pull(asha_worker_id=1, last_pulled_at="yesterday").status_code, 400)
+
+
+class BatchIngestTests(TestCase):
+    URL = "/api/data_collection/health-reports/batch/"
+
+    def setUp(self):
+        self.village = make_village()
+
+    def post(self, rows):
+        return self.client.post(self.URL, {"reports": rows}, content_type="application/json")
+
+    def test_valid_and_invalid_rows(self):
+        bad = report_row(self.village, severity="Unknown")
+        del bad["age"]
+        response = self.post([report_row(self.village), bad, report_row(self.village, symptoms="Cough")])
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual((body["created"], body["duplicates"], body["failed"]), (2, 0, 1))
+        self.assertEqual([r["status"] for r in body["results"]], ["created", "error", "created"])
+        self.assertIn("age", body["results"][1]["errors"])
+        self.assertEqual(HealthReport.objects.count(), 2)
+
+        self.assertEqual(self.post([bad]).status_code, 400)
+        self.assertEqual(self.client.post(self.URL, [], content_type="application/json").status_code, 400)
+
+    def test_replayed_batch_is_not_stored_twice(self):
+        keys = [str(uuid.uuid4()) for _ in range(3)]
+        rows = [report_row(self.village, client_submission_id=key) for key in keys]
+        rows.append(report_row(self.village, client_submission_id=keys[0]))  # repeated inside the batch
+
+        first = self.post(rows)
+        self.assertEqual(first.status_code, 201)
+        first_results = first.json()["results"]
+        self.assertEqual([r["status"] for r in first_results], ["created", "created", "created", "duplicate"])
+        self.assertEqual(first_results[3]["report_id"], first_results[0]["report_id"])
+
+        replay = self.post(rows)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual([r["status"] for r in replay.json()["results"]], ["duplicate"] * 4)
+        self.assertEqual([r["report_id"] for r in replay.json()["results"]], [r["report_id"] for r in first_results])
+        self.assertEqual(HealthReport.objects.count(), 3)
+
+
+class SymptomCountTests(TestCase):
+
+    def test_encode_symptoms(self):
+        self.assertEqual(encode_symptoms("Fever, Cough, Itching"), (SYMPTOM_BITS["Fever"] | SYMPTOM_BITS["Cough"], 1))
+        self.assertEqual(encode_symptoms("Skin Rash"), (SYMPTOM_BITS["Skin Rash"], 0))
+        self.assertEqual(encode_symptoms("fever"), (0, 1))  # the app sends checklist names verbatim
+
+    def test_disease_stats_counts_the_workers_reports(self):
+        village = make_village()
+        ingest_health_reports([
+            report_row(village, "Fever, Cough"),
+            report_row(village, "Fever, Itching"),
+            report_row(village, "Diarrhea", asha_worker_id=2),
+            report_row(village, "Fever", date_of_reporting=(localdate() - timedelta(days=20)).isoformat()),
+        ])
+        weekly = self.client.get("/api/data_collection/disease_stats/", {"asha_worker_id": 1}).json()
+        self.assertEqual(weekly["total_disease_count"], 2)
+        self.assertEqual(
+            {name: n for name, n in weekly["disease_counts"].items() if n},
+            {"Fever": 2, "Cough": 1, "Other": 1},
+        )
+        monthly = self.client.get("/api/data_collection/disease_stats/", {"asha_worker_id": 1, "filter": "monthly"}).json()
+        self.assertEqual((monthly["total_disease_count"], monthly["disease_counts"]["Fever"]), (3, 3))
+
+
+class VillageRollupTests(TestCase):
+
+    def rollup_rows(self):
+        return set(
+            VillageDailyRollup.objects.exclude(count=0)
+            .values_list("village_id", "date", "source", "asha_worker_id", "symptom", "severity", "count")
+        )
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        alpha, beta = make_village("Alpha"), make_village("Beta")
+        yesterday = (localdate() - timedelta(days=1)).isoformat()
+        ingest_health_reports([
+            report_row(alpha, "Fever, Cough", severity="Severe"),
+            report_row(alpha, "Fever, Itching, Joint pain"),
+            report_row(alpha, "Diarrhea", date_of_reporting=yesterday, asha_worker_id=2),
+            report_row(beta, "Vomiting, Fever", severity="Moderate"),
+        ])
+        self.client.post("/api/data_collection/health-reports/", report_row(beta, "Cold"), content_type="application/json")
+        # plain objects.create() (admin, seed scripts) is counted by post_save
+        clinic = ClinicReport.objects.create(village=alpha, fever_cases=3, deaths_reported=1, date_of_reporting=localdate())
+        NgoSurvey.objects.create(village=beta, typhoid_cases=2, diarrhea_cases=1)
+
+        # deletes subtract again
+        HealthReport.objects.filter(symptoms="Fever, Cough").delete()
+        cholera = ClinicReport.objects.create(village=beta, cholera_cases=4, date_of_reporting=localdate().isoformat())
+        cholera.delete()
+
+        # edits move the counts: -old +new
+        edited = HealthReport.objects.get(symptoms="Vomiting, Fever")
+        edited.symptoms, edited.severity, edited.village_id = "Cough, Rash", "Severe", alpha.village_id
+        edited.save()
+        clinic.fever_cases = 1
+        clinic.save()
+
+        incremental = self.rollup_rows()
+        self.assertIn((alpha.village_id, localdate(), "asha", 1, "Other", "Mild", 2), incremental)
+        self.assertIn((alpha.village_id, localdate(), "clinic", 0, "deaths", "", 1), incremental)
+        rebuild_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+
+class NgoSummaryStatisticsTests(TestCase):
+
+    def test_counts_match_the_per_query_version(self):
+        User = get_user_model()
+        ngo = User.objects.create_user(email="ngo@example.com", name="NGO", role="ngo")
+        other = User.objects.create_user(email="other@example.com", name="Other", role="ngo")
+        alpha, beta, gamma = make_village("Alpha"), make_village("Beta"), make_village("Gamma")
+        NgoSurvey.objects.create(ngo=ngo, village=alpha, clean_drinking_water=False, typhoid_cases=2)
+        NgoSurvey.objects.create(ngo=ngo, village=alpha, clean_drinking_water=True, fever_cases=1)
+        NgoSurvey.objects.create(ngo=ngo, village=beta, clean_drinking_water=True, diarrhea_cases=4)
+        NgoSurvey.objects.create(ngo=other, village=gamma, clean_drinking_water=False, typhoid_cases=9)
+
+        api = APIClient()
+        api.force_authenticate(ngo)
+        stats = api.get("/api/data_collection/summary-statistics/").json()
 
-# Create your tests here.
+        surveys = NgoSurvey.objects.filter(ngo=ngo)
+        no_water = surveys.filter(clean_drinking_water=False).values("village").distinct().count()
+        self.assertEqual(stats, {
+            "total_villages": surveys.values("village").distinct().count(),
+            "high_alert_villages": no_water,
+            "total_disease_cases": 7,
+            "villages_without_clean_water": no_water,
+        })
+        self.assertEqual((stats["total_villages"], no_water), (2, 1))
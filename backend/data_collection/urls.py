@@ -5,6 +5,8 @@ from .views import (
     AdminMapDataView,
     VillageCreateView,
     health_report_from_aasha,
+    health_reports_batch,
+    sync_pull_reports,
     aasha_worker_reports,
     disease_stats,
     surveyed_villages_status,
@@ -19,6 +21,8 @@ urlpatterns = [
     path("disease_stats/", disease_stats, name="disease_stats"),
     path("aasha_worker_reports/", aasha_worker_reports, name="aasha_worker_reports"),
     path("health-reports/", health_report_from_aasha, name="health_report_from_aasha"),
+    path("health-reports/batch/", health_reports_batch, name="health_reports_batch"),
+    path("sync/pull/", sync_pull_reports, name="sync_pull_reports"),
 
     # Village and NGO survey related
     path("villages/", VillageCreateView.as_view(), name="create-village"),
@@ -12,6 +12,7 @@ from datetime import timedelta, date
 from django.db.models import Count, Q, Case, When, CharField, Value
 from rest_framework import generics
 import json
+import uuid
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -24,6 +25,16 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from datetime import date, timedelta
 from .models import HealthReport
+from .services import ingest_health_reports, find_existing_submission, MAX_BATCH_SIZE
+from .models import SyncTombstone
+from .serializers import HealthReportSyncSerializer
+from .symptoms import FIXED_SYMPTOMS
+from .rollups import REPORTS, SOURCE_ASHA
+from .models import VillageDailyRollup
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from datetime import datetime, timezone as dt_timezone
 
 
 
@@ -47,21 +58,49 @@ def health_report_from_aasha(request):
             if field not in data:
                 return JsonResponse({"error": f"Missing field: {field}"}, status=400)
 
-        report = HealthReport.objects.create(
-            patient_name=data["patient_name"],
-            age=int(data["age"]),
-            gender=data["gender"],
-            village_id=int(data["village_id"]),
-            symptoms=data["symptoms"],
-            severity=data["severity"],
-            date_of_reporting=data["date_of_reporting"],
-            water_source=data["water_source"],
-            treatment_given=data["treatment_given"],
-            asha_worker_id=int(data["asha_worker_id"]),
-            state=data["state"],
-            district=data["district"],
-            village=data["village"],
-        )
+        key = data.get("client_submission_id") or None
+        if key is not None:
+            try:
+                key = uuid.UUID(str(key))
+            except ValueError:
+                return JsonResponse({"error": "client_submission_id must be a UUID"}, status=400)
+
+        def already_received(existing):
+            return JsonResponse({
+                "message": "Health report already received",
+                "report_id": existing.report_id
+            }, status=200)
+
+        # retried submission -> hand back the original row instead of a duplicate
+        existing = find_existing_submission(HealthReport, key)
+        if existing:
+            return already_received(existing)
+
+        try:
+            # atomic: the post_save rollup update commits together with the row
+            with transaction.atomic():
+                report = HealthReport.objects.create(
+                    patient_name=data["patient_name"],
+                    age=int(data["age"]),
+                    gender=data["gender"],
+                    village_id=int(data["village_id"]),
+                    symptoms=data["symptoms"],
+                    severity=data["severity"],
+                    date_of_reporting=data["date_of_reporting"],
+                    water_source=data["water_source"],
+                    treatment_given=data["treatment_given"],
+                    asha_worker_id=int(data["asha_worker_id"]),
+                    state=data["state"],
+                    district=data["district"],
+                    village=data["village"],
+                    client_submission_id=key,
+                )
+        except IntegrityError:
+            # a concurrent retry with the same key was inserted after our lookup
+            existing = find_existing_submission(HealthReport, key)
+            if existing is None:
+                raise
+            return already_received(existing)
 
         return JsonResponse({
             "message": "Health report created successfully",
@@ -73,6 +112,47 @@ def health_report_from_aasha(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def health_reports_batch(request):
+    """ASHA worker uploads many queued health reports in one request (offline sync)"""
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    # accept either a bare list or {"reports": [...]}
+    rows = data.get("reports") if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        return JsonResponse({"error": "Expected a non-empty list of reports"}, status=400)
+    if len(rows) > MAX_BATCH_SIZE:
+        return JsonResponse({"error": f"Batch too large, max {MAX_BATCH_SIZE} reports"}, status=400)
+
+    try:
+        results = ingest_health_reports(rows)
+    except Exception as e:
+        print("Error details:", e)
+        return JsonResponse({"error": str(e)}, status=500)
+
+    created = sum(1 for r in results if r["status"] == "created")
+    duplicates = sum(1 for r in results if r["status"] == "duplicate")
+    failed = len(results) - created - duplicates
+
+    if failed == 0:
+        status = 201 if created else 200  # pure replay of an already stored batch
+    elif created or duplicates:
+        status = 207  # partial success, see per-row results
+    else:
+        status = 400
+
+    return JsonResponse({
+        "created": created,
+        "duplicates": duplicates,
+        "failed": failed,
+        "results": results,
+    }, status=status)
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def aasha_worker_reports(request):
@@ -94,10 +174,11 @@ def aasha_worker_reports(request):
         reports = reports.filter(date_of_reporting__gte=start_date)
 
     serializer = HealthReportSerializer(reports, many=True)
+    data = serializer.data
 
     return Response({
-        "reports": serializer.data,
-        "total_disease_count": reports.count(),
+        "reports": data,
+        "total_disease_count": len(data),  # rows are already loaded, no second COUNT query
     })
 
 
@@ -111,36 +192,84 @@ def disease_stats(request):
     if not asha_worker_id:
         return Response({"error": "asha_worker_id is required"}, status=400)
 
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
+    # pre-summed daily counters instead of the raw reports
+    rollups = VillageDailyRollup.objects.filter(source=SOURCE_ASHA, asha_worker_id=asha_worker_id)
 
     today = date.today()
     if filter_period == "weekly":
         start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
     elif filter_period == "monthly":
         start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
     elif filter_period == "6months":
         start_date = today - timedelta(days=180)
-        reports = reports.filter(date_of_reporting__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
     # else: no filter
 
-    FIXED_SYMPTOMS = [
-        "Fever", "Diarrhea", "Vomiting", "Headache", "Stomach Pain",
-        "Cough", "Cold", "Fatigue", "Nausea", "Skin Rash", "Other"
-    ]
-    symptom_counts = {symptom: 0 for symptom in FIXED_SYMPTOMS}
+    totals = dict(
+        rollups.values("symptom").annotate(total=Sum("count")).order_by().values_list("symptom", "total")
+    )
+    symptom_counts = {symptom: totals.get(symptom, 0) for symptom in FIXED_SYMPTOMS}
+    total = totals.get(REPORTS, 0)
+
+    return Response({
+        "disease_counts": symptom_counts,
+        "total_disease_count": total
+    })
+
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def sync_pull_reports(request):
+    """
+    Delta pull for the mobile offline DB (WatermelonDB pull protocol).
+    Returns only reports created/updated/deleted after last_pulled_at (ms epoch).
+    """
+    asha_worker_id = request.query_params.get("asha_worker_id")
+    last_pulled_at = request.query_params.get("last_pulled_at")
+
+    if not asha_worker_id:
+        return Response({"error": "asha_worker_id is required"}, status=400)
+    try:
+        asha_worker_id = int(asha_worker_id)
+    except ValueError:
+        return Response({"error": "asha_worker_id must be an integer"}, status=400)
+
+    since = None
+    if last_pulled_at not in (None, "", "null", "0"):
+        try:
+            since = datetime.fromtimestamp(int(last_pulled_at) / 1000, tz=dt_timezone.utc)
+        except (TypeError, ValueError, OverflowError):
+            return Response({"error": "last_pulled_at must be a timestamp in milliseconds"}, status=400)
+
+    # taken before querying, so rows written while we read are sent again next pull
+    pulled_at = timezone.now()
+
+    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
+    tombstones = SyncTombstone.objects.filter(asha_worker_id=asha_worker_id, table_name="reports")
+    if since is not None:
+        reports = reports.filter(updated_at__gt=since)
+        tombstones = tombstones.filter(deleted_at__gt=since)
+    else:
+        tombstones = tombstones.none()  # first sync: nothing local to delete yet
+
+    created, updated = [], []
     for report in reports:
-        for symptom in report.symptoms.split(", "):
-            if symptom in symptom_counts:
-                symptom_counts[symptom] += 1
-            else:
-                symptom_counts["Other"] += 1
+        if since is None or report.created_at > since:
+            created.append(report)
+        else:
+            updated.append(report)
 
     return Response({
-        "disease_counts": symptom_counts,
-        "total_disease_count": reports.count()
+        "changes": {
+            "reports": {
+                "created": HealthReportSyncSerializer(created, many=True).data,
+                "updated": HealthReportSyncSerializer(updated, many=True).data,
+                "deleted": list(tombstones.values_list("record_id", flat=True)),
+            }
+        },
+        "timestamp": int(pulled_at.timestamp() * 1000),
     })
 
 
@@ -177,63 +306,29 @@ def summary_statistics(request):
     ngo_user = request.user
     surveys = NgoSurvey.objects.filter(ngo=ngo_user)
 
-    total_villages = surveys.values('village').distinct().count()
-    high_alert_villages = surveys.filter(clean_drinking_water=False).values('village').distinct().count()
-    total_disease_cases = sum(s.typhoid_cases + s.fever_cases + s.diarrhea_cases for s in surveys)
-    no_clean_water = surveys.filter(clean_drinking_water=False).values('village').distinct().count()
+    # one aggregate query instead of three COUNTs and a python loop over every survey.
+    # COUNT(DISTINCT) skips NULL while .values('village').distinct().count() counted
+    # it as one more village, so surveys without a village are added back as one.
+    no_water = Q(clean_drinking_water=False)
+    stats = surveys.aggregate(
+        total_villages=Count('village', distinct=True),
+        no_village=Count('id', filter=Q(village__isnull=True)),
+        no_clean_water=Count('village', distinct=True, filter=no_water),
+        no_clean_water_no_village=Count('id', filter=no_water & Q(village__isnull=True)),
+        total_disease_cases=Sum(F('typhoid_cases') + F('fever_cases') + F('diarrhea_cases')),
+    )
+    total_villages = stats["total_villages"] + (1 if stats["no_village"] else 0)
+    no_clean_water = stats["no_clean_water"] + (1 if stats["no_clean_water_no_village"] else 0)
 
     return Response({
         "total_villages": total_villages,
-        "high_alert_villages": high_alert_villages,
-        "total_disease_cases": total_disease_cases,
+        "high_alert_villages": no_clean_water,
+        "total_disease_cases": stats["total_disease_cases"] or 0,
         "villages_without_clean_water": no_clean_water,
     })
 
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def disease_stats(request):
-    """Symptom wise disease stats for ASHA worker"""
-    asha_worker_id = request.query_params.get("asha_worker_id")
-    filter_period = request.query_params.get("filter", "weekly")
-
-    if not asha_worker_id:
-        return Response({"error": "asha_worker_id is required"}, status=400)
-
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
-
-    today = date.today()
-    if filter_period == "weekly":
-        start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "monthly":
-        start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "6months":
-        start_date = today - timedelta(days=180)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    # else: no filter
-
-    FIXED_SYMPTOMS = [
-        "Fever", "Diarrhea", "Vomiting", "Headache", "Stomach Pain",
-        "Cough", "Cold", "Fatigue", "Nausea", "Skin Rash", "Other"
-    ]
-    symptom_counts = {symptom: 0 for symptom in FIXED_SYMPTOMS}
-
-    for report in reports:
-        for symptom in report.symptoms.split(", "):
-            if symptom in symptom_counts:
-                symptom_counts[symptom] += 1
-            else:
-                symptom_counts["Other"] += 1
-
-    return Response({
-        "disease_counts": symptom_counts,
-        "total_disease_count": reports.count()
-    })
-
-
 # ------------------- NGO Dashboard APIs -------------------
 
 @api_view(['GET'])
@@ -266,102 +361,6 @@ def get_villages_dropdown(request):
     return Response(list(villages))
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def summary_statistics(request):
-    """NGO wise survey summary"""
-    ngo_user = request.user
-    surveys = NgoSurvey.objects.filter(ngo=ngo_user)
-
-    total_villages = surveys.values('village').distinct().count()
-    high_alert_villages = surveys.filter(clean_drinking_water=False).values('village').distinct().count()
-    total_disease_cases = sum(s.typhoid_cases + s.fever_cases + s.diarrhea_cases for s in surveys)
-    no_clean_water = surveys.filter(clean_drinking_water=False).values('village').distinct().count()
-
-    return Response({
-        "total_villages": total_villages,
-        "high_alert_villages": high_alert_villages,
-        "total_disease_cases": total_disease_cases,
-        "villages_without_clean_water": no_clean_water,
-    })
-
-
-
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def aasha_worker_reports(request):
-    asha_worker_id = request.query_params.get("asha_worker_id")
-    report_period = request.query_params.get("reportPeriod", "weekly")
-    
-    if not asha_worker_id:
-        return Response({"error": "asha_worker_id is required"}, status=400)
-
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
-
-    # Filter by report period
-    today = now().date()
-    if report_period == "weekly":
-        start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif report_period == "monthly":
-        start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-
-    serializer = HealthReportSerializer(reports, many=True)
-    
-    # Prepare response with total disease count
-    response_data = {
-        "reports": serializer.data,                # same array your table uses
-        "total_disease_count": reports.count(),    # new parameter
-    }
-
-    return Response(response_data)
-
-
-
-FIXED_SYMPTOMS = [
-    "Fever", "Diarrhea", "Vomiting", "Headache", "Stomach Pain",
-    "Cough", "Cold", "Fatigue", "Nausea", "Skin Rash", "Other"
-]
-
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def disease_stats(request):
-    asha_worker_id = request.query_params.get("asha_worker_id")
-    filter_period = request.query_params.get("filter", "weekly")
-
-    if not asha_worker_id:
-        return Response({"error": "asha_worker_id is required"}, status=400)
-
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
-
-    today = date.today()
-    if filter_period == "weekly":
-        start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "monthly":
-        start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "6months":
-        start_date = today - timedelta(days=180)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    # total = no date filter
-
-    symptom_counts = {symptom: 0 for symptom in FIXED_SYMPTOMS}
-
-    for report in reports:
-        for symptom in report.symptoms.split(", "):
-            if symptom in symptom_counts:
-                symptom_counts[symptom] += 1
-            else:
-                symptom_counts["Other"] += 1
-
-    return Response({
-        "disease_counts": symptom_counts,
-        "total_disease_count": reports.count()
-    })
-
-
 class VillageCreateView(generics.ListCreateAPIView):
 
     queryset = Village.objects.all()
@@ -371,89 +370,26 @@ class VillageCreateView(generics.ListCreateAPIView):
 
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def aasha_worker_reports(request):  # for asha Worker weekly or monthly report table data fetch
-    asha_worker_id = request.query_params.get("asha_worker_id")
-    report_period = request.query_params.get("reportPeriod", "weekly")
-    
-    if not asha_worker_id:
-        return Response({"error": "asha_worker_id is required"}, status=400)
-
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
-
-    # Filter by report period
-    today = now().date()
-    if report_period == "weekly":
-        start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif report_period == "monthly":
-        start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-
-    serializer = HealthReportSerializer(reports, many=True)
-    
-    # Prepare response with total disease count
-    response_data = {
-        "reports": serializer.data,                # same array your table uses
-        "total_disease_count": reports.count(),    # new parameter
-    }
-
-    return Response(response_data)
-
-
-
-FIXED_SYMPTOMS = [
-    "Fever", "Diarrhea", "Vomiting", "Headache", "Stomach Pain",
-    "Cough", "Cold", "Fatigue", "Nausea", "Skin Rash", "Other"
-]
-
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def disease_stats(request):
-    asha_worker_id = request.query_params.get("asha_worker_id")
-    filter_period = request.query_params.get("filter", "weekly")
-
-    if not asha_worker_id:
-        return Response({"error": "asha_worker_id is required"}, status=400)
-
-    reports = HealthReport.objects.filter(asha_worker_id=asha_worker_id)
-
-    today = date.today()
-    if filter_period == "weekly":
-        start_date = today - timedelta(days=7)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "monthly":
-        start_date = today - timedelta(days=30)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    elif filter_period == "6months":
-        start_date = today - timedelta(days=180)
-        reports = reports.filter(date_of_reporting__gte=start_date)
-    # total = no date filter
-
-    symptom_counts = {symptom: 0 for symptom in FIXED_SYMPTOMS}
-
-    for report in reports:
-        for symptom in report.symptoms.split(", "):
-            if symptom in symptom_counts:
-                symptom_counts[symptom] += 1
-            else:
-                symptom_counts["Other"] += 1
-
-    return Response({
-        "disease_counts": symptom_counts,
-        "total_disease_count": reports.count()
-    })
-
-
 class NgoSurveyView(APIView):
     permission_classes = [IsAuthenticated, IsNgoUser]
     serializer_class = NgoSurveySerializer
 
     def post(self, request):
+        existing = find_existing_submission(NgoSurvey, request.data.get("client_submission_id"))
+        if existing:
+            return Response(self.serializer_class(existing).data, status=200)
+
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        survey = serializer.save(ngo=request.user)  # ngo auto-assign
+        try:
+            with transaction.atomic():
+                survey = serializer.save(ngo=request.user)  # ngo auto-assign
+        except IntegrityError:
+            # a concurrent retry with the same key was inserted after our lookup
+            existing = find_existing_submission(NgoSurvey, request.data.get("client_submission_id"))
+            if existing is None:
+                raise
+            return Response(self.serializer_class(existing).data, status=200)
         return Response(self.serializer_class(survey).data, status=201)
 
     def get(self, request):
@@ -481,9 +417,21 @@ class AdminMapDataView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def get(self, request):
-        thirty_days_ago = timezone.now() - timedelta(days=30)
+        thirty_days_ago = timezone.now().date() - timedelta(days=30)
+        # reports per village over the last 30 days, summed from the daily rollups
+        recent_cases = (
+            VillageDailyRollup.objects.filter(
+                village_id=OuterRef('village_id'),
+                source=SOURCE_ASHA,
+                symptom=REPORTS,
+                date__gte=thirty_days_ago,
+            )
+            .values('village_id')
+            .annotate(total=Sum('count'))
+            .values('total')
+        )
         map_data = Village.objects.annotate(
-            case_count=Count('healthreports', filter=Q(healthreports__date_of_reporting__gte=thirty_days_ago)),
+            case_count=Coalesce(Subquery(recent_cases), 0),
             risk_level=Case(
                 When(case_count__gt=20, then=Value('High')),
                 When(case_count__gt=10, then=Value('Moderate')),
@@ -500,9 +448,21 @@ class ClinicReportView(APIView):
 
     def post(self, request):
         """Create new clinic report"""
+        existing = find_existing_submission(ClinicReport, request.data.get("client_submission_id"))
+        if existing:
+            return Response(ClinicReportSerializer(existing).data, status=200)
+
         serializer = ClinicReportSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        report = serializer.save(clinic=request.user)  # clinic auto-assign
+        try:
+            with transaction.atomic():
+                report = serializer.save(clinic=request.user)  # clinic auto-assign
+        except IntegrityError:
+            # a concurrent retry with the same key was inserted after our lookup
+            existing = find_existing_submission(ClinicReport, request.data.get("client_submission_id"))
+            if existing is None:
+                raise
+            return Response(ClinicReportSerializer(existing).data, status=200)
         return Response(ClinicReportSerializer(report).data, status=201)
 
     def get(self, request):
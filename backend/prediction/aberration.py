@@ -0,0 +1,164 @@
+# prediction/aberration.py
+"""
+Statistical aberration detection on each village's daily case series
+(ASHA reports per day from data_collection's VillageDailyRollup).
+
+Detector "ewma_cusum", per village:
+  expected   = EWMA of past daily counts, spread = EWMA variance
+               (floored at the Poisson variance, i.e. the mean, and at 1)
+  z          = (today - expected) / spread
+  cusum      = max(0, cusum + z - K), alarm when cusum > H after WARMUP_DAYS
+  the baseline only learns from non-alarm days so an outbreak does not become "normal"
+
+The whole state is a handful of numbers per village (VillageDetectorState),
+advanced one day at a time - nothing is refit over history. All villages
+are stepped together as NumPy arrays, one loop iteration per day.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.utils.timezone import localdate
+
+from data_collection.models import HealthReport, Village, VillageDailyRollup
+from data_collection.rollups import REPORTS, SOURCE_ASHA
+from . import signals
+from .early_warning import structured_alert_data
+from .models import EarlyWarningAlert, VillageDetectorState
+
+DETECTOR = "ewma_cusum"
+EWMA_WEIGHT = 0.2     # weight of the newest day in the baseline
+CUSUM_K = 0.5         # allowance, in standard deviations
+CUSUM_H = 4.0         # decision threshold
+WARMUP_DAYS = 14      # no alarms before the baseline has seen this many days
+HISTORY_DAYS = 28     # a village without state starts this far back
+ALERT_LOOKBACK_DAYS = 2   # onsets older than this (history replay) are not alerted
+
+
+def daily_case_matrix(village_ids, first_day, last_day):
+    """[village, day] array of ASHA reports per day, one grouped query"""
+    index = {vid: i for i, vid in enumerate(village_ids)}
+    matrix = np.zeros((len(village_ids), (last_day - first_day).days + 1))
+    rows = (
+        VillageDailyRollup.objects.filter(
+            source=SOURCE_ASHA, symptom=REPORTS, date__gte=first_day, date__lte=last_day
+        )
+        .values("village_id", "date")
+        .annotate(cases=Sum("count"))
+        .order_by()
+    )
+    for row in rows.iterator():
+        i = index.get(row["village_id"])
+        if i is not None:
+            matrix[i, (row["date"] - first_day).days] = row["cases"]
+    return matrix
+
+
+def ewma_cusum_step(x, active, mean, variance, cusum, days_seen, k=CUSUM_K, h=CUSUM_H):
+    """
+    Advance every village by one day (arrays in, arrays out).
+    active: villages whose state is older than this day.
+    k / h default to the live settings (backtest.py sweeps them).
+    Returns (mean, variance, cusum, days_seen, alarm, expected, spread).
+    """
+    first = active & (days_seen == 0)
+    mean = np.where(first, x, mean)  # first day seeds the baseline
+
+    spread = np.sqrt(np.maximum(variance, np.maximum(mean, 1.0)))
+    expected = mean
+    new_cusum = np.maximum(0.0, cusum + (x - mean) / spread - k)
+    warm = days_seen >= WARMUP_DAYS
+    alarm = active & warm & (new_cusum > h)
+
+    learn = active & ~alarm
+    diff = x - mean
+    mean = np.where(learn, mean + EWMA_WEIGHT * diff, mean)
+    variance = np.where(learn, (1 - EWMA_WEIGHT) * (variance + EWMA_WEIGHT * diff ** 2), variance)
+    cusum = np.where(active, np.where(warm, new_cusum, 0.0), cusum)
+    days_seen = days_seen + active
+    return mean, variance, cusum, days_seen, alarm, expected, spread
+
+
+def run_aberration_detection(today=None):
+    """
+    Fold every complete day since each village's last run into its state,
+    save the states and raise one EarlyWarningAlert (detector "ewma_cusum")
+    per village whose alarm started in the last ALERT_LOOKBACK_DAYS days.
+    Returns a small summary dict.
+    """
+    end_day = (today or localdate()) - timedelta(days=1)  # today is not complete yet
+    villages = list(Village.objects.order_by("village_id").values_list("village_id", "village_name", "district_name", "state_name"))
+    if not villages:
+        return {"villages": 0, "days": 0, "alerts": 0}
+    village_ids = [v[0] for v in villages]
+
+    states = {s.village_id: s for s in VillageDetectorState.objects.filter(detector=DETECTOR)}
+    fresh_start = end_day - timedelta(days=HISTORY_DAYS)
+    last_day = np.array([(states[v].last_day if v in states else fresh_start).toordinal() for v in village_ids])
+    mean = np.array([states[v].mean if v in states else 0.0 for v in village_ids])
+    variance = np.array([states[v].variance if v in states else 0.0 for v in village_ids])
+    cusum = np.array([states[v].cusum if v in states else 0.0 for v in village_ids])
+    days_seen = np.array([states[v].days_seen if v in states else 0 for v in village_ids])
+    in_alarm = np.array([states[v].in_alarm if v in states else False for v in village_ids])
+
+    first_day = end_day.fromordinal(int(last_day.min()) + 1)
+    if first_day > end_day:
+        return {"villages": len(villages), "days": 0, "alerts": 0}
+
+    cases = daily_case_matrix(village_ids, first_day, end_day)
+    onsets = []  # (village index, day, observed, expected, spread, cusum)
+    for d in range(cases.shape[1]):
+        day = first_day + timedelta(days=d)
+        active = last_day < day.toordinal()
+        x = cases[:, d]
+        mean, variance, cusum, days_seen, alarm, expected, spread = ewma_cusum_step(
+            x, active, mean, variance, cusum, days_seen
+        )
+        if (end_day - day).days < ALERT_LOOKBACK_DAYS:
+            for i in np.flatnonzero(alarm & ~in_alarm):
+                onsets.append((i, day, x[i], expected[i], spread[i], cusum[i]))
+        in_alarm = np.where(active, alarm, in_alarm)
+
+    VillageDetectorState.objects.bulk_create(
+        [
+            VillageDetectorState(
+                village_id=vid, detector=DETECTOR, last_day=end_day, days_seen=int(days_seen[i]),
+                mean=float(mean[i]), variance=float(variance[i]), cusum=float(cusum[i]), in_alarm=bool(in_alarm[i]),
+            )
+            for i, vid in enumerate(village_ids)
+        ],
+        batch_size=2000,
+        update_conflicts=True,
+        unique_fields=["village_id", "detector"],
+        update_fields=["last_day", "days_seen", "mean", "variance", "cusum", "in_alarm"],
+    )
+
+    alerts = []
+    for i, day, observed, expected, spread, score in onsets:
+        village_id, village_name, district_name, state_name = villages[i]
+        alerts.append(EarlyWarningAlert(
+            village_name=village_name,
+            district_name=district_name,
+            state_name=state_name,
+            rbalert=(
+                f"Unusual Rise in Reports: {int(observed)} reports on {day} "
+                f"against an expected {expected:.1f} (CUSUM {score:.1f} > {CUSUM_H})"
+            ),
+            detector=DETECTOR,
+            details={
+                "village_id": village_id,
+                "day": day.isoformat(),
+                "observed": int(observed),
+                "expected": round(float(expected), 2),
+                "spread": round(float(spread), 2),
+                "cusum": round(float(score), 2),
+                "k": CUSUM_K,
+                "h": CUSUM_H,
+            },
+            structured_data=structured_alert_data([], HealthReport.objects.filter(village_id=village_id, date_of_reporting=day)),
+        ))
+    if alerts:
+        alerts = EarlyWarningAlert.objects.bulk_create(alerts)
+        signals.alerts_created.send(sender=EarlyWarningAlert, alerts=alerts)
+
+    return {"villages": len(villages), "days": cases.shape[1], "alerts": len(alerts)}
@@ -0,0 +1,229 @@
+# prediction/backtest.py
+"""
+Backtesting of the early-warning rules and detectors on historical data.
+
+  load_history(first_day, last_day)  -> per-village daily arrays, two grouped queries
+  replay_rules / replay_ewma_cusum   -> alert onsets [village, day] for one setting
+  score_onsets(onsets, events)       -> hits, lead time and alert volume
+  run_backtest(grid, ...)            -> one result row per setting, settings run in a billiard process pool
+                                        (works from the command line and inside a Celery worker)
+
+Data is read once: HealthReport rule counters and ClinicReport cases per
+(village, day). Day-by-day replay then never goes back to the database: the
+rule window is a running sum (yesterday's window + today - the day that
+drops out, i.e. differences of one cumulative sum), and the EWMA-CUSUM
+state is stepped day to day exactly like the nightly detector.
+
+Ground truth is the clinic side: an outbreak event is the day a village's
+confirmed clinic cases over EVENT_WINDOW days first reach EVENT_CASES.
+An event is hit when the setting raised an alert for that village in the
+LEAD_DAYS before it (or on the day); lead time is counted from the earliest
+such alert.
+"""
+import itertools
+import os
+from datetime import timedelta
+
+import billiard
+import numpy as np
+from django.db.models import Count, F, Sum
+
+from data_collection.models import ClinicReport, HealthReport, Village
+from .aberration import CUSUM_H, CUSUM_K, ewma_cusum_step
+from .realtime import COUNTER_FIELDS, MIN_WINDOW_REPORTS, WINDOW_DAYS
+from .rules import RULE_CONDITIONS
+
+# ground truth
+EVENT_WINDOW = 7
+EVENT_CASES = 10
+CLINIC_CASE_FIELDS = ["typhoid_cases", "fever_cases", "diarrhea_cases", "cholera_cases"]
+LEAD_DAYS = 14
+
+# live settings, the default grid point (see evaluate_rules and prediction/realtime.py)
+RULE_DEFAULTS = {
+    "window": WINDOW_DAYS,
+    "min_reports": MIN_WINDOW_REPORTS,
+    "waterborne": 0.1,
+    "flu": 0.15,
+    "severe": 0.05,
+    "child": 0,       # alert when more than this many severe child cases
+}
+CUSUM_DEFAULTS = {"k": CUSUM_K, "h": CUSUM_H}
+DETECTORS = ["rules", "ewma_cusum"]
+
+
+def load_history(first_day, last_day):
+    """
+    {"village_ids": [...], "days": n, counter: [village, day] array for every
+    COUNTER_FIELDS entry, "clinic": [village, day] confirmed clinic cases}.
+    """
+    village_ids = list(Village.objects.order_by("village_id").values_list("village_id", flat=True))
+    index = {vid: i for i, vid in enumerate(village_ids)}
+    n_days = (last_day - first_day).days + 1
+    history = {"village_ids": village_ids, "first_day": first_day, "days": n_days}
+    for field in COUNTER_FIELDS + ["clinic"]:
+        history[field] = np.zeros((len(village_ids), n_days), dtype=np.int32)
+
+    reports = (
+        HealthReport.objects.filter(date_of_reporting__gte=first_day, date_of_reporting__lte=last_day, village_id__isnull=False)
+        .values("village_id", "date_of_reporting")
+        .annotate(
+            total=Count("pk"),
+            **{f: Count("pk", filter=RULE_CONDITIONS[f]) for f in COUNTER_FIELDS if f != "total"},
+        )
+        .order_by()
+    )
+    for row in reports.iterator():
+        i = index.get(row["village_id"])
+        if i is None:
+            continue
+        d = (row["date_of_reporting"] - first_day).days
+        for field in COUNTER_FIELDS:
+            history[field][i, d] = row[field]
+
+    clinic = (
+        ClinicReport.objects.filter(date_of_reporting__gte=first_day, date_of_reporting__lte=last_day)
+        .values("village_id", "date_of_reporting")
+        .annotate(cases=Sum(sum((F(f) for f in CLINIC_CASE_FIELDS[1:]), F(CLINIC_CASE_FIELDS[0]))))
+        .order_by()
+    )
+    for row in clinic.iterator():
+        i = index.get(row["village_id"])
+        if i is not None:
+            history["clinic"][i, (row["date_of_reporting"] - first_day).days] = row["cases"]
+    return history
+
+
+def window_sums(daily, window):
+    """Running sum over the last `window` days for every day, [village, day]"""
+    running = np.cumsum(daily, axis=1, dtype=np.int64)
+    running[:, window:] = running[:, window:] - running[:, :-window]
+    return running
+
+
+def onsets_of(firing):
+    """True where a village starts firing (it did not fire the day before)"""
+    onsets = firing.copy()
+    onsets[:, 1:] &= ~firing[:, :-1]
+    return onsets
+
+
+def outbreak_events(clinic, window=EVENT_WINDOW, cases=EVENT_CASES):
+    return onsets_of(window_sums(clinic, window) >= cases)
+
+
+def replay_rules(history, window, min_reports, waterborne, flu, severe, child):
+    """Alert onsets of the window rules (as prediction/realtime.py raises them) for one setting"""
+    w = {field: window_sums(history[field], window) for field in COUNTER_FIELDS}
+    total = w["total"]
+    firing = (
+        (w["waterborne"] >= waterborne * total)
+        | (w["fever"] + w["cough"] >= flu * total)
+        | (w["severe"] >= severe * total)
+        | (w["children_severe"] > child)
+    ) & (total >= min_reports)
+    return onsets_of(firing)
+
+
+def replay_ewma_cusum(history, k, h):
+    """Alarm onsets of the EWMA-CUSUM detector for one (k, h), stepped day by day"""
+    cases = history["total"].astype(float)
+    n = cases.shape[0]
+    mean, variance, cusum = np.zeros(n), np.zeros(n), np.zeros(n)
+    days_seen = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    alarms = np.zeros(cases.shape, dtype=bool)
+    for d in range(cases.shape[1]):
+        mean, variance, cusum, days_seen, alarms[:, d], _, _ = ewma_cusum_step(
+            cases[:, d], active, mean, variance, cusum, days_seen, k=k, h=h
+        )
+    return onsets_of(alarms)
+
+
+def score_onsets(onsets, events, lead_days=LEAD_DAYS, skip_days=0):
+    """
+    Hit counts, lead time and alert volume. The first skip_days are warm-up
+    (windows not full yet): their alerts and events are not counted.
+    """
+    onsets, events = onsets[:, skip_days:], events[:, skip_days:]
+    n_villages, n_days = onsets.shape
+
+    event_v, event_d = np.nonzero(events)
+    lead = np.full(len(event_d), -1)
+    for back in range(lead_days, -1, -1):  # earliest alert first
+        day = event_d - back
+        ok = (day >= 0) & (lead < 0)
+        ok[ok] = onsets[event_v[ok], day[ok]]
+        lead[ok] = back
+    hits = lead >= 0
+
+    # an alert is confirmed when an event follows within lead_days
+    padded = np.concatenate([events, np.zeros((n_villages, lead_days + 1), dtype=bool)], axis=1)
+    upcoming = np.cumsum(padded[:, ::-1], axis=1)[:, ::-1]
+    confirmed = (upcoming[:, :n_days] - upcoming[:, lead_days + 1:lead_days + 1 + n_days]) > 0
+    alerts = int(onsets.sum())
+    false_alerts = int((onsets & ~confirmed).sum())
+
+    village_months = max(n_villages * n_days / 30.0, 1e-9)
+    return {
+        "alerts": alerts,
+        "alerts_per_village_month": round(alerts / village_months, 3),
+        "events": len(event_d),
+        "hits": int(hits.sum()),
+        "hit_rate": round(float(hits.mean()), 3) if len(event_d) else None,
+        "mean_lead_days": round(float(lead[hits].mean()), 1) if hits.any() else None,
+        "median_lead_days": float(np.median(lead[hits])) if hits.any() else None,
+        "false_alerts": false_alerts,
+        "precision": round(1 - false_alerts / alerts, 3) if alerts else None,
+    }
+
+
+def expand_grid(grid):
+    """{"rules": {"window": [7, 14], ...}, ...} -> [(detector, params), ...] over every combination"""
+    settings = []
+    for detector, defaults in (("rules", RULE_DEFAULTS), ("ewma_cusum", CUSUM_DEFAULTS)):
+        if detector not in grid:
+            continue
+        values = {name: grid[detector].get(name) or [default] for name, default in defaults.items()}
+        for combo in itertools.product(*values.values()):
+            settings.append((detector, dict(zip(values, combo))))
+    return settings
+
+
+# set once per pool worker, so the history is not pickled for every setting
+_history = None
+
+
+def _init_worker(history):
+    global _history
+    _history = history
+
+
+def _run_setting(detector, params, lead_days, skip_days, event_window, event_cases):
+    history = _history
+    if detector == "rules":
+        onsets = replay_rules(history, **params)
+    else:
+        onsets = replay_ewma_cusum(history, **params)
+    events = outbreak_events(history["clinic"], event_window, event_cases)
+    return {"detector": detector, "params": params, **score_onsets(onsets, events, lead_days, skip_days)}
+
+
+def run_backtest(first_day, last_day, grid, lead_days=LEAD_DAYS, event_window=EVENT_WINDOW,
+                 event_cases=EVENT_CASES, workers=None):
+    """
+    Replay every setting of the grid over [first_day, last_day] for every
+    village. History is loaded from before first_day so the longest rule
+    window is full on the first scored day. Returns one result dict per setting.
+    """
+    settings = expand_grid(grid)
+    warmup = max([params.get("window", 1) for _, params in settings] + [event_window]) - 1
+    history = load_history(first_day - timedelta(days=warmup), last_day)
+    jobs = [(detector, params, lead_days, warmup, event_window, event_cases) for detector, params in settings]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        _init_worker(history)
+        return [_run_setting(*job) for job in jobs]
+    with billiard.Pool(processes=workers, initializer=_init_worker, initargs=(history,)) as pool:
+        return pool.starmap(_run_setting, jobs)
@@ -0,0 +1,202 @@
+# prediction/early_warning.py
+"""
+Rule-based early warning over HealthReport windows.
+
+  reports_dataframe(queryset)      -> DataFrame in the column layout utils/rule_based_model expects
+                                      (pandas reference path, the API counts in SQL via prediction/rules.py)
+  generate_partition_alerts(...)   -> one EarlyWarningAlert per village (or district) whose rules fire
+  stream_rule_counts(queryset)     -> rule counts over any window, reading fixed-size chunks
+  alert_scope_key / data_watermark -> memo key for repeated generate_early_warning_alert calls
+  structured_alert_data(...)       -> rule results + cases stored on the alert, so summaries skip LLM extraction
+"""
+from datetime import timedelta
+
+import pandas as pd
+from django.db.models import Count, Max
+from django.utils.timezone import now
+
+from data_collection.models import HealthReport
+from utils.rule_based_model import (
+    alerts_text, compute_rule_counts, empty_rule_counts, evaluate_rules, merge_rule_counts,
+)
+from . import signals
+from .models import EarlyWarningAlert
+from .pydantic_schemas import IndividualReport
+from .rules import sql_partitioned_rule_counts
+
+# time_period accepted by the API -> days back from today
+TIME_PERIODS = {"week": 7, "month": 30}
+
+# HealthReport field -> rule engine column
+RULE_COLUMNS = {
+    "age": "Age",
+    "symptoms": "Symptoms",
+    "severity": "Severity",
+    "water_source": "Water Source",
+    "treatment_given": "Treatment Given",
+    "water_quality": "Water Quality",
+}
+
+# partition level -> HealthReport fields forming the key (state, district[, village])
+PARTITION_LEVELS = {
+    "village": ["state", "district", "village"],
+    "district": ["state", "district"],
+}
+
+
+def window_start(time_period):
+    """'week' / 'month' -> first date of the window, None for anything else"""
+    days = TIME_PERIODS.get(time_period)
+    if days is None:
+        return None
+    return now().date() - timedelta(days=days)
+
+
+def reports_dataframe(queryset, extra_fields=()):
+    """HealthReport queryset -> DataFrame with the rule engine's column names (extra fields keep theirs)"""
+    df = pd.DataFrame.from_records(
+        queryset.values(*RULE_COLUMNS, *extra_fields),
+        columns=[*RULE_COLUMNS, *extra_fields],
+    )
+    return df.rename(columns=RULE_COLUMNS)
+
+
+def area_filter(state_name=None, district_name=None, village_name=None):
+    """Case-insensitive HealthReport filter for the given area, empty values are ignored"""
+    filters = {}
+    if state_name:
+        filters["state__iexact"] = state_name
+    if district_name:
+        filters["district__iexact"] = district_name
+    if village_name:
+        filters["village__iexact"] = village_name
+    return filters
+
+
+def alert_scope_key(time_period, start_date, state_name=None, district_name=None, village_name=None):
+    """'week|2025-09-13|odisha|puri|' - the window and area a rule evaluation covered"""
+    parts = [time_period, start_date.isoformat()] + [(value or "").strip().lower() for value in (state_name, district_name, village_name)]
+    return "|".join(parts)
+
+
+def data_watermark(queryset):
+    """
+    Fingerprint of the reports in scope: max report_id (new rows), row count
+    (deletions) and max updated_at (edits). None when there are no reports.
+    One aggregate query, much cheaper than evaluating the rules.
+    """
+    mark = queryset.aggregate(last_id=Max("report_id"), rows=Count("report_id"), last_update=Max("updated_at"))
+    if not mark["rows"]:
+        return None
+    return f"{mark['last_id']}:{mark['rows']}:{mark['last_update'].isoformat()}"
+
+
+# cases stored per alert (newest first); the summary only needs a representative sample
+MAX_STRUCTURED_CASES = 50
+CASE_SYMPTOMS = ["Vomiting", "Cough", "Diarrhea", "Fever"]
+CASE_SEVERITIES = {"mild": "Mild", "moderate": "Moderate", "severe": "Severe"}
+
+
+def individual_case(age, symptoms, severity, water_quality, treatment_given):
+    """
+    One HealthReport row -> IndividualReport dict (what LLM extraction used to
+    produce from the alert text), None when the severity is not one of the three.
+    """
+    severity = CASE_SEVERITIES.get((severity or "").strip().lower())
+    if severity is None:
+        return None
+    symptoms = (symptoms or "").lower()
+    treatment = (treatment_given or "").strip()
+    return IndividualReport(
+        severity=severity,
+        age=int(age),
+        symptoms=[s for s in CASE_SYMPTOMS if s.lower() in symptoms],
+        water_quality="Poor" if "poor" in (water_quality or "").lower() else "Good",
+        treatment_given=("None" if "no treatment" in treatment.lower() else "Yes") if treatment else None,
+    ).model_dump()
+
+
+def structured_alert_data(results, queryset, max_cases=MAX_STRUCTURED_CASES):
+    """
+    EarlyWarningAlert.structured_data for an alert raised over `queryset`
+    (HealthReport): the triggered rules and up to max_cases of the newest cases.
+    One query for the cases, one for the count.
+    """
+    rows = queryset.order_by("-date_of_reporting", "-report_id").values_list(
+        "age", "symptoms", "severity", "water_quality", "treatment_given"
+    )[:max_cases]
+    cases = [case for case in (individual_case(*row) for row in rows) if case is not None]
+    return {
+        "rules": [r.model_dump() for r in results if r.triggered],
+        "individuals": cases,
+        "case_count": queryset.count(),
+    }
+
+
+def evaluate_partitions(start_date, level="village", **area):
+    """
+    Run the rule engine on every village (or district) of the window in one pass.
+    Returns [(area key dict, [RuleResult, ...]), ...] for every partition with reports.
+    """
+    key_fields = PARTITION_LEVELS[level]
+    queryset = HealthReport.objects.filter(date_of_reporting__gte=start_date, **area_filter(**area))
+
+    partitions = sql_partitioned_rule_counts(queryset, key_fields)
+    return [
+        (dict(zip(key_fields, key)), evaluate_rules(counts))
+        for key, counts in partitions.items()
+    ]
+
+
+def generate_partition_alerts(time_period="week", level="village", **area):
+    """
+    Evaluate every partition of the window and bulk-create one EarlyWarningAlert
+    per partition where at least one rule fired. District-level alerts have an
+    empty village_name. Returns the created alerts.
+    """
+    start_date = window_start(time_period)
+    if start_date is None:
+        raise ValueError(f"Invalid time_period: {time_period}")
+
+    window = HealthReport.objects.filter(date_of_reporting__gte=start_date)
+    alerts = []
+    for key, results in evaluate_partitions(start_date, level=level, **area):
+        if not any(r.triggered for r in results):
+            continue
+        alerts.append(EarlyWarningAlert(
+            village_name=key.get("village", ""),
+            district_name=key["district"],
+            state_name=key["state"],
+            rbalert=alerts_text(results),
+            structured_data=structured_alert_data(results, window.filter(**key)),
+        ))
+    alerts = EarlyWarningAlert.objects.bulk_create(alerts)
+    if alerts:
+        signals.alerts_created.send(sender=EarlyWarningAlert, alerts=alerts)
+    return alerts
+
+
+# rows per chunk for stream_rule_counts, a few MB of DataFrame each
+STREAM_CHUNK_SIZE = 5000
+
+
+def stream_rule_counts(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    compute_rule_counts() over a HealthReport queryset of any size: rows are read
+    in report_id order through a server-side cursor (.iterator), chunk_size at a
+    time, and each chunk's counts are merged into running totals. Peak memory is
+    one chunk, the result equals the DataFrame-at-once evaluation.
+    """
+    columns = list(RULE_COLUMNS.values())
+    counts = empty_rule_counts()
+    rows = queryset.order_by("report_id").values_list(*RULE_COLUMNS).iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            merge_rule_counts(counts, compute_rule_counts(pd.DataFrame.from_records(chunk, columns=columns)))
+            chunk = []
+    if chunk:
+        merge_rule_counts(counts, compute_rule_counts(pd.DataFrame.from_records(chunk, columns=columns)))
+    return counts
@@ -0,0 +1,89 @@
+# prediction/llm_cache.py
+"""
+Persistent cache for Ollama outputs (LLMCache rows).
+
+  cache_key(model, prompt_version, kind, payload) -> sha256 hex of the inputs
+  cached_llm_output(kind, model, prompt_version, payload, compute)
+      -> stored output on a hit, otherwise compute() and store it
+  cache_lookup / cache_store -> the two halves, for callers that produce the output themselves (streaming)
+  evict_llm_cache()  -> drop entries unused for MAX_AGE_DAYS, then the least
+                        recently used ones until the table is under MAX_BYTES
+
+The key covers everything that decides the output: the model, the prompt
+template version (bump it in services.py when a prompt changes) and the input
+(alert text or structured case data, JSON with sorted keys). Outputs are
+stored raw; clean-up like clean_summary_output runs after the lookup.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import LLMCache
+
+MAX_AGE_DAYS = 30
+MAX_BYTES = 50 * 1024 * 1024
+
+
+def cache_key(model, prompt_version, kind, payload):
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, sort_keys=True, default=str)
+    raw = json.dumps([model, prompt_version, kind, payload])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cache_lookup(kind, model, prompt_version, payload):
+    """Stored output or None; a hit refreshes last_used_at"""
+    key = cache_key(model, prompt_version, kind, payload)
+    hit = LLMCache.objects.filter(key=key).values_list("output", flat=True).first()
+    if hit is not None:
+        LLMCache.objects.filter(key=key).update(hits=F("hits") + 1, last_used_at=now())
+    return hit
+
+
+def cache_store(kind, model, prompt_version, payload, output):
+    try:
+        with transaction.atomic():
+            LLMCache.objects.create(
+                key=cache_key(model, prompt_version, kind, payload),
+                kind=kind,
+                model=model,
+                prompt_version=prompt_version,
+                output=output,
+                size=len(output.encode("utf-8")),
+                last_used_at=now(),
+            )
+    except IntegrityError:
+        pass  # another worker stored the same key meanwhile
+
+
+def cached_llm_output(kind, model, prompt_version, payload, compute):
+    """compute() -> str runs only on a miss"""
+    hit = cache_lookup(kind, model, prompt_version, payload)
+    if hit is not None:
+        return hit
+    output = compute()
+    cache_store(kind, model, prompt_version, payload, output)
+    return output
+
+
+def evict_llm_cache(max_age_days=MAX_AGE_DAYS, max_bytes=MAX_BYTES):
+    """Returns the number of entries removed"""
+    removed, _ = LLMCache.objects.filter(last_used_at__lt=now() - timedelta(days=max_age_days)).delete()
+
+    # newest first, keep adding until the budget is spent; the rest goes
+    total, cutoff = 0, None
+    for pk, size, last_used_at in LLMCache.objects.order_by("-last_used_at", "-pk").values_list("pk", "size", "last_used_at").iterator():
+        total += size
+        if total > max_bytes:
+            cutoff = (last_used_at, pk)
+            break
+    if cutoff is not None:
+        last_used_at, pk = cutoff
+        over, _ = LLMCache.objects.filter(last_used_at__lt=last_used_at).delete()
+        tie, _ = LLMCache.objects.filter(last_used_at=last_used_at, pk__lte=pk).delete()
+        removed += over + tie
+    return removed
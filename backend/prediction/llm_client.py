@@ -0,0 +1,160 @@
+# prediction/llm_client.py
+"""
+Inference client for the local Ollama server (settings OLLAMA_*).
+
+  get_client()                -> process-wide LLMClient, one pooled HTTP connection set
+  client.chat / client.generate -> ollama calls with a per-call timeout, retries with
+                                 exponential backoff and keep_alive so the model stays loaded
+  client.stream_generate      -> generate(stream=True) as text pieces, retried until the first piece
+  client.warm_up()            -> load the model before a batch (empty prompt)
+  run_concurrently(fn, items) -> fn over items, at most OLLAMA_CONCURRENCY in flight
+  submit_background(fn, ...)  -> Future of fn on a shared pool, for calls that may outlive the caller
+
+The underlying httpx client keeps connections open and is thread-safe, so
+every thread of run_concurrently shares one client. The server decides how
+many requests really run in parallel (OLLAMA_NUM_PARALLEL); keep
+OLLAMA_CONCURRENCY at that value so requests queue here, not over HTTP.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import ollama
+from django.conf import settings
+from django.db import connections
+
+# transient failures worth another try (ollama raises the builtin ConnectionError when the server is down)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0   # seconds, doubled per attempt, plus jitter
+BACKOFF_MAX = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient:
+    def __init__(self, host=None, model=None, timeout=None, retries=None, keep_alive=None):
+        self.model = model or settings.OLLAMA_MODEL
+        self.timeout = timeout if timeout is not None else settings.OLLAMA_TIMEOUT
+        self.retries = retries if retries is not None else settings.OLLAMA_RETRIES
+        self.keep_alive = keep_alive or settings.OLLAMA_KEEP_ALIVE
+        self._client = ollama.Client(host=host or settings.OLLAMA_HOST, timeout=self.timeout)
+
+    def _call(self, method, **kwargs):
+        kwargs.setdefault("model", self.model)
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        for attempt in range(self.retries + 1):
+            try:
+                return getattr(self._client, method)(**kwargs)
+            except ollama.ResponseError as e:
+                if e.status_code not in RETRY_STATUS or attempt == self.retries:
+                    raise
+                error = e
+            except (httpx.TimeoutException, httpx.TransportError, ConnectionError) as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (1 + random.random() / 2)
+            logger.warning("Ollama %s failed (%s), retry %d/%d in %.1fs", method, error, attempt + 1, self.retries, delay)
+            time.sleep(delay)
+
+    def chat(self, **kwargs):
+        return self._call("chat", **kwargs)
+
+    def generate(self, **kwargs):
+        return self._call("generate", **kwargs)
+
+    def stream_generate(self, **kwargs):
+        """
+        Yield the response text piece by piece as the model produces it.
+        Failures before the first piece are retried like _call; once text has
+        been sent a failure is raised (the caller already showed part of it).
+        """
+        kwargs.update(stream=True)
+        kwargs.setdefault("model", self.model)
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                for chunk in self._client.generate(**kwargs):
+                    started = True
+                    if chunk["response"]:
+                        yield chunk["response"]
+                return
+            except (ollama.ResponseError, httpx.TimeoutException, httpx.TransportError, ConnectionError) as e:
+                retryable = not isinstance(e, ollama.ResponseError) or e.status_code in RETRY_STATUS
+                if started or not retryable or attempt == self.retries:
+                    raise
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (1 + random.random() / 2)
+                logger.warning("Ollama stream failed (%s), retry %d/%d in %.1fs", e, attempt + 1, self.retries, delay)
+                time.sleep(delay)
+
+    def warm_up(self):
+        """An empty prompt makes Ollama load the model and keep it for keep_alive"""
+        try:
+            self.generate(prompt="")
+        except Exception:
+            logger.exception("Model warm-up failed")  # the real calls will report it too
+
+
+_client = None
+_background = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def run_concurrently(fn, items, max_workers=None):
+    """
+    [(item, result, error), ...] in input order; error is None on success.
+    Worker threads open their own DB connections, they are closed after each item.
+    """
+    items = list(items)
+    max_workers = max_workers or settings.OLLAMA_CONCURRENCY
+
+    def run(item):
+        try:
+            return item, fn(item), None
+        except Exception as e:
+            logger.exception("Model call failed for %r", item)
+            return item, None, e
+
+    def run_in_thread(item):
+        try:
+            return run(item)
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [run(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(run_in_thread, items))
+
+
+def submit_background(fn, *args):
+    """
+    fn(*args) on the process-wide background pool (OLLAMA_CONCURRENCY threads),
+    returns the Future. The caller may stop waiting; the call still finishes.
+    """
+    global _background
+    if _background is None:
+        with _client_lock:
+            if _background is None:
+                _background = ThreadPoolExecutor(max_workers=settings.OLLAMA_CONCURRENCY, thread_name_prefix="ollama")
+
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            connections.close_all()
+
+    return _background.submit(run)
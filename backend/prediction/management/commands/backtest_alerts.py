@@ -0,0 +1,72 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from prediction import backtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the early-warning rules and the EWMA-CUSUM detector day by day over historical reports "
+        "and score every threshold setting against clinic-confirmed outbreaks. "
+        "Every option taking several values adds a grid dimension."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=date.fromisoformat, help="first day scored (default: a year before --end)")
+        parser.add_argument("--end", type=date.fromisoformat, help="last day scored (default: yesterday)")
+        parser.add_argument("--detectors", nargs="+", choices=backtest.DETECTORS, default=backtest.DETECTORS)
+
+        parser.add_argument("--window", nargs="+", type=int, help="rule window in days")
+        parser.add_argument("--min-reports", nargs="+", type=int)
+        parser.add_argument("--waterborne", nargs="+", type=float, help="share of diarrhea/vomiting reports")
+        parser.add_argument("--flu", nargs="+", type=float, help="share of fever + cough reports")
+        parser.add_argument("--severe", nargs="+", type=float, help="share of severe reports")
+        parser.add_argument("--child", nargs="+", type=int, help="alert above this many severe child cases")
+        parser.add_argument("--cusum-k", nargs="+", type=float)
+        parser.add_argument("--cusum-h", nargs="+", type=float)
+
+        parser.add_argument("--lead-days", type=int, default=backtest.LEAD_DAYS)
+        parser.add_argument("--event-window", type=int, default=backtest.EVENT_WINDOW)
+        parser.add_argument("--event-cases", type=int, default=backtest.EVENT_CASES)
+        parser.add_argument("--workers", type=int, help="processes for the grid (default: all cores)")
+        parser.add_argument("--json", action="store_true", help="print the results as JSON")
+
+    def handle(self, *args, **options):
+        end = options["end"] or localdate() - timedelta(days=1)
+        start = options["start"] or end - timedelta(days=364)
+        if start > end:
+            raise CommandError("--start is after --end")
+
+        grid = {}
+        if "rules" in options["detectors"]:
+            grid["rules"] = {name: options[name] for name in backtest.RULE_DEFAULTS}
+        if "ewma_cusum" in options["detectors"]:
+            grid["ewma_cusum"] = {"k": options["cusum_k"], "h": options["cusum_h"]}
+
+        started = time.perf_counter()
+        results = backtest.run_backtest(
+            start, end, grid,
+            lead_days=options["lead_days"],
+            event_window=options["event_window"],
+            event_cases=options["event_cases"],
+            workers=options["workers"],
+        )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"Backtest {start} .. {end}, {len(results)} settings")
+        for r in results:
+            params = " ".join(f"{k}={v}" for k, v in r["params"].items())
+            self.stdout.write(
+                f"{r['detector']:<10} {params}\n"
+                f"    alerts {r['alerts']} ({r['alerts_per_village_month']}/village/month, {r['false_alerts']} unconfirmed)"
+                f"  events {r['events']}  hits {r['hits']} (rate {r['hit_rate']})"
+                f"  lead mean {r['mean_lead_days']} / median {r['median_lead_days']} days"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s"))
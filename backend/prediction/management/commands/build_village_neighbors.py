@@ -0,0 +1,54 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from scipy.spatial import cKDTree
+
+from data_collection.models import Village
+from prediction.models import VillageNeighbor
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class Command(BaseCommand):
+    help = "Rebuild the k-nearest-neighbour index over village coordinates used by the space-time scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=10, help="neighbours kept per village")
+        parser.add_argument("--max-km", type=float, default=25.0, help="ignore neighbours further than this")
+
+    def handle(self, *args, **options):
+        k, max_km = options["k"], options["max_km"]
+        villages = list(Village.objects.order_by("village_id").values_list("village_id", "latitude", "longitude"))
+        if len(villages) < 2:
+            self.stdout.write("Need at least two villages, nothing to index")
+            return
+
+        ids = np.array([v[0] for v in villages])
+        lat = np.radians(np.array([float(v[1]) for v in villages]))
+        lon = np.radians(np.array([float(v[2]) for v in villages]))
+        # points on the unit sphere: straight-line (chord) distance is monotonic in great-circle distance
+        points = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+        tree = cKDTree(points)
+        max_chord = 2 * np.sin(min(max_km / EARTH_RADIUS_KM, np.pi) / 2)
+        chord, idx = tree.query(points, k=min(k, len(villages) - 1) + 1, distance_upper_bound=max_chord)
+
+        rows = []
+        for i in range(len(villages)):
+            rank = 0
+            for d, j in zip(chord[i], idx[i]):
+                if j == i or j == len(villages):  # self, or no neighbour within max_km
+                    continue
+                rank += 1
+                rows.append(VillageNeighbor(
+                    village_id=int(ids[i]),
+                    neighbor_id=int(ids[j]),
+                    rank=rank,
+                    distance_km=float(2 * EARTH_RADIUS_KM * np.arcsin(d / 2)),
+                ))
+
+        with transaction.atomic():
+            VillageNeighbor.objects.all().delete()
+            VillageNeighbor.objects.bulk_create(rows, batch_size=5000)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(rows)} neighbour pairs for {len(villages)} villages"))
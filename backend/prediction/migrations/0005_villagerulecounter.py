@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0004_earlywarningalert_asha_worker_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VillageRuleCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village_id', models.IntegerField()),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('waterborne', models.IntegerField(default=0)),
+                ('fever', models.IntegerField(default=0)),
+                ('cough', models.IntegerField(default=0)),
+                ('severe', models.IntegerField(default=0)),
+                ('children_severe', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village_id', 'slot'), name='village_rule_counter_slot')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0005_villagerulecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earlywarningalert',
+            name='data_watermark',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='earlywarningalert',
+            name='scope_key',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name='earlywarningalert',
+            index=models.Index(fields=['scope_key', 'data_watermark'], name='prediction__scope_k_5a263f_idx'),
+        ),
+    ]
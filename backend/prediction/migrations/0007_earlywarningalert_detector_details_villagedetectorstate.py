@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0006_earlywarningalert_scope_key_data_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earlywarningalert',
+            name='detector',
+            field=models.CharField(default='rules', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='earlywarningalert',
+            name='details',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='VillageDetectorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village_id', models.IntegerField()),
+                ('detector', models.CharField(max_length=30)),
+                ('last_day', models.DateField()),
+                ('days_seen', models.IntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('cusum', models.FloatField(default=0)),
+                ('in_alarm', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village_id', 'detector'), name='village_detector_state_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0007_earlywarningalert_detector_details_villagedetectorstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VillageNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village_id', models.IntegerField()),
+                ('neighbor_id', models.IntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('distance_km', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village_id', 'rank'), name='village_neighbor_rank')],
+            },
+        ),
+    ]
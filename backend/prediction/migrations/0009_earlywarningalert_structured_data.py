@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0008_villageneighbor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='earlywarningalert',
+            name='structured_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
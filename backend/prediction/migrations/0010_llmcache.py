@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0009_earlywarningalert_structured_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('output', models.TextField()),
+                ('size', models.IntegerField(default=0)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
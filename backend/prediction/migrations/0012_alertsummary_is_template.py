@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0011_summaryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertsummary',
+            name='is_template',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -8,9 +8,23 @@ class EarlyWarningAlert(models.Model):
     district_name = models.CharField(max_length=255)
     state_name = models.CharField(max_length=255)
     rbalert = models.TextField()
+    # memo key for generate_early_warning_alert: same scope + same watermark = same result
+    scope_key = models.CharField(max_length=500, blank=True, default="")
+    data_watermark = models.CharField(max_length=100, blank=True, default="")
+    # which engine raised it ("rules", "ewma_cusum", ...) and its numbers
+    detector = models.CharField(max_length=30, default="rules")
+    details = models.JSONField(default=dict, blank=True)
+    # {"rules": [RuleResult], "individuals": [IndividualReport], "case_count": n}, see
+    # early_warning.structured_alert_data; null on old rows (summaries fall back to LLM extraction)
+    structured_data = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)   # record create hone ka time
     updated_at = models.DateTimeField(auto_now=True)       # record update hone ka time
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["scope_key", "data_watermark"]),
+        ]
+
     def __str__(self):
         return f"{self.village_name}, {self.district_name}, {self.state_name}"
 
@@ -24,6 +38,8 @@ class AlertSummary(models.Model):
     summary_text = models.TextField()
     risk_percentage = models.FloatField()   # e.g., 85.3
     risk_level = models.CharField(max_length=20)  # e.g., "High", "Moderate"
+    # deterministic text (services.template_summary) waiting for the model's version
+    is_template = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -33,4 +49,120 @@ class AlertSummary(models.Model):
         )
 
 
+class VillageRuleCounter(models.Model):
+    """
+    Ring buffer of per-day rule counters for one village (see prediction/realtime.py).
+    slot = date.toordinal() % WINDOW_DAYS, `day` says which date the slot currently
+    holds; a slot is overwritten when a newer day lands on it.
+    """
+    village_id = models.IntegerField()
+    slot = models.PositiveSmallIntegerField()
+    day = models.DateField()
+    total = models.IntegerField(default=0)
+    waterborne = models.IntegerField(default=0)
+    fever = models.IntegerField(default=0)
+    cough = models.IntegerField(default=0)
+    severe = models.IntegerField(default=0)
+    children_severe = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["village_id", "slot"], name="village_rule_counter_slot"),
+        ]
+
+    def __str__(self):
+        return f"village {self.village_id} {self.day}: {self.total} reports"
+
+
+class VillageDetectorState(models.Model):
+    """
+    Running state of one aberration detector for one village (see prediction/aberration.py),
+    advanced one day at a time so the nightly run never refits over history.
+    """
+    village_id = models.IntegerField()
+    detector = models.CharField(max_length=30)
+    last_day = models.DateField()                    # last day folded into the state
+    days_seen = models.IntegerField(default=0)
+    mean = models.FloatField(default=0)              # EWMA baseline of daily cases
+    variance = models.FloatField(default=0)          # EWMA variance around it
+    cusum = models.FloatField(default=0)             # one-sided CUSUM of standardized excess
+    in_alarm = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["village_id", "detector"], name="village_detector_state_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.detector} village {self.village_id} @ {self.last_day}"
+
+
+class VillageNeighbor(models.Model):
+    """
+    Precomputed k-nearest-neighbour index over Village lat/long
+    (manage.py build_village_neighbors), used by the space-time scan.
+    rank 1 = nearest other village.
+    """
+    village_id = models.IntegerField()
+    neighbor_id = models.IntegerField()
+    rank = models.PositiveSmallIntegerField()
+    distance_km = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["village_id", "rank"], name="village_neighbor_rank"),
+        ]
 
+    def __str__(self):
+        return f"{self.village_id} -> {self.neighbor_id} (#{self.rank}, {self.distance_km:.1f} km)"
+
+
+class LLMCache(models.Model):
+    """
+    Content-addressed store of model outputs (see prediction/llm_cache.py).
+    key = sha256 of (model, prompt version, kind, input), so an unchanged alert
+    never goes back to the model. Evicted by age and total size.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=20)              # "extraction" / "summary"
+    model = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=20)
+    output = models.TextField()
+    size = models.IntegerField(default=0)               # bytes of output, for the size cap
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.model} v{self.prompt_version} {self.key[:12]}"
+
+
+class SummaryJob(models.Model):
+    """
+    One background summary run (POST generate-summary/ without an alert_id),
+    executed by prediction.tasks.run_summary_job_task; the status endpoint
+    reads the counters while it drains.
+    """
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    mode = models.CharField(max_length=10, default="pending")   # "pending" / "all", see services.summary_job_alert_ids
+    limit = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    failed_alert_ids = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, default="")
+    requested_by = models.IntegerField(null=True, blank=True)
+    task_id = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Summary job {self.pk} ({self.status}, {self.done}/{self.total})"
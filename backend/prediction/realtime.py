@@ -0,0 +1,171 @@
+# prediction/realtime.py
+"""
+Real-time outbreak thresholds, checked on every HealthReport write.
+
+Each village keeps WINDOW_DAYS per-day counters in VillageRuleCounter
+(slot = date.toordinal() % WINDOW_DAYS, a ring buffer). Ingest adds the new
+reports with one INSERT .. ON CONFLICT upsert; the window is then the sum of
+at most WINDOW_DAYS rows per village, so no report is rescanned.
+
+When a window rule (waterborne, flu, high severity, child risk; same messages
+and thresholds as utils/rule_based_model) starts firing for a village, an
+EarlyWarningAlert is created in the same transaction as the reports.
+Deleted or edited reports are not subtracted; the daily partitioned run is the backstop.
+"""
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils.timezone import localdate
+
+from data_collection.models import HealthReport
+from utils.rule_based_model import alerts_text, empty_rule_counts, evaluate_rules
+from . import signals
+from .early_warning import structured_alert_data
+from .models import EarlyWarningAlert, VillageRuleCounter
+
+WINDOW_DAYS = 7
+# below this many reports in the window percentages are noise (1 report = 100%)
+MIN_WINDOW_REPORTS = 5
+
+COUNTER_FIELDS = ["total", "waterborne", "fever", "cough", "severe", "children_severe"]
+WINDOW_RULES = {"waterborne_outbreak", "flu_outbreak", "high_severity", "child_risk"}
+INSERT_CHUNK = 500
+
+
+def report_counters(report):
+    """One report -> its increments, same matching as compute_rule_counts()"""
+    symptoms = (report.symptoms or "").lower()
+    severity = report.severity or ""
+    return {
+        "total": 1,
+        "waterborne": int("diarrhea" in symptoms or "vomiting" in symptoms),
+        "fever": int("fever" in symptoms),
+        "cough": int("cough" in symptoms),
+        "severe": int("severe" in severity.lower()),
+        "children_severe": int(int(report.age) < 10 and severity == "Severe"),
+    }
+
+
+def counter_deltas(reports, today):
+    """{(village_id, day): {field: n}} for the reports dated inside the window"""
+    to_date = HealthReport._meta.get_field("date_of_reporting").to_python
+    first_day = today.toordinal() - WINDOW_DAYS + 1
+
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for report in reports:
+        day = to_date(report.date_of_reporting)
+        if report.village_id is None or not first_day <= day.toordinal() <= today.toordinal():
+            continue
+        bucket = deltas[(int(report.village_id), day)]
+        for field, n in report_counters(report).items():
+            bucket[field] += n
+    return deltas
+
+
+def apply_counter_deltas(deltas):
+    """
+    Upsert into the ring buffer. Same day in the slot: add. Older day in the
+    slot (it fell out of the window): overwrite. Newer day in the slot: the
+    delta is older than the window, keep the slot as it is.
+    """
+    rows = [
+        (village_id, day.toordinal() % WINDOW_DAYS, day, *(counts[f] for f in COUNTER_FIELDS))
+        for (village_id, day), counts in sorted(deltas.items())
+    ]
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(VillageRuleCounter._meta.db_table)
+    columns = ["village_id", "slot", "day"] + COUNTER_FIELDS
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    day = qn("day")
+    updates = [
+        f"{qn(f)} = CASE WHEN {table}.{day} = EXCLUDED.{day} THEN {table}.{qn(f)} + EXCLUDED.{qn(f)} "
+        f"WHEN {table}.{day} > EXCLUDED.{day} THEN {table}.{qn(f)} ELSE EXCLUDED.{qn(f)} END"
+        for f in COUNTER_FIELDS
+    ]
+    # SET expressions all read the old row, so the CASEs above see the old day
+    updates.append(f"{day} = CASE WHEN {table}.{day} > EXCLUDED.{day} THEN {table}.{day} ELSE EXCLUDED.{day} END")
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_CHUNK):
+            chunk = rows[start:start + INSERT_CHUNK]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) VALUES {', '.join([row_sql] * len(chunk))} "
+                f"ON CONFLICT ({qn('village_id')}, {qn('slot')}) DO UPDATE SET {', '.join(updates)}",
+                [value for row in chunk for value in row],
+            )
+
+
+def window_counts(village_ids, today):
+    """{village_id: {field: sum over the last WINDOW_DAYS days}}, one query"""
+    first_day = today.fromordinal(today.toordinal() - WINDOW_DAYS + 1)
+    rows = (
+        VillageRuleCounter.objects.filter(village_id__in=village_ids, day__gte=first_day, day__lte=today)
+        .values("village_id")
+        .annotate(**{f: Sum(f) for f in COUNTER_FIELDS})
+        .order_by()
+    )
+    return {row.pop("village_id"): row for row in rows}
+
+
+def window_results(counts):
+    """Window rule results for one village's counters ([] under MIN_WINDOW_REPORTS)"""
+    if counts["total"] < MIN_WINDOW_REPORTS:
+        return []
+    rule_counts = empty_rule_counts()
+    rule_counts.update(counts)
+    return [r for r in evaluate_rules(rule_counts) if r.rule_id in WINDOW_RULES]
+
+
+def _fired(results):
+    return {r.rule_id for r in results if r.triggered}
+
+
+def record_reports(reports, today=None):
+    """
+    Add freshly stored reports to the counters and create an EarlyWarningAlert
+    for every village where a window rule has just started firing.
+    Call inside the inserting transaction. Returns the created alerts.
+    """
+    today = today or localdate()
+    deltas = counter_deltas(reports, today)
+    if not deltas:
+        return []
+    apply_counter_deltas(deltas)
+
+    # what this batch added per village, to reconstruct the window before it
+    added = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for (village_id, _), counts in deltas.items():
+        for field in COUNTER_FIELDS:
+            added[village_id][field] += counts[field]
+
+    # area names for the alert, from the newest report of each village
+    areas = {int(r.village_id): r for r in reports if r.village_id is not None}
+
+    window = HealthReport.objects.filter(
+        date_of_reporting__gte=today.fromordinal(today.toordinal() - WINDOW_DAYS + 1), date_of_reporting__lte=today
+    )
+    alerts = []
+    for village_id, after in window_counts(list(added), today).items():
+        before = {field: after[field] - added[village_id][field] for field in COUNTER_FIELDS}
+        results = window_results(after)
+        if not _fired(results) - _fired(window_results(before)):
+            continue
+        area = areas[village_id]
+        alerts.append(EarlyWarningAlert(
+            village_name=area.village,
+            district_name=area.district,
+            state_name=area.state,
+            asha_worker_id=area.asha_worker_id,
+            rbalert=alerts_text(results),
+            structured_data=structured_alert_data(results, window.filter(village_id=village_id)),
+        ))
+
+    if alerts:
+        alerts = EarlyWarningAlert.objects.bulk_create(alerts)
+        signals.alerts_created.send(sender=EarlyWarningAlert, alerts=alerts)
+    return alerts
+
@@ -0,0 +1,22 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message, data as JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept `Accept: text/event-stream` (EventSource).
+    Streaming views return a StreamingHttpResponse themselves, so this only
+    renders plain Responses, i.e. errors, as an "error" event.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event("error", data).encode(self.charset)
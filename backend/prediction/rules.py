@@ -0,0 +1,64 @@
+# prediction/rules.py
+"""
+SQL backend for the rule engine in utils/rule_based_model.py.
+
+Every rule is a count, so instead of loading the window into a DataFrame the
+database computes them as conditional aggregates (COUNT(*) FILTER (WHERE ..))
+in a single query grouped by water source (plus the partition fields). The
+result has the same shape as compute_rule_counts(), so evaluate_rules() and
+alerts_text() work unchanged, and memory no longer grows with the window.
+
+The pandas functions stay as the reference implementation (see tests.py).
+"""
+from django.db.models import Count, Min, Q
+
+from utils.rule_based_model import empty_rule_counts
+
+# rule counter -> condition, mirrors compute_rule_counts()
+# (icontains = case-insensitive str.contains, NULL never matches like na=False)
+RULE_CONDITIONS = {
+    "waterborne": Q(symptoms__icontains="Diarrhea") | Q(symptoms__icontains="Vomiting"),
+    "fever": Q(symptoms__icontains="Fever"),
+    "cough": Q(symptoms__icontains="Cough"),
+    "severe": Q(severity__icontains="Severe"),
+    "poor_water": Q(water_quality__icontains="Poor"),
+    "no_treatment": Q(treatment_given__icontains="No Treatment"),
+    "children_severe": Q(age__lt=10, severity="Severe"),
+}
+# exact match, used per water source (rule 4)
+SEVERE_EXACT = Q(severity="Severe")
+
+
+def sql_partitioned_rule_counts(queryset, key_fields=()):
+    """
+    {partition key tuple: counts} for a HealthReport queryset, one query.
+    Rows come back per (partition, water source) ordered by their first report_id,
+    which gives both partitions and sources the first-appearance order pandas uses
+    for a DataFrame loaded in report_id order.
+    """
+    grouped = (
+        queryset.values(*key_fields, "water_source")
+        .annotate(
+            rows=Count("pk"),
+            severe_exact=Count("pk", filter=SEVERE_EXACT),
+            first_pk=Min("pk"),
+            **{name: Count("pk", filter=condition) for name, condition in RULE_CONDITIONS.items()},
+        )
+        .order_by("first_pk")
+    )
+
+    partitions = {}
+    for row in grouped:
+        key = tuple(row[field] for field in key_fields)
+        counts = partitions.setdefault(key, empty_rule_counts())
+        counts["total"] += row["rows"]
+        for name in RULE_CONDITIONS:
+            counts[name] += row[name]
+        if row["water_source"] is not None:
+            counts["severe_by_source"][row["water_source"]] = row["severe_exact"]
+    return partitions
+
+
+def sql_rule_counts(queryset):
+    """compute_rule_counts() for a whole HealthReport queryset, computed by the database"""
+    return sql_partitioned_rule_counts(queryset).get((), empty_rule_counts())
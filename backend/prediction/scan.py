@@ -0,0 +1,258 @@
+# prediction/scan.py
+"""
+Space-time cluster scan over village case counts (detector "spacetime_scan").
+
+Single-village detectors (aberration.py) miss an outbreak spread thin over
+neighbouring villages. The scan looks at cylinders instead:
+  base   = a village plus its m nearest neighbours (VillageNeighbor index,
+           build it with manage.py build_village_neighbors), m = 0..MAX_NEIGHBORS
+  height = the last w days, w = 1..SCAN_DAYS (prospective: every cylinder ends yesterday)
+
+Expected counts come from each village's own BASELINE_DAYS before the scan
+window (Poisson model, conditioned on the total observed in the window). A
+cylinder's score is Kulldorff's log-likelihood ratio
+  LLR = c ln(c/e) + (C-c) ln((C-c)/(C-e))   for c > e, else 0
+and its p-value is its rank among the maximum LLRs of REPLICATES Monte Carlo
+data sets (cases redistributed under the null). The replicates are the
+expensive part: space_time_scan_task spreads their chunks over the Celery
+workers (chord of replicate chunks + report_clusters as callback), the
+in-process run_space_time_scan uses a process pool.
+
+Every cylinder of a data set is scored in one vectorised pass
+(cumulative sums along the neighbour axis), so a replicate costs a few
+array operations, not a loop over clusters.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from django.utils.timezone import localdate
+
+from data_collection.models import HealthReport, Village
+from . import signals
+from .aberration import daily_case_matrix
+from .early_warning import structured_alert_data
+from .models import EarlyWarningAlert, VillageNeighbor
+
+DETECTOR = "spacetime_scan"
+SCAN_DAYS = 7           # longest cylinder, in days
+BASELINE_DAYS = 56      # history before the scan window used for expected counts
+MAX_NEIGHBORS = 10      # largest cluster = village + this many neighbours
+REPLICATES = 999
+ALPHA = 0.05
+MAX_CLUSTERS = 5        # secondary (non-overlapping) clusters reported per run
+MIN_CASES = 5           # a cluster needs at least this many cases to be reported
+BASELINE_PRIOR = 0.5    # pseudo-count, so a village with no history has a finite expectation
+REPLICATE_CHUNK = 50
+
+
+def neighbor_matrix(village_ids, max_neighbors=MAX_NEIGHBORS):
+    """
+    [village, 1 + max_neighbors] array of row indices (column 0 = the village
+    itself, then nearest first) and the matching distance in km. Missing
+    neighbours are -1 / nan.
+    """
+    index = {vid: i for i, vid in enumerate(village_ids)}
+    nbr = np.full((len(village_ids), max_neighbors + 1), -1, dtype=np.int64)
+    dist = np.full(nbr.shape, np.nan)
+    nbr[:, 0] = np.arange(len(village_ids))
+    dist[:, 0] = 0.0
+    rows = VillageNeighbor.objects.filter(rank__lte=max_neighbors).values_list("village_id", "neighbor_id", "rank", "distance_km")
+    for village_id, neighbor_id, rank, distance_km in rows.iterator():
+        i, j = index.get(village_id), index.get(neighbor_id)
+        if i is not None and j is not None:
+            nbr[i, rank] = j
+            dist[i, rank] = distance_km
+    return nbr, dist
+
+
+def cylinder_llrs(recent, rates, nbr):
+    """
+    LLR of every cylinder, shape [w - 1, centre village, m] (w days, m neighbours).
+    recent: [village, day] counts of the scan window (last column = newest day)
+    rates:  expected cases per village per day (baseline)
+    """
+    valid = nbr >= 0
+    safe = np.where(valid, nbr, 0)
+    n_days = recent.shape[1]
+    # cases over the last w days for every w, [w-1, village]
+    observed = np.cumsum(recent[:, ::-1], axis=1).T
+    llrs = np.zeros((n_days, *nbr.shape))
+    for w in range(1, n_days + 1):
+        obs = observed[w - 1]
+        total = obs.sum()
+        if total == 0:
+            continue
+        exp = rates * w
+        exp = exp * (total / exp.sum())  # condition on the total
+        c = np.cumsum(np.where(valid, obs[safe], 0.0), axis=1)
+        e = np.cumsum(np.where(valid, exp[safe], 0.0), axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inside = np.where(c > 0, c * np.log(c / e), 0.0)
+            rest = total - c
+            outside = np.where(rest > 0, rest * np.log(rest / (total - e)), 0.0)
+        llrs[w - 1] = np.where(valid & (c > e), inside + outside, 0.0)
+    return llrs
+
+
+def replicate_max_llrs(rates, nbr, n_days, total, replicates, seed):
+    """Max LLR of each of `replicates` null data sets (top level so the process pool can pickle it)"""
+    rates, nbr = np.asarray(rates, dtype=float), np.asarray(nbr, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    cell_p = np.repeat(rates / rates.sum(), n_days) / n_days
+    maxima = np.empty(replicates)
+    for r in range(replicates):
+        recent = rng.multinomial(total, cell_p).reshape(len(rates), n_days).astype(float)
+        maxima[r] = cylinder_llrs(recent, rates, nbr).max()
+    return maxima
+
+
+def replicate_chunks(replicates=REPLICATES, seed=None):
+    """[(replicates, seed), ...] in REPLICATE_CHUNK pieces; plain ints, so they can go through Celery"""
+    chunks = [min(REPLICATE_CHUNK, replicates - start) for start in range(0, replicates, REPLICATE_CHUNK)]
+    seeds = np.random.SeedSequence(seed).generate_state(len(chunks)).tolist()
+    return list(zip(chunks, seeds))
+
+
+def null_distribution(rates, nbr, n_days, total, replicates=REPLICATES, workers=None, seed=None):
+    """
+    Max LLRs of the Monte Carlo replicates, chunks over a process pool.
+    Daemonic processes (a Celery prefork worker) may not fork, there the
+    chunks run in-process; the Celery task fans them out as a chord instead.
+    """
+    jobs = [(rates, nbr, n_days, total, n, s) for n, s in replicate_chunks(replicates, seed)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1 or multiprocessing.current_process().daemon:
+        return np.concatenate([replicate_max_llrs(*job) for job in jobs])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(replicate_max_llrs, *zip(*jobs))))
+
+
+def top_clusters(llrs, nbr, max_clusters=MAX_CLUSTERS):
+    """
+    Most likely cluster plus secondary ones that share no village with an
+    earlier pick. Returns [(llr, w, centre index, m), ...].
+    """
+    order = np.argsort(llrs, axis=None)[::-1]
+    picked, used = [], set()
+    for flat in order:
+        if len(picked) >= max_clusters:
+            break
+        w_idx, i, m = np.unravel_index(flat, llrs.shape)
+        if llrs[w_idx, i, m] <= 0:
+            break
+        members = set(nbr[i, :m + 1].tolist())
+        if members & used:
+            continue
+        picked.append((float(llrs[w_idx, i, m]), int(w_idx) + 1, int(i), int(m)))
+        used |= members
+    return picked
+
+
+def scan_candidates(today=None, scan_days=SCAN_DAYS, baseline_days=BASELINE_DAYS, max_neighbors=MAX_NEIGHBORS):
+    """
+    Everything up to the Monte Carlo step: the cylinders of the SCAN_DAYS up
+    to yesterday and the best non-overlapping ones. Returns a JSON-able dict
+    (it is passed between Celery tasks); "candidates" is empty when there is
+    nothing to test.
+    """
+    end_day = (today or localdate()) - timedelta(days=1)  # today is not complete yet
+    first_day = end_day - timedelta(days=scan_days + baseline_days - 1)
+    villages = list(Village.objects.order_by("village_id").values_list("village_id", "village_name", "district_name", "state_name"))
+    scan = {"end_day": end_day.isoformat(), "scan_days": scan_days, "villages": villages, "total": 0, "candidates": []}
+    if not villages:
+        return scan
+
+    cases = daily_case_matrix([v[0] for v in villages], first_day, end_day)
+    baseline, recent = cases[:, :baseline_days], cases[:, baseline_days:]
+    scan["total"] = int(recent.sum())
+    if scan["total"] == 0:
+        return scan
+
+    rates = (baseline.sum(axis=1) + BASELINE_PRIOR) / baseline_days
+    nbr, dist = neighbor_matrix([v[0] for v in villages], max_neighbors)
+    scan.update(
+        recent=recent.tolist(),
+        rates=rates.tolist(),
+        nbr=nbr.tolist(),
+        dist=np.nan_to_num(dist, nan=-1.0).tolist(),
+        candidates=top_clusters(cylinder_llrs(recent, rates, nbr), nbr),
+    )
+    return scan
+
+
+def report_clusters(scan, maxima):
+    """
+    p-values of the candidates against the replicate maxima, one
+    EarlyWarningAlert (detector "spacetime_scan") per significant cluster,
+    named after its centre village with every member village in details.
+    Returns a summary dict.
+    """
+    summary = {"villages": len(scan["villages"]), "cases": scan["total"], "clusters": len(scan["candidates"]), "alerts": 0}
+    if not scan["candidates"]:
+        return summary
+
+    villages, scan_days = scan["villages"], scan["scan_days"]
+    end_day = date.fromisoformat(scan["end_day"])
+    recent, rates = np.asarray(scan["recent"]), np.asarray(scan["rates"])
+    nbr, dist = np.asarray(scan["nbr"], dtype=np.int64), np.asarray(scan["dist"])
+    maxima = np.asarray(maxima)
+    replicates = len(maxima)
+
+    alerts = []
+    for llr, w, i, m in scan["candidates"]:
+        p_value = (1 + int((maxima >= llr).sum())) / (replicates + 1)
+        members = nbr[i, :m + 1]
+        observed = int(recent[members, scan_days - w:].sum())
+        if p_value > ALPHA or observed < MIN_CASES:
+            continue
+        expected = float(rates[members].sum() / rates.sum() * recent[:, scan_days - w:].sum())
+        _, village_name, district_name, state_name = villages[i]
+        names = [villages[j][1] for j in members]
+        member_ids = [villages[j][0] for j in members]
+        start = end_day - timedelta(days=w - 1)
+        alerts.append(EarlyWarningAlert(
+            village_name=village_name,
+            district_name=district_name,
+            state_name=state_name,
+            rbalert=(
+                f"Spreading Cluster: {observed} reports in {len(members)} villages around {village_name} "
+                f"({', '.join(names)}) from {start} to {end_day}, against an expected {expected:.1f} "
+                f"(p = {p_value:.3f})"
+            ),
+            detector=DETECTOR,
+            details={
+                "village_ids": member_ids,
+                "villages": names,
+                "centre_village_id": villages[i][0],
+                "radius_km": round(float(dist[i, m]), 2),
+                "start": start.isoformat(),
+                "end": end_day.isoformat(),
+                "observed": observed,
+                "expected": round(expected, 2),
+                "llr": round(llr, 3),
+                "p_value": round(p_value, 4),
+                "replicates": replicates,
+            },
+            structured_data=structured_alert_data([], HealthReport.objects.filter(
+                village_id__in=member_ids, date_of_reporting__gte=start, date_of_reporting__lte=end_day,
+            )),
+        ))
+    if alerts:
+        alerts = EarlyWarningAlert.objects.bulk_create(alerts)
+        signals.alerts_created.send(sender=EarlyWarningAlert, alerts=alerts)
+    summary["alerts"] = len(alerts)
+    return summary
+
+
+def run_space_time_scan(today=None, scan_days=SCAN_DAYS, baseline_days=BASELINE_DAYS,
+                        max_neighbors=MAX_NEIGHBORS, replicates=REPLICATES, workers=None, seed=None):
+    """The whole scan in this process (replicates over a local process pool), returns report_clusters' summary"""
+    scan = scan_candidates(today, scan_days, baseline_days, max_neighbors)
+    if not scan["candidates"]:
+        return report_clusters(scan, [])
+    maxima = null_distribution(scan["rates"], scan["nbr"], scan_days, scan["total"], replicates, workers, seed)
+    return report_clusters(scan, maxima)
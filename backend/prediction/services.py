@@ -1,7 +1,33 @@
-import ollama
+import heapq
+import html
 import json
-from .models import AlertSummary
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.utils.timezone import now
+from .models import AlertSummary, EarlyWarningAlert, SummaryJob
 from .pydantic_schemas import ExtractedData  # 
+from .llm_cache import cache_lookup, cache_store, cached_llm_output
+from .llm_client import get_client, run_concurrently, submit_background
+
+logger = logging.getLogger(__name__)
+
+# bump when the matching prompt below changes, so cached outputs are not reused
+EXTRACTION_PROMPT_VERSION = "1"
+SUMMARY_PROMPT_VERSION = "1"
+# alerts fetched per page in process_pending_alerts / run_summary_job
+SUMMARY_BATCH_SIZE = 50
+# summaries one run may spend on the model server (CPU-only: a few per minute);
+# beyond it only High / Very High alerts are still taken, the rest waits for the next run
+SUMMARY_RUN_BUDGET = 120
+RISK_TIERS = {"Very High": 4, "High": 3, "Moderate": 2, "Low": 1, "Very Low": 0}
+CRITICAL_TIER = RISK_TIERS["High"]
+# template summaries replaced by model text per upgrade_template_summaries run
+SUMMARY_UPGRADE_BUDGET = 20
 
 def calculate_outbreak_risk(individuals):
     """
@@ -87,39 +113,133 @@ def clean_summary_output(raw_text):
 
     return clean_text
 
-def process_alert(alert_obj):
+def _share(n, total):
+    return f"{n} of {total} ({n / total * 100:.0f}%)"
+
+
+def template_summary(alert_obj):
     """
-    Takes an EarlyWarningAlert object, processes it with the model,
-    calculates risk, generates a summary, and stores it in AlertSummary.
+    Deterministic summary in the same four sections as the model's, filled
+    from the alert's stored cases and calculate_outbreak_risk. No model call,
+    so it is ready in milliseconds. Returns the same dict as llm_summary().
     """
+    cases = ExtractedData.model_validate({"individuals": (alert_obj.structured_data or {}).get("individuals", [])}).individuals
+    risk_percentage, risk_level = calculate_outbreak_risk(cases)
+    place = html.escape(alert_obj.village_name or alert_obj.district_name or "the affected area")
+    alert_lines = [html.escape(line.strip()) for line in alert_obj.rbalert.splitlines() if line.strip()]
+    total = len(cases)
+
+    severe = sum(1 for c in cases if c.severity == "Severe")
+    children = sum(1 for c in cases if c.age < 10)
+    elderly = sum(1 for c in cases if c.age > 60)
+    poor_water = sum(1 for c in cases if c.water_quality == "Poor")
+    untreated = sum(1 for c in cases if c.treatment_given == "None")
+    symptoms = Counter(symptom for c in cases for symptom in c.symptoms).most_common()
+    waterborne = any(symptom in ("Diarrhea", "Vomiting") for symptom, _ in symptoms)
+
+    if total:
+        drivers = sorted(
+            [(severe, "severe cases"), (children + elderly, "cases in children under 10 or adults over 60"),
+             (untreated, "untreated cases"), (poor_water, "cases with poor water quality")],
+            reverse=True,
+        )
+        reason = f"The main driver is {_share(drivers[0][0], total)} {drivers[0][1]}." if drivers[0][0] else "Reported cases are mild and treated."
+        findings = [
+            f"{_share(severe, total)} cases are severe; {children} are children under 10 and {elderly} are adults over 60.",
+            "Most reported symptoms: " + (", ".join(f"{name} ({n})" for name, n in symptoms) if symptoms else "none of fever, cough, diarrhoea or vomiting") + ".",
+            f"{_share(poor_water, total)} cases report poor water quality.",
+            f"{_share(untreated, total)} cases have not received treatment.",
+        ]
+    else:
+        reason = "No case-level data is attached to this alert, so the score is not based on cases; act on the rule alerts listed below."
+        findings = alert_lines or ["No case details available."]
 
-    rbalert_text = alert_obj.rbalert
+    if alert_lines and total:
+        findings.append("Alerts raised: " + "; ".join(alert_lines) + ".")
+
+    asha = (
+        f"Visit every household in {place} within 24 hours, screen for diarrhoea, vomiting and fever, and give ORS to anyone with symptoms"
+        if waterborne else
+        f"Visit every household in {place} within 24 hours and screen for fever and other reported symptoms"
+    )
+    if children:
+        asha += ", checking children under 10 first"
+    asha += ". Refer severe cases to the nearest health centre the same day."
+    ngo = (
+        f"Distribute water purification tablets and ORS in {place} and arrange testing of the water sources used by affected households"
+        if poor_water or waterborne else
+        f"Support ASHA workers in {place} with ORS, basic medicines and transport for referrals"
+    )
+    if untreated:
+        ngo += f", and help the {untreated} untreated patients reach care"
+    ngo += "."
+    if RISK_TIERS[risk_level] >= CRITICAL_TIER:
+        escalation = "Report this alert to the District Surveillance Officer today and again after 24 hours with updated case counts."
+    else:
+        escalation = "If more than 5 new severe cases are reported in a 24-hour period, immediately escalate to the District Surveillance Officer."
+
+    return {
+        "risk_percentage": risk_percentage,
+        "risk_level": risk_level,
+        "summary": "\n".join([
+            "<strong>1. Risk Overview</strong>",
+            f"<p>Risk Level: {risk_level} ({risk_percentage:.1f}%). {reason}</p>",
+            "",
+            "<strong>2. Key Findings</strong>",
+            "<ul>",
+            *(f"  <li>{finding}</li>" for finding in findings),
+            "</ul>",
+            "",
+            "<strong>3. Immediate Actions Required</strong>",
+            "<ol>",
+            f"  <li><strong>For ASHA Workers:</strong> {asha}</li>",
+            f"  <li><strong>For NGOs:</strong> {ngo}</li>",
+            f"  <li><strong>Escalation Protocol:</strong> {escalation}</li>",
+            "</ol>",
+            "",
+            "<strong>4. Monitoring Guidance</strong>",
+            "<ul>",
+            f"  <li>Track the number of new cases and their severity in {place} daily.</li>",
+            "  <li>Warning signs: a rising share of severe cases, new cases in children, or cases in neighbouring villages.</li>",
+            "</ul>",
+        ]),
+    }
+
+
+def extract_alert_data(alert_obj):
+    """
+    Structured case data for an alert. Alerts raised by our own rule engine /
+    detectors carry it in structured_data; only older rows still have to be
+    parsed back out of the rbalert text by the model.
+    """
+    if alert_obj.structured_data is not None:
+        return ExtractedData.model_validate({"individuals": alert_obj.structured_data.get("individuals", [])})
 
-    #  Extract structured data
     extraction_prompt = f"""Analyze the following rule-based alert and extract structured JSON data 
 according to this schema: {json.dumps(ExtractedData.model_json_schema(), indent=2)}
 
 Alert:
-{rbalert_text}
+{alert_obj.rbalert}
 
 Output only the JSON, no extra text.
 """
 
-    extraction_response = ollama.chat(
-        model="gemma3:1b",
-        messages=[{"role": "user", "content": extraction_prompt}],
-        format="json",
-        options={"temperature": 0},
-    )
+    client = get_client()
 
-    extracted_data_json = extraction_response["message"]["content"]
-    validated_data = ExtractedData.model_validate_json(extracted_data_json)
+    def extract():
+        extraction_response = client.chat(
+            messages=[{"role": "user", "content": extraction_prompt}],
+            format="json",
+            options={"temperature": 0},
+        )
+        return extraction_response["message"]["content"]
 
-  #Calculate risk
-    risk_percentage, risk_level = calculate_outbreak_risk(validated_data.individuals)
+    extracted_data_json = cached_llm_output("extraction", client.model, EXTRACTION_PROMPT_VERSION, alert_obj.rbalert, extract)
+    return ExtractedData.model_validate_json(extracted_data_json)
 
-    #plain-language summary
-    summary_prompt = f"""You are a senior public health analyst for the Indian Ministry of the North Eastern Region, tasked with writing an urgent field directive. Your writing style must be official, clear, and direct. Avoid jargon and AI-like conversational phrases. The output must be a pure, clean HTML snippet.
+
+def build_summary_prompt(rbalert_text, risk_percentage, risk_level, validated_data):
+    return f"""You are a senior public health analyst for the Indian Ministry of the North Eastern Region, tasked with writing an urgent field directive. Your writing style must be official, clear, and direct. Avoid jargon and AI-like conversational phrases. The output must be a pure, clean HTML snippet.
 
 **Context for Directive:**
 - **Raw Field Alert Data:** {rbalert_text}
@@ -163,27 +283,369 @@ Generate an HTML summary based *only* on the provided context. Adhere strictly t
 </ul>
 """
 
-    summary_response = ollama.generate(
-        model="gemma3:1b",
-        prompt=summary_prompt,
-        stream=False,
-    )
 
-    raw_summary_output = summary_response["response"].strip()
+def llm_summary(alert_obj):
+    """
+    Risk + model-written HTML summary for an alert (nothing is saved).
+    Blocks for as long as the model takes.
+    """
+
+    rbalert_text = alert_obj.rbalert
+
+    #  Extract structured data (stored on the alert, LLM only for legacy rows)
+    validated_data = extract_alert_data(alert_obj)
+
+  #Calculate risk
+    risk_percentage, risk_level = calculate_outbreak_risk(validated_data.individuals)
+
+    #plain-language summary
+    summary_prompt = build_summary_prompt(rbalert_text, risk_percentage, risk_level, validated_data)
+
+    client = get_client()
+
+    def summarize():
+        summary_response = client.generate(
+            prompt=summary_prompt,
+            stream=False,
+        )
+        return summary_response["response"]
+
+    # same alert text + same cases -> same prompt, reuse the stored output
+    raw_summary_output = cached_llm_output(
+        "summary", client.model, SUMMARY_PROMPT_VERSION,
+        {"rbalert": rbalert_text, "cases": validated_data.model_dump()}, summarize,
+    ).strip()
     
     # Clean the output to enforce strict formatting
     summary_output = clean_summary_output(raw_summary_output)
 
-    AlertSummary.objects.create(
+    return {
+        "risk_percentage": risk_percentage,
+        "risk_level": risk_level,
+        "summary": summary_output,
+    }
+
+
+class _SummaryRace:
+    """Shared between process_alert and its background model call: who saves the summary"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.finished = False
+        self.template_id = None   # set when process_alert gave up waiting and saved the template
+
+
+def _llm_summary_in_background(alert_obj, race):
+    try:
+        result = llm_summary(alert_obj)
+    finally:
+        with race.lock:
+            race.finished = True
+            template_id = race.template_id
+    if template_id is not None:
+        # the caller already stored the template, swap the model text in
+        upgrade_template_summary(template_id, result)
+    return result
+
+
+def process_alert(alert_obj, budget=None):
+    """
+    Takes an EarlyWarningAlert object, processes it with the model,
+    calculates risk, generates a summary, and stores it in AlertSummary.
+
+    The model gets `budget` seconds (SUMMARY_LATENCY_BUDGET). If it has not
+    answered by then, or fails, the template summary is stored instead with
+    is_template=True, so every alert has an actionable summary right away.
+    A model call still running replaces the template when it finishes;
+    upgrade_template_summaries() picks up the rest. budget=None means the setting,
+    budget=0 waits for the model without a template.
+
+    Only the interactive single-alert request should use the budget: batch
+    paths pass budget=0 so the model calls stay bounded by their own workers
+    (OLLAMA_CONCURRENCY) instead of piling up on the background pool.
+    """
+    budget = settings.SUMMARY_LATENCY_BUDGET if budget is None else budget
+    if not budget:
+        result = llm_summary(alert_obj)
+        return _save_summary(alert_obj, result, is_template=False)
+
+    race = _SummaryRace()
+    future = submit_background(_llm_summary_in_background, alert_obj, race)
+    try:
+        try:
+            result = future.result(timeout=budget)
+        except FutureTimeout:
+            with race.lock:
+                if not race.finished:
+                    saved = _save_summary(alert_obj, template_summary(alert_obj), is_template=True)
+                    race.template_id = saved["summary_id"]
+                    return saved
+            result = future.result()  # it finished while we were giving up
+    except Exception:
+        logger.exception("Summary for alert %s failed, storing the template", alert_obj.id)
+        return _save_summary(alert_obj, template_summary(alert_obj), is_template=True)
+    return _save_summary(alert_obj, result, is_template=False)
+
+
+def _save_summary(alert_obj, result, is_template):
+    summary = AlertSummary.objects.create(
         alert=alert_obj,
-        risk_percentage=risk_percentage,
-        risk_level=risk_level,
-        summary_text=summary_output,
+        risk_percentage=result["risk_percentage"],
+        risk_level=result["risk_level"],
+        summary_text=result["summary"],
+        is_template=is_template,
     )
+    return {**result, "summary_id": summary.id, "is_template": is_template}
 
-    return {
+
+def upgrade_template_summary(summary_id, result=None):
+    """
+    Replace a template AlertSummary with the model's text (computed here unless
+    given). Returns False when the row is gone or already upgraded.
+    """
+    summary = AlertSummary.objects.select_related("alert").filter(pk=summary_id, is_template=True).first()
+    if summary is None:
+        return False
+    result = result or llm_summary(summary.alert)
+    updated = AlertSummary.objects.filter(pk=summary_id, is_template=True).update(
+        summary_text=result["summary"],
+        risk_percentage=result["risk_percentage"],
+        risk_level=result["risk_level"],
+        is_template=False,
+    )
+    return bool(updated)
+
+
+def upgrade_template_summaries(budget=SUMMARY_UPGRADE_BUDGET):
+    """
+    Background pass over template summaries, highest risk first. Rows younger
+    than the longest possible in-process model call are left alone (that call
+    will upgrade them itself). Returns {"upgraded": n, "failed": n, "deferred": n}.
+    """
+    client = get_client()
+    grace = timedelta(seconds=client.timeout * (client.retries + 1) + 60)
+    templates = AlertSummary.objects.filter(is_template=True, created_at__lt=now() - grace)
+    latest = dict(templates.order_by("alert_id", "created_at").values_list("alert_id", "id"))
+    ids, deferred = summary_queue(EarlyWarningAlert.objects.filter(id__in=list(latest)), budget)
+    if ids:
+        client.warm_up()
+    results = run_concurrently(lambda alert_id: upgrade_template_summary(latest[alert_id]), ids)
+    failed = sum(1 for _, _, error in results if error is not None)
+    return {"upgraded": sum(1 for _, ok, _ in results if ok), "failed": failed, "deferred": len(deferred)}
+
+
+def _clean_lines(lines):
+    """clean_summary_output line by line; headings never span lines, so completed lines are final"""
+    cleaned = [clean_summary_output(line) for line in lines]
+    return "\n".join(line for line in cleaned if line)
+
+
+def stream_alert_summary(alert_obj):
+    """
+    Summary of one alert as (event, data) pairs while the model writes it (SSE view):
+      ("template", {...})      template summary, right away, shown until the model text arrives
+      ("chunk", {"html": ...}) cleaned model text, whole lines only (a heading is never cut in half)
+      ("done", {...})          the saved AlertSummary, same dict as process_alert()
+    A cached output is sent as one chunk. If the model fails the template is
+    saved instead (is_template=True), like process_alert on a timeout.
+    """
+    template = template_summary(alert_obj)
+    yield "template", template
+
+    try:
+        validated_data = extract_alert_data(alert_obj)
+        risk_percentage, risk_level = calculate_outbreak_risk(validated_data.individuals)
+        client = get_client()
+        cache_args = ("summary", client.model, SUMMARY_PROMPT_VERSION,
+                      {"rbalert": alert_obj.rbalert, "cases": validated_data.model_dump()})
+
+        raw_summary_output = cache_lookup(*cache_args)
+        if raw_summary_output is not None:
+            yield "chunk", {"html": clean_summary_output(raw_summary_output)}
+        else:
+            prompt = build_summary_prompt(alert_obj.rbalert, risk_percentage, risk_level, validated_data)
+            pieces, pending = [], ""
+            for piece in client.stream_generate(prompt=prompt):
+                pieces.append(piece)
+                *lines, pending = (pending + piece).split("\n")
+                text = _clean_lines(lines)
+                if text:
+                    yield "chunk", {"html": text}
+            text = _clean_lines([pending])
+            if text:
+                yield "chunk", {"html": text}
+            raw_summary_output = "".join(pieces)
+            cache_store(*cache_args, raw_summary_output)
+    except Exception:
+        logger.exception("Streaming summary for alert %s failed, storing the template", alert_obj.id)
+        yield "done", _save_summary(alert_obj, template, is_template=True)
+        return
+
+    result = {
         "risk_percentage": risk_percentage,
         "risk_level": risk_level,
-        "summary": summary_output,
+        "summary": clean_summary_output(raw_summary_output),
     }
+    yield "done", _save_summary(alert_obj, result, is_template=False)
 
+
+def process_alerts(alerts, max_workers=None, budget=0):
+    """
+    process_alert over several alerts with OLLAMA_CONCURRENCY of them in flight
+    against the model server. [(alert, result, error), ...] in input order.
+    Waits for the model (budget=0) by default, see process_alert.
+    """
+    return run_concurrently(lambda alert: process_alert(alert, budget=budget), alerts, max_workers=max_workers)
+
+
+def pending_summary_alerts():
+    """
+    Alerts that need a (new) summary: none yet, or edited (updated_at) after
+    their latest one. Uses NOT EXISTS, so it stays cheap as summaries pile up.
+    """
+    up_to_date = AlertSummary.objects.filter(alert=OuterRef("pk"), created_at__gte=OuterRef("updated_at"))
+    return EarlyWarningAlert.objects.filter(~Exists(up_to_date))
+
+
+def summary_priority(alert):
+    """
+    (tier, risk %, rule hits) for an alert row (dict with structured_data /
+    rbalert), higher = summarize sooner. Risk comes from calculate_outbreak_risk
+    on the stored cases, no model call. Legacy rows without cases are tiered
+    by how many rules fired (one alert line per rule).
+    """
+    structured = alert["structured_data"]
+    if structured is not None:
+        cases = ExtractedData.model_validate({"individuals": structured.get("individuals", [])}).individuals
+        risk_percentage, risk_level = calculate_outbreak_risk(cases)
+        return RISK_TIERS[risk_level], risk_percentage, len(structured.get("rules", []))
+    hits = len([line for line in alert["rbalert"].splitlines() if line.strip() and "Situation normal" not in line])
+    return min(hits, CRITICAL_TIER), 0.0, hits
+
+
+def summary_queue(queryset, budget=SUMMARY_RUN_BUDGET):
+    """
+    Alert ids of queryset in the order their summaries should be generated:
+    highest risk tier first, then risk %, rule hits and newest first. With a
+    budget, at most that many ids are returned, except that High / Very High
+    alerts are never cut. Returns (ids to process, deferred ids in the same order).
+    """
+    heap = []
+    for alert in queryset.values("id", "structured_data", "rbalert", "created_at").iterator():
+        try:
+            tier, risk, hits = summary_priority(alert)
+        except Exception:
+            logger.exception("Could not rank alert %s, queueing it as Moderate", alert["id"])
+            tier, risk, hits = RISK_TIERS["Moderate"], 0.0, 0  # broken case data: let process_alert report it
+        heapq.heappush(heap, (-tier, -risk, -hits, -alert["created_at"].timestamp(), alert["id"]))
+
+    ids = []
+    while heap and (budget is None or len(ids) < budget or -heap[0][0] >= CRITICAL_TIER):
+        ids.append(heapq.heappop(heap)[-1])
+    deferred = [heapq.heappop(heap)[-1] for _ in range(len(heap))]
+    return ids, deferred
+
+
+def alerts_in_order(ids):
+    """EarlyWarningAlert rows for ids, in that order (one query)"""
+    by_id = EarlyWarningAlert.objects.in_bulk(ids)
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def process_pending_alerts(batch_size=SUMMARY_BATCH_SIZE, budget=SUMMARY_RUN_BUDGET):
+    """
+    Summarize pending alerts in summary_queue order (critical and recent first),
+    batch_size at a time with the alerts of a batch in flight together.
+    Low-risk alerts over the budget get the template summary (is_template) instead,
+    upgrade_template_summaries() gives them model text when there is capacity.
+    Each saved AlertSummary is the checkpoint, so an interrupted run resumes
+    where it left off. A failing alert is logged and skipped for this run.
+    Returns {"processed": [(alert, result), ...], "failed": [alert_id, ...], "deferred": n}.
+    """
+    ids, deferred = summary_queue(pending_summary_alerts(), budget)
+    processed, failed = [], []
+    if ids:
+        get_client().warm_up()  # load the model once, before the first batch
+    for start in range(0, len(ids), batch_size):
+        for alert, result, error in process_alerts(alerts_in_order(ids[start:start + batch_size])):
+            if error is None:
+                processed.append((alert, result))
+            else:
+                failed.append(alert.id)
+    for start in range(0, len(deferred), batch_size):
+        AlertSummary.objects.bulk_create([
+            AlertSummary(alert=alert, is_template=True, summary_text=result["summary"],
+                         risk_percentage=result["risk_percentage"], risk_level=result["risk_level"])
+            for alert, result in ((alert, template_summary(alert)) for alert in alerts_in_order(deferred[start:start + batch_size]))
+        ])
+    return {"processed": processed, "failed": failed, "deferred": len(deferred)}
+
+
+def summary_job_alert_ids(mode, limit=None):
+    """
+    Alert ids a SummaryJob covers, fixed when it starts: "pending" or "all"
+    alerts in summary_queue order, the limit acting as the budget.
+    """
+    queryset = pending_summary_alerts() if mode == "pending" else EarlyWarningAlert.objects.all()
+    ids, _ = summary_queue(queryset, budget=limit)
+    return ids
+
+
+def run_summary_job(job):
+    """
+    Work through a SummaryJob in priority order: batches of SUMMARY_BATCH_SIZE
+    alerts, each batch in flight together. `done` is bumped by the worker threads as every alert
+    finishes, so the status endpoint sees progress alert by alert.
+    """
+    ids = summary_job_alert_ids(job.mode, job.limit)
+    job.status, job.started_at, job.total = "running", now(), len(ids)
+    job.save(update_fields=["status", "started_at", "total"])
+    jobs = SummaryJob.objects.filter(pk=job.pk)
+
+    def process_and_count(alert):
+        result = process_alert(alert, budget=0)  # done must mean model text exists
+        jobs.update(done=F("done") + 1)
+        return result
+
+    try:
+        if ids:
+            get_client().warm_up()
+        for start in range(0, len(ids), SUMMARY_BATCH_SIZE):
+            batch = alerts_in_order(ids[start:start + SUMMARY_BATCH_SIZE])
+            failed = [alert.id for alert, _, error in run_concurrently(process_and_count, batch) if error is not None]
+            if failed:
+                job.failed_alert_ids += failed
+                jobs.update(failed=F("failed") + len(failed), failed_alert_ids=job.failed_alert_ids)
+        jobs.update(status="done", finished_at=now())
+    except Exception as e:
+        logger.exception("Summary job %s failed", job.pk)
+        jobs.update(status="failed", error=str(e), finished_at=now())
+        raise
+
+
+def summary_job_progress(job):
+    """Status payload for a SummaryJob, with an ETA from the average time per finished alert"""
+    finished = job.done + job.failed
+    elapsed = eta = None
+    if job.started_at:
+        elapsed = ((job.finished_at or now()) - job.started_at).total_seconds()
+        if job.status == "running" and finished:
+            eta = round(elapsed / finished * (job.total - finished), 1)
+        elif job.status == "done":
+            eta = 0
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "mode": job.mode,
+        "total": job.total,
+        "done": job.done,
+        "failed": job.failed,
+        "failed_alert_ids": job.failed_alert_ids,
+        "progress": round(finished / job.total * 100, 1) if job.total else (100.0 if job.status == "done" else 0.0),
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "eta_seconds": eta,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,17 @@
+# prediction/signals.py
+from django.dispatch import Signal, receiver
+
+from data_collection.models import HealthReport
+from data_collection.signals import reports_ingested
+from . import realtime
+
+# Sent after EarlyWarningAlert rows are bulk-created (bulk_create skips post_save).
+#   sender : EarlyWarningAlert
+#   alerts : list of saved alerts
+alerts_created = Signal()
+
+
+# new reports -> sliding-window counters, alert as soon as a threshold is crossed
+@receiver(reports_ingested, sender=HealthReport)
+def check_realtime_thresholds(sender, reports, **kwargs):
+    realtime.record_reports(reports)
@@ -1,12 +1,119 @@
 
 # prediction/tasks.py
-from celery import shared_task
-from .models import EarlyWarningAlert
-from .services import process_alert
+from celery import chord, shared_task
+from .models import EarlyWarningAlert, SummaryJob
+from .services import (
+    SUMMARY_RUN_BUDGET, alerts_in_order, process_alerts, process_pending_alerts, run_summary_job, summary_queue,
+    upgrade_template_summaries,
+)
+from .early_warning import area_filter, generate_partition_alerts, stream_rule_counts
+from .aberration import run_aberration_detection
+from .scan import REPLICATES, replicate_chunks, replicate_max_llrs, report_clusters, scan_candidates
+from .llm_cache import evict_llm_cache
+from data_collection.models import HealthReport
+from utils.rule_based_model import alerts_text, evaluate_rules
 
 @shared_task
-def generate_summaries_task():
-    alerts = EarlyWarningAlert.objects.all()
-    for alert in alerts:
-        process_alert(alert)
-    return f"Processed {alerts.count()} alerts"
+def generate_summaries_task(mode="pending", budget=SUMMARY_RUN_BUDGET):
+    # "pending": only alerts without an up-to-date summary, highest risk first; low-risk
+    # alerts over the budget get a template summary, so the daily run follows new alerts
+    # "all": re-summarize every alert (old behaviour)
+    if mode == "all":
+        ids, _ = summary_queue(EarlyWarningAlert.objects.all(), budget=None)
+        results = process_alerts(alerts_in_order(ids))
+        failed = sum(1 for _, _, error in results if error is not None)
+        return f"Processed {len(results) - failed} alerts, {failed} failed"
+
+    result = process_pending_alerts(budget=budget)
+    return (
+        f"Processed {len(result['processed'])} pending alerts, {len(result['failed'])} failed, "
+        f"{result['deferred']} deferred to template"
+    )
+
+
+@shared_task
+def upgrade_template_summaries_task():
+    # replace template summaries with model text while the model server has capacity
+    result = upgrade_template_summaries()
+    return f"Upgraded {result['upgraded']} template summaries, {result['failed']} failed, {result['deferred']} waiting"
+
+
+@shared_task
+def run_summary_job_task(job_id):
+    # queued by the generate-summary endpoint, progress is read from the SummaryJob row
+    job = SummaryJob.objects.get(pk=job_id)
+    run_summary_job(job)
+    job.refresh_from_db()
+    return f"Summary job {job.id}: {job.done}/{job.total} done, {job.failed} failed"
+
+
+@shared_task
+def generate_village_alerts_task(time_period="week", level="village"):
+    # one pass over the window, one alert per village (or district) whose rules fire
+    alerts = generate_partition_alerts(time_period, level=level)
+    return f"Created {len(alerts)} {level} alerts"
+
+
+@shared_task
+def evaluate_window_task(start_date, end_date=None, state_name=None, district_name=None, village_name=None):
+    """
+    Rule evaluation over an arbitrary (e.g. multi-year) window, streamed in
+    chunks so worker memory stays flat. Dates are "YYYY-MM-DD". Nothing is
+    saved, the alert text and the triggered rules are returned.
+    """
+    queryset = HealthReport.objects.filter(
+        date_of_reporting__gte=start_date,
+        **area_filter(state_name=state_name, district_name=district_name, village_name=village_name),
+    )
+    if end_date:
+        queryset = queryset.filter(date_of_reporting__lte=end_date)
+
+    counts = stream_rule_counts(queryset)
+    results = evaluate_rules(counts)
+    return {
+        "reports": counts["total"],
+        "alerts": alerts_text(results),
+        "rules": [r.model_dump() for r in results if r.triggered],
+    }
+
+
+@shared_task
+def detect_aberrations_task():
+    # nightly: advance every village's EWMA-CUSUM state by the days since the last run
+    summary = run_aberration_detection()
+    return f"Checked {summary['villages']} villages over {summary['days']} days, {summary['alerts']} alerts"
+
+
+@shared_task
+def space_time_replicates_task(rates, nbr, n_days, total, replicates, seed):
+    """One chunk of the scan's Monte Carlo replicates, their max LLRs"""
+    return replicate_max_llrs(rates, nbr, n_days, total, replicates, seed).tolist()
+
+
+@shared_task
+def report_space_time_scan_task(results, scan):
+    """chord callback: p-values from all replicate chunks, then the cluster alerts"""
+    summary = report_clusters(scan, [llr for chunk in results for llr in chunk])
+    return f"Scanned {summary['cases']} reports in {summary['villages']} villages, {summary['alerts']} cluster alerts"
+
+
+@shared_task
+def space_time_scan_task(replicates=REPLICATES, seed=None):
+    # nightly: clusters of neighbouring villages whose reports rose together. The
+    # Monte Carlo replicates fan out over the workers (a prefork worker cannot fork a pool itself)
+    scan = scan_candidates()
+    if not scan["candidates"]:
+        summary = report_clusters(scan, [])
+        return f"Scanned {summary['cases']} reports in {summary['villages']} villages, no clusters"
+
+    chord(
+        space_time_replicates_task.s(scan["rates"], scan["nbr"], scan["scan_days"], scan["total"], n, chunk_seed)
+        for n, chunk_seed in replicate_chunks(replicates, seed)
+    )(report_space_time_scan_task.s(scan))
+    return f"Dispatched {replicates} scan replicates for {len(scan['candidates'])} candidate clusters"
+
+
+@shared_task
+def evict_llm_cache_task():
+    removed = evict_llm_cache()
+    return f"Evicted {removed} cached model outputs"
@@ -1,3 +1,906 @@
-from django.test import TestCase
+import json
+import math
+import random
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import billiard
+import httpx
+import numpy as np
+import ollama
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import localdate, now
+
+from data_collection.models import ClinicReport, HealthReport, Village, VillageDailyRollup
+from data_collection.rollups import REPORTS, SOURCE_ASHA
+from data_collection.services import ingest_health_reports
+from utils.rule_based_model import (
+    alerts_text, compute_partitioned_rule_counts, compute_rule_counts, evaluate_rules, generate_health_alerts,
+)
+from sentinel.celery import app as celery_app
+from . import aberration, backtest, llm_cache, llm_client, realtime, scan, services, tasks
+from .early_warning import (
+    PARTITION_LEVELS, individual_case, reports_dataframe, stream_rule_counts, structured_alert_data,
+)
+from rest_framework.test import APIClient
+
+from .models import AlertSummary, EarlyWarningAlert, LLMCache, SummaryJob, VillageDetectorState, VillageRuleCounter
+from .rules import sql_partitioned_rule_counts, sql_rule_counts
+
+
+class SqlRuleBackendParityTests(TestCase):
+    """prediction/rules.py must produce exactly what the pandas reference produces"""
+
+    SYMPTOMS = ["Fever, Cough", "Diarrhea", "vomiting, Headache", "Cold", "FEVER", "Skin Rash, fever", "Itching", ""]
+    SEVERITIES = ["Mild", "Moderate", "Severe", "severe"]
+    SOURCES = ["Well", "River", "Tap", "Pond", "Hand Pump"]
+    TREATMENTS = ["ORS", "No Treatment", "no treatment given", "Antibiotics", ""]
+    WATER_QUALITY = ["Good", "Poor", "Moderate", None]
+    VILLAGES = [("S1", "D1", "Alpha"), ("S1", "D1", "Beta"), ("S1", "D2", "Gamma"), ("S2", "D3", "Delta")]
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(2025)
+        reports = []
+        for i in range(400):
+            state, district, village = rnd.choice(cls.VILLAGES)
+            reports.append(HealthReport(
+                patient_name=f"P{i}",
+                age=rnd.randint(1, 80),
+                gender="F",
+                village_id=cls.VILLAGES.index((state, district, village)) + 1,
+                symptoms=rnd.choice(cls.SYMPTOMS),
+                severity=rnd.choice(cls.SEVERITIES),
+                date_of_reporting=date(2025, 9, rnd.randint(1, 28)),
+                water_source=rnd.choice(cls.SOURCES),
+                treatment_given=rnd.choice(cls.TREATMENTS),
+                asha_worker_id=rnd.randint(1, 5),
+                state=state,
+                district=district,
+                village=village,
+                water_quality=rnd.choice(cls.WATER_QUALITY),
+            ))
+        HealthReport.objects.bulk_create(reports)
+
+    def reference_df(self, queryset, extra_fields=()):
+        # pandas first-appearance order follows row order, i.e. report_id
+        return reports_dataframe(queryset.order_by("report_id"), extra_fields=extra_fields)
+
+    def test_whole_window_matches_pandas(self):
+        for queryset in [
+            HealthReport.objects.all(),
+            HealthReport.objects.filter(date_of_reporting__gte=date(2025, 9, 20)),
+            HealthReport.objects.filter(village="Delta", severity="Severe"),
+        ]:
+            df = self.reference_df(queryset)
+            sql_results = evaluate_rules(sql_rule_counts(queryset))
+            self.assertEqual(alerts_text(sql_results), generate_health_alerts(df))
+            self.assertEqual(sql_results, evaluate_rules(compute_rule_counts(df)))
+
+    def test_partitions_match_pandas(self):
+        queryset = HealthReport.objects.filter(date_of_reporting__gte=date(2025, 9, 10))
+        for key_fields in PARTITION_LEVELS.values():
+            df = self.reference_df(queryset, extra_fields=key_fields)
+            expected = compute_partitioned_rule_counts(df, key_fields)
+            got = sql_partitioned_rule_counts(queryset, key_fields)
+            self.assertEqual(list(got), list(expected))
+            for key, counts in expected.items():
+                self.assertEqual(got[key], counts)
+                self.assertEqual(list(got[key]["severe_by_source"]), list(counts["severe_by_source"]))
+
+    def test_null_partition_key(self):
+        df = self.reference_df(HealthReport.objects.all(), extra_fields=["state", "district", "village"])
+        df.loc[df["village"] == "Beta", "district"] = None
+        partitions = compute_partitioned_rule_counts(df, ["state", "district", "village"])
+        self.assertIn(("S1", None, "Beta"), partitions)
+        for key, counts in partitions.items():
+            state, district, village = key
+            part = df[(df["state"] == state) & (df["village"] == village)]
+            self.assertEqual(counts, compute_rule_counts(part.reset_index(drop=True)))
+        self.assertEqual(sum(counts["total"] for counts in partitions.values()), len(df))
+
+    def test_streaming_matches_pandas(self):
+        queryset = HealthReport.objects.filter(date_of_reporting__gte=date(2025, 9, 5))
+        expected = compute_rule_counts(self.reference_df(queryset))
+        for chunk_size in (1, 7, 100, 1000):
+            got = stream_rule_counts(queryset, chunk_size=chunk_size)
+            self.assertEqual(got, expected)
+            self.assertEqual(list(got["severe_by_source"]), list(expected["severe_by_source"]))
+
+    def test_empty_window(self):
+        counts = sql_rule_counts(HealthReport.objects.none())
+        self.assertEqual(counts["total"], 0)
+        self.assertEqual(counts["severe_by_source"], {})
+
+
+class BaselineAlertTextTests(TestCase):
+    """
+    Alert texts produced by the original loop-based generate_health_alerts for
+    fixed frames. The parity tests only compare the current backends with each
+    other; these pin them to what the API has always returned.
+    """
+
+    COLUMNS = ["Age", "Symptoms", "Severity", "Water Source", "Water Quality", "Treatment Given"]
+    ROWS = [
+        (4, "Diarrhea, Fever", "Severe", "River", "Poor", "No Treatment"),
+        (7, "vomiting", "Severe", "River", "poor", "no treatment given"),
+        (35, "Cough", "Severe", "River", "Good", "ORS"),
+        (62, "FEVER, cough", "severe", "River", "Good", "ORS"),  # "severe" counts for rule 3 only
+        (9, "Cold", "severe", "Well", None, "Antibiotics"),
+        (40, None, "Moderate", "Well", "Moderate", None),
+        (25, "Skin Rash", "Mild", "Well", "Good", "ORS"),
+        (3, "Fever", "Severe", "Pond", "Good", "ORS"),
+        (50, "Headache", "Mild", None, "Good", "ORS"),
+        (18, "Itching", "Mild", "Tap", "POOR", "ORS"),
+        (30, "Cough", "Severe", "Pond", "Good", "ORS"),
+        (45, "Diarrhea", "Severe", "Pond", "Good", "ORS"),
+    ]
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=self.COLUMNS)
+
+    def test_every_rule(self):
+        self.assertEqual(generate_health_alerts(self.frame(self.ROWS)), "\n".join([
+            "Possible Waterborne Outbreak: 3 cases of Diarrhea/Vomiting detected",
+            "Possible Flu/Viral Outbreak: 3 fever + 3 cough cases",
+            "High Severity Alert: 8 severe cases found",
+            "Outbreak Alert in River: 3 severe cases",
+            "Outbreak Alert in Pond: 3 severe cases",
+            "Poor Water Quality Alert: 3 entries marked poor",
+            "Health Risk: 2 people received no treatment",
+            "Child Health Risk: 3 severe cases in children (<10 yrs)",
+        ]))
+
+    def test_threshold_is_inclusive(self):
+        rows = [(30, "Diarrhea" if i == 0 else "Cold", "Mild", "Tap", "Good", "ORS") for i in range(10)]
+        self.assertEqual(generate_health_alerts(self.frame(rows)),
+                         "Possible Waterborne Outbreak: 1 cases of Diarrhea/Vomiting detected")
+
+    def test_nothing_fires(self):
+        rows = [self.ROWS[6], self.ROWS[8]]
+        self.assertEqual(generate_health_alerts(self.frame(rows)), "No outbreak alerts. Situation normal.")
+
+
+def report_row(village, symptoms, severity="Mild", age=30, day=None):
+    return {
+        "patient_name": "P", "age": age, "gender": "F", "village_id": village.village_id, "symptoms": symptoms,
+        "severity": severity, "date_of_reporting": (day or localdate()).isoformat(), "water_source": "Well",
+        "treatment_given": "ORS", "asha_worker_id": 1, "state": village.state_name,
+        "district": village.district_name, "village": village.village_name,
+    }
+
+
+class RealtimeThresholdTests(TestCase):
+
+    def setUp(self):
+        self.village = Village.objects.create(
+            state_name="S1", district_name="D1", village_name="Alpha", latitude=20, longitude=85,
+        )
+
+    def ingest(self, *rows):
+        before = set(EarlyWarningAlert.objects.values_list("id", flat=True))
+        ingest_health_reports(list(rows))
+        return list(EarlyWarningAlert.objects.exclude(id__in=before))
+
+    def test_alert_on_onset_only(self):
+        for _ in range(realtime.MIN_WINDOW_REPORTS - 1):  # too few reports to judge percentages
+            self.assertEqual(self.ingest(report_row(self.village, "Fever")), [])
+
+        (alert,) = self.ingest(report_row(self.village, "Fever"))
+        self.assertEqual((alert.village_name, alert.district_name), ("Alpha", "D1"))
+        self.assertIn("Possible Flu/Viral Outbreak", alert.rbalert)
+        self.assertEqual([r["rule_id"] for r in alert.structured_data["rules"]], ["flu_outbreak"])
+
+        # still firing: no second alert
+        self.assertEqual(self.ingest(report_row(self.village, "Cough")), [])
+        # a new rule starting to fire is a new onset
+        (alert,) = self.ingest(report_row(self.village, "Diarrhea", "Severe", age=4))
+        self.assertIn("Child Health Risk", alert.rbalert)
+
+    def test_reports_outside_the_window_are_not_counted(self):
+        old = localdate() - timedelta(days=realtime.WINDOW_DAYS)
+        self.assertEqual(self.ingest(*[report_row(self.village, "Fever", day=old)] * 6), [])
+        self.assertFalse(VillageRuleCounter.objects.exists())
+
+    def test_ring_buffer_slot_is_reused_by_a_newer_day(self):
+        vid, today = self.village.village_id, localdate()
+        week_ago = today - timedelta(days=realtime.WINDOW_DAYS)
+        realtime.apply_counter_deltas(
+            realtime.counter_deltas([HealthReport(**report_row(self.village, "Fever", day=week_ago))], week_ago)
+        )
+        realtime.apply_counter_deltas(
+            realtime.counter_deltas([HealthReport(**report_row(self.village, "Cough", day=today))] * 2, today)
+        )
+        # an older day arriving late must not clobber the slot
+        realtime.apply_counter_deltas({(vid, week_ago): dict.fromkeys(realtime.COUNTER_FIELDS, 5)})
+
+        counter = VillageRuleCounter.objects.get(village_id=vid)
+        self.assertEqual((counter.day, counter.total, counter.fever, counter.cough), (today, 2, 0, 2))
+        self.assertEqual(realtime.window_counts([vid], today)[vid]["total"], 2)
+
+
+class EarlyWarningAlertReuseTests(TestCase):
+    URL = "/api/prediction/generate_early_warning_alert/"
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model()(pk=1))
+        self.village = Village.objects.create(
+            state_name="S1", district_name="D1", village_name="Alpha", latitude=20, longitude=85,
+        )
+        ingest_health_reports([report_row(self.village, "Fever"), report_row(self.village, "Diarrhea", "Severe")])
+
+    def evaluate(self, village="Alpha"):
+        area = {"state_name": "S1", "district_name": "D1", "village": village, "time_period": "week"}
+        response = self.api.post(self.URL, area, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_unchanged_data_returns_the_stored_alert(self):
+        first = self.evaluate()
+        self.assertFalse(first["cached"])
+        second = self.evaluate()
+        self.assertTrue(second["cached"])
+        self.assertEqual((second["saved_id"], second["alerts"]), (first["saved_id"], first["alerts"]))
+        self.assertEqual(EarlyWarningAlert.objects.exclude(scope_key="").count(), 1)
+
+    def test_new_edited_or_deleted_reports_are_evaluated_again(self):
+        seen = {self.evaluate()["saved_id"]}
+        ingest_health_reports([report_row(self.village, "Cough")])
+        changes = [
+            lambda: None,
+            lambda: HealthReport.objects.filter(symptoms="Cough").first().save(),  # bumps updated_at
+            lambda: HealthReport.objects.filter(symptoms="Fever").delete(),
+        ]
+        for change in changes:
+            change()
+            result = self.evaluate()
+            self.assertFalse(result["cached"])
+            self.assertNotIn(result["saved_id"], seen)
+            seen.add(result["saved_id"])
+
+    def test_other_scopes_do_not_share_alerts(self):
+        village_alert = self.evaluate()["saved_id"]
+        response = self.evaluate(village="")  # whole district
+        self.assertFalse(response["cached"])
+        self.assertNotEqual(response["saved_id"], village_alert)
+
+
+class AberrationDetectionTests(TestCase):
+
+    def step(self, x, state, active=True):
+        return aberration.ewma_cusum_step(np.array([float(x)]), np.array([active]), *state)
+
+    def test_step_seeds_warms_up_and_alarms(self):
+        state = (np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1, dtype=int))
+        mean, variance, cusum, days_seen, alarm, _, _ = self.step(4, state)
+        self.assertEqual((mean[0], days_seen[0], alarm[0]), (4.0, 1, False))  # first day seeds the baseline
+
+        # an inactive village (its state already covers the day) is left alone
+        frozen = self.step(50, (mean, variance, cusum, days_seen), active=False)
+        self.assertEqual((frozen[0][0], frozen[2][0], frozen[3][0]), (4.0, 0.0, 1))
+
+        state = (mean, variance, cusum, days_seen)
+        for _ in range(aberration.WARMUP_DAYS - 1):
+            self.assertFalse(self.step(40, state)[4][0])  # no alarm while warming up
+            state = self.step(4, state)[:4]
+        self.assertEqual(state[3][0], aberration.WARMUP_DAYS)
+
+        mean, variance, cusum, days_seen, alarm, expected, spread = self.step(40, state)
+        self.assertTrue(alarm[0])
+        self.assertEqual(expected[0], state[0][0])
+        self.assertGreater(cusum[0], aberration.CUSUM_H)
+        self.assertEqual((mean[0], variance[0]), (state[0][0], state[1][0]))  # alarm days are not learnt
+
+    def test_run_alerts_on_a_recent_spike_once(self):
+        today = date(2025, 9, 30)
+        quiet, busy = [
+            Village.objects.create(state_name="S1", district_name="D1", village_name=name, latitude=20, longitude=85)
+            for name in ("Quiet", "Busy")
+        ]
+        rows = []
+        for d in range(1, aberration.HISTORY_DAYS + 1):
+            day = today - timedelta(days=d)
+            for village in (quiet, busy):
+                count = 20 if village is busy and d == 1 else 1 + d % 3
+                rows.append(VillageDailyRollup(village_id=village.village_id, date=day, source=SOURCE_ASHA,
+                                               symptom=REPORTS, count=count))
+        VillageDailyRollup.objects.bulk_create(rows)
+
+        summary = aberration.run_aberration_detection(today)
+        self.assertEqual(summary, {"villages": 2, "days": aberration.HISTORY_DAYS, "alerts": 1})
+        alert = EarlyWarningAlert.objects.get(detector=aberration.DETECTOR)
+        self.assertEqual(alert.village_name, "Busy")
+        self.assertEqual((alert.details["day"], alert.details["observed"]), ("2025-09-29", 20))
+        self.assertTrue(VillageDetectorState.objects.get(village_id=busy.village_id).in_alarm)
+        self.assertFalse(VillageDetectorState.objects.get(village_id=quiet.village_id).in_alarm)
+
+        # the states already cover these days: nothing is refit or alerted again
+        self.assertEqual(aberration.run_aberration_detection(today), {"villages": 2, "days": 0, "alerts": 0})
+        # the next day the alarm continues, it is not a new onset
+        VillageDailyRollup.objects.create(village_id=busy.village_id, date=today, source=SOURCE_ASHA,
+                                          symptom=REPORTS, count=25)
+        self.assertEqual(aberration.run_aberration_detection(today + timedelta(days=1))["alerts"], 0)
+        self.assertEqual(VillageDetectorState.objects.get(village_id=busy.village_id).last_day, today)
+
+
+SEVERE_CHILD = {"severity": "Severe", "age": 5, "symptoms": ["Fever", "Diarrhea"], "water_quality": "Poor", "treatment_given": "None"}
+MILD_ADULT = {"severity": "Mild", "age": 30, "symptoms": [], "water_quality": "Good", "treatment_given": "Yes"}
+MODERATE_ELDER = {"severity": "Moderate", "age": 70, "symptoms": ["Fever"], "water_quality": "Poor", "treatment_given": "Yes"}
+
+
+class FakeOllama:
+    """Stands in for ollama.Client: answers every prompt with `text` after `delay` seconds"""
+
+    def __init__(self, text="<p>Model summary</p>", delay=0.0):
+        self.text, self.delay, self.calls = text, delay, 0
+        self.lock = threading.Lock()
+
+    def generate(self, prompt="", stream=False, **kwargs):
+        if not prompt:
+            return {"response": ""}  # warm_up
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if stream:
+            return iter([{"response": self.text[i:i + 5]} for i in range(0, len(self.text), 5)])
+        return {"response": self.text}
+
+    def chat(self, messages=(), **kwargs):
+        with self.lock:
+            self.calls += 1
+        return {"message": {"content": self.text}}
+
+
+def make_alert(village="Alpha", cases=(SEVERE_CHILD,)):
+    return EarlyWarningAlert.objects.create(
+        village_name=village, district_name="D1", state_name="S1",
+        rbalert="Possible Waterborne Outbreak: 2 cases", structured_data={"rules": [], "individuals": list(cases)},
+    )
+
+
+class FakeModelMixin:
+    """Points get_client() at a FakeOllama for the test"""
+
+    def use_model(self, **kwargs):
+        self.model = FakeOllama(**kwargs)
+        client = llm_client.LLMClient(host="http://model.invalid", retries=0)
+        client._client = self.model
+        for name, value in (("_client", client), ("_background", None)):
+            patcher = mock.patch.object(llm_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return self.model
+
+
+class FlakyOllama:
+    """Fails with the given errors first, then answers"""
+
+    def __init__(self, *errors):
+        self.errors, self.calls = list(errors), []
+
+    def generate(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        if kwargs.get("stream"):
+            return iter([{"response": "ok"}])
+        return {"response": "ok"}
+
+
+class LLMClientTests(TestCase):
+
+    def make_client(self, fake, retries=2):
+        client = llm_client.LLMClient(host="http://model.invalid", model="m", retries=retries, keep_alive="5m")
+        client._client = fake
+        patcher = mock.patch.object(llm_client.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        fake = FlakyOllama(httpx.ConnectError("down"), ollama.ResponseError("busy", 503))
+        with self.assertLogs("prediction.llm_client", "WARNING") as logs:
+            self.assertEqual(self.make_client(fake).generate(prompt="p"), {"response": "ok"})
+        self.assertEqual(len(fake.calls), 3)
+        self.assertIn("Ollama generate failed (down), retry 1/2", logs.output[0])
+        self.assertEqual(fake.calls[0], {"prompt": "p", "model": "m", "keep_alive": "5m"})
+        first, second = (call.args[0] for call in self.sleep.call_args_list)
+        self.assertTrue(llm_client.BACKOFF_BASE <= first <= 1.5 * llm_client.BACKOFF_BASE)
+        self.assertTrue(2 * llm_client.BACKOFF_BASE <= second <= 3 * llm_client.BACKOFF_BASE)
+
+    def test_client_errors_and_the_last_attempt_are_raised(self):
+        fake = FlakyOllama(ollama.ResponseError("bad request", 400))
+        with self.assertRaises(ollama.ResponseError):
+            self.make_client(fake).generate(prompt="p")
+        self.assertEqual(len(fake.calls), 1)
+
+        fake = FlakyOllama(*[httpx.ReadTimeout("slow")] * 3)
+        with self.assertRaises(httpx.ReadTimeout), self.assertLogs("prediction.llm_client", "WARNING"):
+            self.make_client(fake).generate(prompt="p")
+        self.assertEqual(len(fake.calls), 3)
+
+    def test_stream_retries_only_before_the_first_piece(self):
+        fake = FlakyOllama(ConnectionError("down"))
+        with self.assertLogs("prediction.llm_client", "WARNING"):
+            self.assertEqual(list(self.make_client(fake).stream_generate(prompt="p")), ["ok"])
+
+        def broken_stream(**kwargs):
+            yield {"response": "part"}
+            raise httpx.ReadError("lost")
+
+        fake.generate = mock.Mock(side_effect=broken_stream)
+        pieces = []
+        with self.assertRaises(httpx.ReadError):
+            for piece in self.make_client(fake).stream_generate(prompt="p"):
+                pieces.append(piece)
+        self.assertEqual((pieces, fake.generate.call_count), (["part"], 1))
+
+    def test_run_concurrently_keeps_order_and_bounds_concurrency(self):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def work(n):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            if n == 3:
+                raise ValueError(n)
+            return n * 10
+
+        with self.assertLogs("prediction.llm_client", "ERROR") as logs:
+            results = llm_client.run_concurrently(work, range(8), max_workers=2)
+        self.assertEqual(logs.output[0].splitlines()[0], "ERROR:prediction.llm_client:Model call failed for 3")
+        self.assertEqual([item for item, _, _ in results], list(range(8)))
+        self.assertEqual([result for _, result, _ in results], [0, 10, 20, None, 40, 50, 60, 70])
+        self.assertIsInstance(results[3][2], ValueError)
+        self.assertEqual(peak[0], 2)
+
+
+class StructuredAlertDataTests(FakeModelMixin, TestCase):
+    EXTRACTED = '{"individuals": [{"severity": "Mild", "age": 40, "symptoms": ["Cough"], "water_quality": "Good"}]}'
+
+    def test_individual_case(self):
+        self.assertEqual(
+            individual_case(4, "Fever, loose motion, Diarrhea", " severe", "POOR", "No treatment given"),
+            {"severity": "Severe", "age": 4, "symptoms": ["Diarrhea", "Fever"], "water_quality": "Poor",
+             "treatment_given": "None"},
+        )
+        self.assertEqual(individual_case(30, "", "Mild", None, "")["treatment_given"], None)
+        self.assertIsNone(individual_case(30, "Fever", "Unknown", "Good", "ORS"))
+
+    def test_structured_data_has_the_fired_rules_and_newest_cases(self):
+        reports = [
+            HealthReport(patient_name="P", age=10 + i, gender="F", village_id=1, symptoms="Fever",
+                         severity="Unknown" if i == 3 else "Mild", date_of_reporting=date(2025, 9, 1 + i),
+                         water_source="Well", treatment_given="ORS", asha_worker_id=1, state="S1",
+                         district="D1", village="Alpha")
+            for i in range(5)
+        ]
+        HealthReport.objects.bulk_create(reports)
+        results = evaluate_rules(sql_rule_counts(HealthReport.objects.all()))
+
+        data = structured_alert_data(results, HealthReport.objects.all(), max_cases=3)
+        self.assertEqual([r["rule_id"] for r in data["rules"]], [r.rule_id for r in results if r.triggered])
+        self.assertTrue(all(r["triggered"] for r in data["rules"]))
+        self.assertEqual([case["age"] for case in data["individuals"]], [14, 12])  # unknown severity left out
+        self.assertEqual(data["case_count"], 5)
+
+    def test_structured_alerts_skip_the_model(self):
+        model = self.use_model(text=self.EXTRACTED)
+        alert = make_alert(cases=[SEVERE_CHILD, MILD_ADULT])
+        extracted = services.extract_alert_data(alert)
+        self.assertEqual([case.model_dump() for case in extracted.individuals], [SEVERE_CHILD, MILD_ADULT])
+        self.assertEqual(model.calls, 0)
+
+    def test_older_alerts_are_extracted_by_the_model(self):
+        model = self.use_model(text=self.EXTRACTED)
+        alert = make_alert()
+        alert.structured_data = None
+        extracted = services.extract_alert_data(alert)
+        self.assertEqual([(case.age, case.symptoms) for case in extracted.individuals], [(40, ["Cough"])])
+        self.assertEqual(model.calls, 1)
+
+
+class LLMCacheTests(FakeModelMixin, TestCase):
+
+    def test_hit_skips_compute(self):
+        compute = mock.Mock(return_value="out")
+        for _ in range(3):
+            self.assertEqual(llm_cache.cached_llm_output("summary", "m", "1", {"b": 1, "a": 2}, compute), "out")
+        compute.assert_called_once()
+        self.assertEqual(LLMCache.objects.get().hits, 2)
+
+        # key order of the payload does not matter, model / prompt version / kind do
+        self.assertEqual(llm_cache.cache_lookup("summary", "m", "1", {"a": 2, "b": 1}), "out")
+        for kind, model, version in (("extraction", "m", "1"), ("summary", "m2", "1"), ("summary", "m", "2")):
+            self.assertIsNone(llm_cache.cache_lookup(kind, model, version, {"a": 2, "b": 1}))
+
+    def test_same_alert_is_summarized_once(self):
+        model = self.use_model()
+        first, second = make_alert("Alpha"), make_alert("Beta")  # same text and cases
+        self.assertEqual(services.llm_summary(first)["summary"], services.llm_summary(second)["summary"])
+        self.assertEqual(model.calls, 1)
+        services.llm_summary(make_alert("Gamma", cases=[MILD_ADULT]))
+        self.assertEqual(model.calls, 2)
+
+    def test_eviction_by_age_then_size(self):
+        t0 = now()
+        for i, (age_days, size) in enumerate([(40, 10), (3, 10), (2, 10), (1, 10)]):
+            LLMCache.objects.create(key=f"k{i}", kind="summary", model="m", prompt_version="1", output="x" * size,
+                                    size=size, last_used_at=t0 - timedelta(days=age_days))
+        self.assertEqual(llm_cache.evict_llm_cache(max_age_days=30, max_bytes=25), 2)
+        self.assertEqual(sorted(LLMCache.objects.values_list("key", flat=True)), ["k2", "k3"])
+
+
+@override_settings(OLLAMA_CONCURRENCY=1)
+class PendingSummaryTests(FakeModelMixin, TestCase):
+
+    def test_pending_until_summarized_and_again_after_an_edit(self):
+        done, edited, fresh = make_alert("Alpha"), make_alert("Beta"), make_alert("Gamma")
+        self.assertEqual(set(services.pending_summary_alerts()), {done, edited, fresh})
+
+        for alert in (done, edited):
+            AlertSummary.objects.create(alert=alert, summary_text="s", risk_percentage=0, risk_level="Low")
+        self.assertEqual(list(services.pending_summary_alerts()), [fresh])
+
+        edited.rbalert += "\nHigh Severity Alert: 1 severe cases found"
+        edited.save()
+        self.assertEqual(set(services.pending_summary_alerts()), {edited, fresh})
+
+    def test_daily_run_skips_summarized_alerts(self):
+        model = self.use_model()
+        make_alert("Alpha")
+        make_alert("Beta", cases=[MILD_ADULT])
+        first = services.process_pending_alerts()
+        self.assertEqual((len(first["processed"]), first["failed"], first["deferred"]), (2, [], 0))
+        self.assertEqual(model.calls, 2)
+
+        second = services.process_pending_alerts()
+        self.assertEqual((second["processed"], second["failed"]), ([], []))
+        self.assertEqual(model.calls, 2)
+        self.assertEqual(AlertSummary.objects.count(), 2)
+
+
+@override_settings(OLLAMA_CONCURRENCY=1)
+class SummaryQueueTests(FakeModelMixin, TestCase):
+
+    def setUp(self):
+        self.critical_old = make_alert("Old")
+        self.critical_new = make_alert("New")
+        self.mild = make_alert("Mild", cases=[MILD_ADULT])
+        self.moderate = make_alert("Moderate", cases=[MODERATE_ELDER])
+        self.legacy = make_alert("Legacy")
+        self.legacy.structured_data = None
+        self.legacy.rbalert = "Possible Waterborne Outbreak: 3 cases\nHigh Severity Alert: 2 severe cases found"
+        self.legacy.save()
+
+    def test_priority_tiers(self):
+        def priority(alert):
+            return services.summary_priority({"structured_data": alert.structured_data, "rbalert": alert.rbalert})
+
+        self.assertEqual(priority(self.critical_old)[0], services.RISK_TIERS["Very High"])
+        self.assertEqual(priority(self.moderate)[0], services.RISK_TIERS["Moderate"])
+        self.assertEqual(priority(self.mild)[:2], (services.RISK_TIERS["Very Low"], 1 / 39 * 100))
+        self.assertEqual(priority(self.legacy), (2, 0.0, 2))  # one tier per rule line
+
+    def test_budget_never_cuts_critical_alerts(self):
+        queryset = EarlyWarningAlert.objects.all()
+        ids, deferred = services.summary_queue(queryset, budget=1)
+        self.assertEqual(ids, [self.critical_new.id, self.critical_old.id])
+        self.assertEqual(deferred, [self.moderate.id, self.legacy.id, self.mild.id])
+
+        ids, deferred = services.summary_queue(queryset, budget=3)
+        self.assertEqual((ids[2:], deferred), ([self.moderate.id], [self.legacy.id, self.mild.id]))
+        self.assertEqual(services.summary_queue(queryset, budget=None)[1], [])
+
+    def test_deferred_alerts_get_the_template(self):
+        model = self.use_model()
+        result = services.process_pending_alerts(budget=1)
+        self.assertEqual([alert.id for alert, _ in result["processed"]], [self.critical_new.id, self.critical_old.id])
+        self.assertEqual((result["failed"], result["deferred"]), ([], 3))
+        self.assertEqual(model.calls, 1)  # both critical alerts share one cached summary
+
+        templates = AlertSummary.objects.filter(is_template=True)
+        self.assertEqual(sorted(templates.values_list("alert_id", flat=True)),
+                         sorted([self.moderate.id, self.legacy.id, self.mild.id]))
+        legacy = templates.get(alert=self.legacy)
+        self.assertEqual(legacy.summary_text, services.template_summary(self.legacy)["summary"])
+        self.assertIn("No case-level data", legacy.summary_text)
+        self.assertFalse(services.pending_summary_alerts().exists())
+
+
+class SummaryStreamTests(FakeModelMixin, TestCase):
+    TEXT = "<strong>1. Risk Overview</strong>\n<p>Risk is very high.</p>\n<strong>2. Key Findings</strong>\n<p>One case.</p>"
+
+    def stream(self, alert_id):
+        response = self.client.get(f"/api/prediction/summary-stream/{alert_id}/", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = []
+        for message in b"".join(response.streaming_content).decode().split("\n\n"):
+            if message:
+                event, data = message.split("\n", 1)
+                events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+    def test_template_then_chunks_then_done(self):
+        model = self.use_model(text=self.TEXT)
+        alert = make_alert()
+        events = self.stream(alert.id)
+        self.assertEqual(events[0], ("template", {"alert_id": alert.id, **services.template_summary(alert)}))
+        chunks = [data["html"] for event, data in events if event == "chunk"]
+        self.assertEqual(len(chunks), 4)  # whole lines only
+        self.assertEqual(chunks[0], "<strong>1. Risk Overview</strong>")
+
+        event, done = events[-1]
+        self.assertEqual(event, "done")
+        self.assertFalse(done["is_template"])
+        self.assertEqual(AlertSummary.objects.get(pk=done["summary_id"]).summary_text, "\n".join(chunks))
+        self.assertEqual(model.calls, 1)
+
+        # same alert again: the stored output comes as one chunk, no model call
+        events = self.stream(alert.id)
+        self.assertEqual([event for event, _ in events], ["template", "chunk", "done"])
+        self.assertEqual(events[1][1]["html"], "\n".join(chunks))
+        self.assertEqual(model.calls, 1)
+
+    def test_model_failure_saves_the_template(self):
+        model = self.use_model()
+        model.generate = mock.Mock(side_effect=ConnectionError("model down"))
+        alert = make_alert()
+        with self.assertLogs("prediction.services", "ERROR") as logs:
+            events = self.stream(alert.id)
+        self.assertIn(f"Streaming summary for alert {alert.id} failed", logs.output[0])
+        self.assertEqual([event for event, _ in events], ["template", "done"])
+        done = events[-1][1]
+        self.assertTrue(done["is_template"])
+        self.assertEqual(AlertSummary.objects.get(pk=done["summary_id"]).summary_text, services.template_summary(alert)["summary"])
+
+    def test_unknown_alert(self):
+        response = self.client.get("/api/prediction/summary-stream/999/")
+        self.assertEqual(response.status_code, 404)
+
+
+class TemplateSummaryTests(TestCase):
+
+    def ngo_line(self, alert):
+        line = next(l for l in services.template_summary(alert)["summary"].splitlines() if "For NGOs" in l)
+        return line.split("</strong> ", 1)[1].removesuffix("</li>")
+
+    def test_ngo_action(self):
+        self.assertEqual(self.ngo_line(make_alert(cases=[SEVERE_CHILD])), (
+            "Distribute water purification tablets and ORS in Alpha and arrange testing of the water sources "
+            "used by affected households, and help the 1 untreated patients reach care."
+        ))
+        self.assertEqual(self.ngo_line(make_alert(cases=[MILD_ADULT])),
+                         "Support ASHA workers in Alpha with ORS, basic medicines and transport for referrals.")
+
+
+# background model calls use their own DB connection, so the rows must be committed
+@override_settings(SUMMARY_LATENCY_BUDGET=0.1, OLLAMA_CONCURRENCY=2)
+class SummaryLatencyBudgetTests(FakeModelMixin, TransactionTestCase):
+
+    def test_fast_model_text_is_stored(self):
+        self.use_model()
+        result = services.process_alert(make_alert())
+        self.assertFalse(result["is_template"])
+        self.assertEqual(AlertSummary.objects.get(pk=result["summary_id"]).summary_text, "<p>Model summary</p>")
+
+    def test_slow_model_stores_template_then_upgrades_it(self):
+        model = self.use_model(delay=0.5)
+        alert = make_alert()
+        result = services.process_alert(alert)
+        self.assertTrue(result["is_template"])
+        self.assertEqual(result["summary"], services.template_summary(alert)["summary"])
+
+        deadline = time.monotonic() + 5
+        while AlertSummary.objects.get(pk=result["summary_id"]).is_template and time.monotonic() < deadline:
+            time.sleep(0.05)
+        summary = AlertSummary.objects.get(pk=result["summary_id"])
+        self.assertFalse(summary.is_template)
+        self.assertEqual(summary.summary_text, "<p>Model summary</p>")
+        self.assertEqual(AlertSummary.objects.filter(alert=alert).count(), 1)
+        self.assertEqual(model.calls, 1)
+
+    def test_background_pass_upgrades_old_templates(self):
+        model = self.use_model()
+        old, recent = make_alert("Alpha"), make_alert("Beta", cases=[MILD_ADULT])
+        for alert in (old, recent):
+            template = services.template_summary(alert)
+            AlertSummary.objects.create(alert=alert, is_template=True, summary_text=template["summary"],
+                                        risk_percentage=template["risk_percentage"], risk_level=template["risk_level"])
+        AlertSummary.objects.filter(alert=old).update(created_at=now() - timedelta(days=1))
+
+        self.assertEqual(services.upgrade_template_summaries(), {"upgraded": 1, "failed": 0, "deferred": 0})
+        self.assertEqual(AlertSummary.objects.get(alert=old).summary_text, "<p>Model summary</p>")
+        self.assertTrue(AlertSummary.objects.get(alert=recent).is_template)  # its own model call may still land
+        self.assertEqual(model.calls, 1)
+
+    def test_batch_paths_wait_for_the_model(self):
+        model = self.use_model(delay=0.3)
+        alerts = [make_alert("Alpha"), make_alert("Beta")]
+        results = services.process_alerts(alerts)
+        self.assertEqual([error for _, _, error in results], [None, None])
+        self.assertEqual([result["is_template"] for _, result, _ in results], [False, False])
+        self.assertFalse(AlertSummary.objects.filter(is_template=True).exists())
+        self.assertEqual(model.calls, 2)
+
+
+class SpaceTimeScanTests(TestCase):
+
+    def test_cylinder_llr(self):
+        recent = np.array([[10.0], [1.0], [1.0]])
+        rates = np.ones(3)
+        nbr = np.array([[0, 1], [1, 2], [2, -1]])
+        llrs = scan.cylinder_llrs(recent, rates, nbr)
+        # village 0 alone: c = 10 of C = 12, e = 4
+        self.assertAlmostEqual(llrs[0, 0, 0], 10 * math.log(10 / 4) + 2 * math.log(2 / 8))
+        # village 0 + 1: c = 11, e = 8
+        self.assertAlmostEqual(llrs[0, 0, 1], 11 * math.log(11 / 8) + 1 * math.log(1 / 4))
+        # below expectation, or a missing neighbour: no score
+        self.assertEqual(llrs[0, 1, 0], 0.0)
+        self.assertEqual(llrs[0, 2, 1], 0.0)
+        self.assertEqual(scan.top_clusters(llrs, nbr)[0][1:], (1, 0, 0))
+
+    def test_null_distribution_is_the_same_serial_and_parallel(self):
+        rates, nbr = np.ones(4), np.array([[0, 1], [1, 0], [2, 3], [3, 2]])
+        args = (rates, nbr, 3, 20, 120)
+        self.assertEqual(sum(n for n, _ in scan.replicate_chunks(120, seed=7)), 120)
+        serial = scan.null_distribution(*args, workers=1, seed=7)
+        self.assertEqual(len(serial), 120)
+        np.testing.assert_array_equal(serial, scan.null_distribution(*args, workers=2, seed=7))
+        self.assertGreater(len(set(serial)), 1)
+
+    def make_cluster(self, today):
+        villages = [
+            Village.objects.create(state_name="S1", district_name="D1", village_name=f"V{i}",
+                                   latitude=20 + i * 0.01, longitude=85)
+            for i in range(10)
+        ]
+        call_command("build_village_neighbors", k=3, stdout=open("/dev/null", "w"))
+        first_day = today - timedelta(days=scan.SCAN_DAYS + scan.BASELINE_DAYS)
+        rows = []
+        for n in range(scan.SCAN_DAYS + scan.BASELINE_DAYS):
+            day = first_day + timedelta(days=n)
+            for i, village in enumerate(villages):
+                count = 2 + (12 if i < 2 and day >= today - timedelta(days=3) else 0)
+                rows.append(VillageDailyRollup(village_id=village.village_id, date=day, source=SOURCE_ASHA,
+                                               symptom=REPORTS, count=count))
+        VillageDailyRollup.objects.bulk_create(rows)
+
+    def test_scan_reports_a_significant_cluster(self):
+        today = date(2025, 9, 30)
+        self.make_cluster(today)
+        summary = scan.run_space_time_scan(today=today, replicates=99, workers=1, seed=1)
+        self.assertEqual(summary["alerts"], 1)
+        alert = EarlyWarningAlert.objects.get(detector=scan.DETECTOR)
+        self.assertEqual(set(alert.details["villages"]), {"V0", "V1"})
+        self.assertEqual(alert.details["observed"], 2 * 3 * 14)
+        self.assertLessEqual(alert.details["p_value"], scan.ALPHA)
+
+    def test_scan_task_fans_replicates_out_as_a_chord(self):
+        today = date(2025, 9, 30)
+        self.make_cluster(today)
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True  # header and callback run here, in order
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", eager)
+        with mock.patch("prediction.scan.localdate", return_value=today), \
+                mock.patch.object(tasks.space_time_replicates_task, "run", wraps=tasks.space_time_replicates_task.run) as chunk:
+            tasks.space_time_scan_task.delay(replicates=120, seed=1)
+        self.assertEqual(chunk.call_count, len(scan.replicate_chunks(120)))
+        alert = EarlyWarningAlert.objects.get(detector=scan.DETECTOR)
+        self.assertEqual(alert.details["replicates"], 120)
+        self.assertEqual(set(alert.details["villages"]), {"V0", "V1"})
+
+
+def _backtest_in_daemon(queue, history, grid):
+    with mock.patch.object(backtest, "load_history", return_value=history):
+        queue.put(backtest.run_backtest(date(2025, 9, 1), date(2025, 9, 30), grid, workers=2))
+
+
+class BacktestTests(TestCase):
+    GRID = {"rules": {"window": [5, 7]}, "ewma_cusum": {}}
+
+    def test_window_sums(self):
+        daily = np.array([[1, 2, 3, 4, 5]])
+        np.testing.assert_array_equal(backtest.window_sums(daily, 2), [[1, 3, 5, 7, 9]])
+
+    def test_score_onsets(self):
+        onsets = np.zeros((2, 20), dtype=bool)
+        events = np.zeros((2, 20), dtype=bool)
+        onsets[0, [5, 15]] = True
+        events[0, 8] = events[1, 10] = True
+        score = backtest.score_onsets(onsets, events, lead_days=14)
+        self.assertEqual(score["alerts"], 2)
+        self.assertEqual(score["alerts_per_village_month"], 1.5)
+        self.assertEqual((score["events"], score["hits"], score["hit_rate"]), (2, 1, 0.5))
+        self.assertEqual((score["mean_lead_days"], score["median_lead_days"]), (3.0, 3.0))
+        self.assertEqual((score["false_alerts"], score["precision"]), (1, 0.5))
+
+    def make_history(self):
+        alpha = Village.objects.create(state_name="S1", district_name="D1", village_name="Alpha", latitude=20, longitude=85)
+        beta = Village.objects.create(state_name="S1", district_name="D1", village_name="Beta", latitude=21, longitude=85)
+        reports = []
+        for day in range(1, 31):
+            reports.append(self.report(beta, day, "Cold"))
+            if 10 <= day <= 16:
+                reports += [self.report(alpha, day, "Diarrhea"), self.report(alpha, day, "Vomiting")]
+        HealthReport.objects.bulk_create(reports)
+        ClinicReport.objects.create(village=alpha, diarrhea_cases=10, date_of_reporting=date(2025, 9, 18))
+        return alpha
+
+    def report(self, village, day, symptoms):
+        return HealthReport(
+            patient_name="P", age=30, gender="F", village_id=village.village_id, symptoms=symptoms, severity="Mild",
+            date_of_reporting=date(2025, 9, day), water_source="Well", treatment_given="ORS", asha_worker_id=1,
+            state=village.state_name, district=village.district_name, village=village.village_name, water_quality="Good",
+        )
+
+    def test_rules_alert_ahead_of_the_clinic_outbreak(self):
+        self.make_history()
+        results = backtest.run_backtest(date(2025, 9, 1), date(2025, 9, 30), self.GRID, workers=1)
+        self.assertEqual([r["detector"] for r in results], ["rules", "rules", "ewma_cusum"])
+        week = next(r for r in results if r["params"].get("window") == 7)
+        # Alpha crosses min_reports with 100% waterborne reports on the 12th, the clinic event is the 18th
+        self.assertEqual((week["alerts"], week["events"], week["hits"]), (1, 1, 1))
+        self.assertEqual(week["mean_lead_days"], 6.0)
+        self.assertEqual(week["false_alerts"], 0)
+
+    def test_pool_inside_a_daemonic_worker(self):
+        self.make_history()
+        history = backtest.load_history(date(2025, 8, 26), date(2025, 9, 30))
+        serial = backtest.run_backtest(date(2025, 9, 1), date(2025, 9, 30), self.GRID, workers=1)
+
+        # a Celery prefork worker is a daemonic billiard process; the pool must still start there
+        queue = billiard.Queue()
+        worker = billiard.Process(target=_backtest_in_daemon, args=(queue, history, self.GRID), daemon=True)
+        worker.start()
+        self.assertEqual(queue.get(timeout=120), serial)
+        worker.join()
+
+
+@override_settings(OLLAMA_CONCURRENCY=2)
+class SummaryJobTests(FakeModelMixin, TransactionTestCase):
+    URL = "/api/prediction/generate-summary/"
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model()(pk=1))
+
+    def test_bad_limit_is_a_client_error(self):
+        for limit in ("abc", "-1", "0"):
+            self.assertEqual(self.api.post(self.URL, {"limit": limit}, format="json").status_code, 400)
+        self.assertFalse(SummaryJob.objects.exists())
+
+    def test_job_that_cannot_be_queued_is_marked_failed(self):
+        with mock.patch("prediction.views.run_summary_job_task.delay", side_effect=ConnectionError("broker down")):
+            response = self.api.post(self.URL, {"mode": "pending"}, format="json")
+        self.assertEqual(response.status_code, 503)
+        job = SummaryJob.objects.get(pk=response.json()["job_id"])
+        self.assertEqual((job.status, job.error), ("failed", "Could not queue the job: broker down"))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.api.get(f"/api/prediction/summary-jobs/{job.id}/").json()["status"], "failed")
+
+    def test_job_is_queued_then_runs_with_progress(self):
+        model = self.use_model()
+        alerts = [make_alert("Alpha"), make_alert("Beta", cases=[MILD_ADULT])]
+        with mock.patch("prediction.views.run_summary_job_task.delay", return_value=mock.Mock(id="task-1")) as delay:
+            response = self.api.post(self.URL, {"mode": "pending", "limit": "5"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        job = SummaryJob.objects.get(pk=response.json()["job_id"])
+        delay.assert_called_once_with(job.id)
+        self.assertEqual((job.mode, job.limit, job.task_id), ("pending", 5, "task-1"))
+
+        services.run_summary_job(job)
+        progress = self.api.get(response.json()["status_url"]).json()
+        self.assertEqual((progress["status"], progress["total"], progress["done"], progress["failed"]), ("done", 2, 2, 0))
+        self.assertEqual(model.calls, 2)
+        self.assertEqual(sorted(AlertSummary.objects.filter(is_template=False).values_list("alert_id", flat=True)),
+                         sorted(alert.id for alert in alerts))
@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from .views import GenerateSummaryView, AlertSummaryDetailView, AlertSummaryListView, get_early_warning_alerts,generate_early_warning_alert
+from .views import GenerateSummaryView, SummaryJobStatusView, SummaryStreamView, AlertSummaryDetailView, AlertSummaryListView, get_early_warning_alerts,generate_early_warning_alert
 
 app_name = "prediction"
 
@@ -9,6 +9,8 @@ urlpatterns = [
     path("get_early_warning_alerts", get_early_warning_alerts, name="get_early_warning_alerts"),
     path("generate-summary/", GenerateSummaryView.as_view(), name="generate-summary-all"),
     path("generate-summary/<int:alert_id>/", GenerateSummaryView.as_view(), name="generate-summary"),
+    path("summary-jobs/<int:job_id>/", SummaryJobStatusView.as_view(), name="summary-job"),
+    path("summary-stream/<int:alert_id>/", SummaryStreamView.as_view(), name="summary-stream"),
     path("summary/<int:alert_id>/", AlertSummaryDetailView.as_view(), name="summary-detail"),
     path("summaries/", AlertSummaryListView.as_view(), name="summary-list"),
 ]
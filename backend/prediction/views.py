@@ -2,9 +2,14 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
-from .models import EarlyWarningAlert, AlertSummary
-from .services import process_alert
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from .models import EarlyWarningAlert, AlertSummary, SummaryJob
+from .renderers import EventStreamRenderer, sse_event
+from .services import process_alert, stream_alert_summary, summary_job_progress
+from .tasks import run_summary_job_task
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from .models import EarlyWarningAlert
@@ -17,24 +22,74 @@ from rest_framework.response import Response
 
 from data_collection.models import HealthReport   # 👈 import from datacollect
 from prediction.models import EarlyWarningAlert
-from utils.rule_based_model import generate_health_alerts
+from utils.rule_based_model import alerts_text, evaluate_rules
+from .early_warning import (
+    PARTITION_LEVELS, alert_scope_key, area_filter, data_watermark, generate_partition_alerts,
+    structured_alert_data, window_start,
+)
+from .rules import sql_rule_counts
 
 
 class GenerateSummaryView(APIView):
     """
     API endpoint to process EarlyWarningAlert rows,
     generate summary + risk, and save into AlertSummary.
-    Can process all alerts or a single alert if alert_id is provided.
+    With alert_id that one alert is summarized right away. Without it a
+    SummaryJob is queued on Celery and 202 + job id is returned at once;
+    poll summary-jobs/<job_id>/ for progress. "mode": "pending" (body or
+    query string) limits the job to alerts without an up-to-date summary.
+    Alerts run highest risk first; "limit" caps the number of alerts, but
+    High / Very High ones are never left out.
     """
-    permission_classes = [AllowAny]
+
+    def get_permissions(self):
+        # a bulk job keeps the model server busy for a long time, only for logged-in users
+        if self.kwargs.get("alert_id"):
+            return [AllowAny()]
+        return [IsAuthenticated()]
 
     def post(self, request, alert_id=None, *args, **kwargs):
         try:
-            if alert_id:
-                alerts = EarlyWarningAlert.objects.filter(id=alert_id)
-            else:
-                alerts = EarlyWarningAlert.objects.all()
+            if not alert_id:
+                mode = request.data.get("mode") or request.query_params.get("mode") or "all"
+                limit = request.data.get("limit") or request.query_params.get("limit")
+                if mode not in ("all", "pending"):
+                    return Response({"error": "Invalid mode. Use 'all' or 'pending'"}, status=status.HTTP_400_BAD_REQUEST)
+                if limit:
+                    try:
+                        limit = int(limit)
+                    except (TypeError, ValueError):
+                        limit = 0
+                    if limit < 1:
+                        return Response({"error": "limit must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+                job = SummaryJob.objects.create(
+                    mode=mode,
+                    limit=limit or None,
+                    requested_by=request.user.pk,
+                )
+                try:
+                    task = run_summary_job_task.delay(job.id)
+                except Exception as e:
+                    # broker unreachable: the job never ran, it must not stay "queued"
+                    SummaryJob.objects.filter(pk=job.pk).update(
+                        status="failed", error=f"Could not queue the job: {e}", finished_at=now(),
+                    )
+                    return Response(
+                        {"error": "Could not queue the summary job, try again later", "job_id": job.id},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    )
+                SummaryJob.objects.filter(pk=job.pk).update(task_id=task.id or "")
+                return Response(
+                    {
+                        "message": "Summary job queued",
+                        "job_id": job.id,
+                        "status_url": reverse("prediction:summary-job", args=[job.id]),
+                    },
+                    status=status.HTTP_202_ACCEPTED
+                )
 
+            alerts = EarlyWarningAlert.objects.filter(id=alert_id)
             if not alerts.exists():
                 return Response(
                     {"error": "No alerts found to process."},
@@ -52,6 +107,7 @@ class GenerateSummaryView(APIView):
                     "risk_percentage": summary_obj["risk_percentage"],
                     "risk_level": summary_obj["risk_level"],
                     "summary": summary_obj["summary"],
+                    "is_template": summary_obj["is_template"],
                 })
 
             return Response(
@@ -63,6 +119,43 @@ class GenerateSummaryView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SummaryJobStatusView(APIView):
+    """Progress of a queued summary job: done/total, failures, ETA"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = SummaryJob.objects.filter(pk=job_id).first()
+        if not job:
+            return Response({"error": "No summary job found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary_job_progress(job), status=status.HTTP_200_OK)
+
+
+# GET endpoint streaming a new summary (Server-Sent Events)
+class SummaryStreamView(APIView):
+    """
+    Generates the summary of one alert and streams it as the model writes it:
+    "template" first (instant), then "chunk" events with cleaned HTML lines,
+    then "done" with the saved summary (summary_id, is_template).
+    Use with EventSource; plain clients get the same events as text.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, alert_id, *args, **kwargs):
+        alert = EarlyWarningAlert.objects.filter(id=alert_id).first()
+        if not alert:
+            return Response({"error": "Alert not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        def events():
+            for event, data in stream_alert_summary(alert):
+                yield sse_event(event, {"alert_id": alert.id, **data})
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx would hold the chunks back
+        return response
+
+
 # GET endpoint for a single summary
 class AlertSummaryDetailView(APIView):
     permission_classes = [AllowAny]
@@ -79,6 +172,7 @@ class AlertSummaryDetailView(APIView):
             "risk_percentage": summary.risk_percentage,
             "risk_level": summary.risk_level,
             "summary": summary.summary_text,
+            "is_template": summary.is_template,
         }, status=status.HTTP_200_OK)
 
 
@@ -97,6 +191,7 @@ class AlertSummaryListView(APIView):
                 "risk_percentage": summary.risk_percentage,
                 "risk_level": summary.risk_level,
                 "summary": summary.summary_text,
+                "is_template": summary.is_template,
                 "created_at": summary.created_at,
             }
             for summary in summaries
@@ -131,6 +226,10 @@ def generate_early_warning_alert(request):
     """
     Analyze HealthReports, generate alerts,
     save them in EarlyWarningAlert, and return response.
+
+    Only reports of the requested area (state_name / district_name / village)
+    are evaluated. With "partition": "village" or "district" every area inside
+    the request is evaluated separately and one alert is saved per area that fires.
     """
     clinic_id = request.data.get("clinic_id")
     asha_worker_id = request.data.get("asha_worker_id")
@@ -140,50 +239,61 @@ def generate_early_warning_alert(request):
     district_name = request.data.get("district_name")
     state_name = request.data.get("state_name")
     time_period = request.data.get("time_period", "week")
+    partition = request.data.get("partition")
 
-    today = now().date()
-
-    if time_period == "week":
-        start_date = today - timedelta(days=7)
-    elif time_period == "month":
-        start_date = today - timedelta(days=30)
-    else:
+    start_date = window_start(time_period)
+    if start_date is None:
         return Response(
             {"status": "error", "message": "Invalid time_period. Use 'week' or 'month'"},
             status=400,
         )
 
-    queryset = HealthReport.objects.filter(date_of_reporting__gte=start_date)
+    area = {"state_name": state_name, "district_name": district_name, "village_name": village_name}
 
-    if not queryset.exists():
+    if partition:
+        if partition not in PARTITION_LEVELS:
+            return Response(
+                {"status": "error", "message": "Invalid partition. Use 'village' or 'district'"},
+                status=400,
+            )
+        alerts = generate_partition_alerts(time_period, level=partition, **area)
         return Response(
-            {"status": "success", "message": "No records found in this period."}
+            {
+                "status": "success",
+                "alerts": EarlyWarningAlertSerializer(alerts, many=True).data,
+                "saved_ids": [alert.id for alert in alerts],
+            }
         )
 
-    df = pd.DataFrame.from_records(
-        queryset.values(
-            "age",
-            "symptoms",
-            "severity",
-            "water_source",
-            "treatment_given",
-            "water_quality",
+    queryset = HealthReport.objects.filter(date_of_reporting__gte=start_date, **area_filter(**area))
+
+    watermark = data_watermark(queryset)
+    if watermark is None:
+        return Response(
+            {"status": "success", "message": "No records found in this period."}
         )
-    )
 
-    df.rename(
-        columns={
-            "age": "Age",
-            "symptoms": "Symptoms",
-            "severity": "Severity",
-            "water_source": "Water Source",
-            "treatment_given": "Treatment Given",
-            "water_quality": "Water Quality",
-        },
-        inplace=True,
+    # nothing changed in this scope since the last evaluation -> hand back that alert
+    scope_key = alert_scope_key(time_period, start_date, **area)
+    cached = (
+        EarlyWarningAlert.objects.filter(scope_key=scope_key, data_watermark=watermark)
+        .order_by("-id")
+        .first()
     )
+    if cached:
+        response = {
+            "status": "success",
+            "alerts": cached.rbalert,
+            "saved_id": cached.id,
+            "cached": True,
+        }
+        if cached.structured_data is not None:
+            response["rules"] = cached.structured_data["rules"]
+        return Response(response)
 
-    result_string = generate_health_alerts(df)
+    # rule counts computed by the database in one grouped query (no DataFrame)
+    rule_results = evaluate_rules(sql_rule_counts(queryset))
+    result_string = alerts_text(rule_results)
 
     # save in EarlyWarningAlert
     alert = EarlyWarningAlert.objects.create(
@@ -194,12 +304,17 @@ def generate_early_warning_alert(request):
         district_name=district_name,
         state_name=state_name,
         rbalert=result_string,
+        structured_data=structured_alert_data(rule_results, queryset),
+        scope_key=scope_key,
+        data_watermark=watermark,
     )
 
     return Response(
         {
             "status": "success",
             "alerts": result_string,
+            "rules": [r.model_dump() for r in rule_results if r.triggered],
             "saved_id": alert.id,
+            "cached": False,
         }
     )
@@ -25,8 +25,45 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'prediction.tasks.generate_summaries_task',
         'schedule': 86400.0,  # every 24 hours
     },
+    'generate-daily-village-alerts': {
+        'task': 'prediction.tasks.generate_village_alerts_task',
+        'schedule': 86400.0,  # every 24 hours, one alert per village that fires
+    },
+    'detect-village-aberrations': {
+        'task': 'prediction.tasks.detect_aberrations_task',
+        'schedule': 86400.0,  # nightly, EWMA-CUSUM on each village's daily reports
+    },
+    'scan-village-clusters': {
+        'task': 'prediction.tasks.space_time_scan_task',
+        'schedule': 86400.0,  # nightly, space-time scan over neighbouring villages
+    },
+    'evict-llm-cache': {
+        'task': 'prediction.tasks.evict_llm_cache_task',
+        'schedule': 86400.0,  # drop stale / over-budget cached model outputs
+    },
+    'upgrade-template-summaries': {
+        'task': 'prediction.tasks.upgrade_template_summaries_task',
+        'schedule': 900.0,  # every 15 minutes, template summaries -> model text
+    },
+    'refresh-dirty-village-dashboards': {
+        'task': 'admindashboard.tasks.refresh_dirty_villages_task',
+        'schedule': 300.0,  # every 5 minutes
+    },
+    'refresh-all-village-dashboards': {
+        'task': 'admindashboard.tasks.refresh_all_villages_sharded_task',
+        'schedule': 86400.0,  # every 24 hours, split across all workers
+    },
 }
 
+# local Ollama server used for alert summaries (prediction/llm_client.py)
+OLLAMA_HOST = decouple_config('OLLAMA_HOST', default='http://localhost:11434')
+OLLAMA_MODEL = decouple_config('OLLAMA_MODEL', default='gemma3:1b')
+OLLAMA_TIMEOUT = decouple_config('OLLAMA_TIMEOUT', default=120.0, cast=float)  # seconds per call
+OLLAMA_RETRIES = decouple_config('OLLAMA_RETRIES', default=2, cast=int)
+OLLAMA_KEEP_ALIVE = decouple_config('OLLAMA_KEEP_ALIVE', default='30m')  # keep the model loaded between calls
+OLLAMA_CONCURRENCY = decouple_config('OLLAMA_CONCURRENCY', default=2, cast=int)  # match the server's OLLAMA_NUM_PARALLEL
+# seconds an alert waits for the model before its template summary is stored (upgraded later)
+SUMMARY_LATENCY_BUDGET = decouple_config('SUMMARY_LATENCY_BUDGET', default=1.0, cast=float)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
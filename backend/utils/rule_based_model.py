@@ -1,48 +1,255 @@
+import numpy as np
 import pandas as pd
+from pydantic import BaseModel
 
-def generate_health_alerts(df: pd.DataFrame) -> str:
-    alerts = []
+# Rule engine over a DataFrame of health reports with columns
+# Age, Symptoms, Severity, Water Source, Treatment Given, Water Quality.
+#
+#   compute_rule_counts(df) -> plain dict of counts (one pass per column)
+#   evaluate_rules(counts)  -> list[RuleResult] (thresholds applied, no DataFrame needed)
+#   generate_health_alerts(df) -> the alert text the API has always returned
+#
+# Every text column is hashed once into its distinct values (value_counts /
+# factorize); the substring checks then run on those few distinct values
+# instead of on every row.
+
+
+class RuleResult(BaseModel):
+    rule_id: str
+    triggered: bool
+    counts: dict[str, int]
+    threshold: float
+    message: str
+    water_source: str | None = None   # only for the per-source rule
+
+
+NORMAL_MESSAGE = "No outbreak alerts. Situation normal."
+
+
+def _count_contains(value_counts: pd.Series, pattern: str) -> int:
+    """
+    Same as df[col].str.contains(pattern, case=False, na=False).sum(), given
+    df[col].value_counts(): the regex only runs on the distinct values.
+    """
+    if value_counts.empty:
+        return 0
+    matches = np.asarray(value_counts.index.astype(str).str.contains(pattern, case=False, regex=True), dtype=bool)
+    return int(value_counts.to_numpy()[matches].sum())
+
+
+def compute_rule_counts(df: pd.DataFrame) -> dict:
+    """
+    Everything the rules need, as counts:
+      total, waterborne, fever, cough, severe, poor_water, no_treatment,
+      children_severe, severe_by_source {water source: exact "Severe" rows}
+    severe_by_source keeps the order in which sources first appear in df.
+    """
+    symptoms = df["Symptoms"].value_counts(sort=False)
+
+    # Severity is needed per row (rules 4 and 7) and per value (rule 3): factorize once
+    severity_codes, severity_values = pd.factorize(df["Severity"])
+    severity = pd.Series(
+        np.bincount(severity_codes[severity_codes >= 0], minlength=len(severity_values)),
+        index=pd.Index(severity_values),
+    )
+    # exact "Severe" (rules 4 and 7), as opposed to the case-insensitive contains of rule 3
+    severe_exact = np.zeros(len(df), dtype=bool)
+    if "Severe" in severity.index:
+        severe_exact = severity_codes == severity.index.get_loc("Severe")
+
+    # Rule 4: one groupby over the water source codes (factorize and sort=False both keep
+    # first-appearance order, like df["Water Source"].unique(); code -1 = missing source)
+    source_codes, source_values = pd.factorize(df["Water Source"])
+    severe_per_code = pd.Series(severe_exact).groupby(source_codes, sort=False).sum()
+    by_source = {source_values[code]: int(n) for code, n in severe_per_code.items() if code >= 0}
+
+    return {
+        "total": len(df),
+        "waterborne": _count_contains(symptoms, "Diarrhea|Vomiting"),
+        "fever": _count_contains(symptoms, "Fever"),
+        "cough": _count_contains(symptoms, "Cough"),
+        "severe": _count_contains(severity, "Severe"),
+        "poor_water": _count_contains(df["Water Quality"].value_counts(sort=False), "Poor"),
+        "no_treatment": _count_contains(df["Treatment Given"].value_counts(sort=False), "No Treatment"),
+        "children_severe": int(((df["Age"] < 10).to_numpy() & severe_exact).sum()),
+        "severe_by_source": by_source,
+    }
+
+
+RULE_COUNTERS = ["waterborne", "fever", "cough", "severe", "poor_water", "no_treatment", "children_severe"]
+
+
+def empty_rule_counts() -> dict:
+    """compute_rule_counts() of an empty window, the starting point for merge_rule_counts()"""
+    counts = {name: 0 for name in RULE_COUNTERS}
+    counts["total"] = 0
+    counts["severe_by_source"] = {}
+    return counts
+
+
+def merge_rule_counts(running: dict, chunk: dict) -> dict:
+    """
+    Add the counts of a later chunk of rows into running (in place, returned).
+    Sources first seen in the later chunk go to the end, so merging chunks in
+    row order keeps the first-appearance order of one big DataFrame.
+    """
+    running["total"] += chunk["total"]
+    for name in RULE_COUNTERS:
+        running[name] += chunk[name]
+    for source, n in chunk["severe_by_source"].items():
+        running["severe_by_source"][source] = running["severe_by_source"].get(source, 0) + n
+    return running
+
+
+def _row_contains(series: pd.Series, pattern: str) -> np.ndarray:
+    """Per-row case-insensitive contains (NaN -> False), regex evaluated on distinct values only"""
+    codes, uniques = pd.factorize(series)
+    matches = np.zeros(len(uniques) + 1, dtype=bool)  # last slot answers code -1 (missing)
+    if len(uniques):
+        matches[:-1] = np.asarray(pd.Index(uniques).astype(str).str.contains(pattern, case=False, regex=True), dtype=bool)
+    return matches[codes]
+
+
+def _partition_key(key):
+    """groupby key -> tuple, missing values (NaN/None, kept by dropna=False) as None like the SQL backend"""
+    key = key if isinstance(key, (tuple, list)) else (key,)
+    return tuple(None if pd.isna(value) else value for value in key)
+
+
+def compute_partitioned_rule_counts(df: pd.DataFrame, by: list[str]) -> dict[tuple, dict]:
+    """
+    compute_rule_counts() for every partition of df (e.g. by=["State", "District", "Village"])
+    in one pass: each rule becomes a boolean column, then one groupby sums them all.
+    Returns {partition key tuple: counts}, partitions in first-appearance order.
+    """
+    if df.empty:
+        return {}
+
+    severe_exact = (df["Severity"] == "Severe").to_numpy()
+    flags = pd.DataFrame({
+        "waterborne": _row_contains(df["Symptoms"], "Diarrhea|Vomiting"),
+        "fever": _row_contains(df["Symptoms"], "Fever"),
+        "cough": _row_contains(df["Symptoms"], "Cough"),
+        "severe": _row_contains(df["Severity"], "Severe"),
+        "poor_water": _row_contains(df["Water Quality"], "Poor"),
+        "no_treatment": _row_contains(df["Treatment Given"], "No Treatment"),
+        "children_severe": (df["Age"] < 10).to_numpy() & severe_exact,
+    }, index=df.index)
+    keys = [df[column] for column in by]
+
+    grouped = flags.groupby(keys, sort=False, dropna=False)
+    # sizes come from the same groupby, so row i of sums and sizes is the same partition
+    sums = grouped.sum().assign(total=grouped.size().to_numpy())
+
+    # Rule 4 per partition: group by (partition, water source code); pairs come out in
+    # first-appearance order, so each partition keeps its own unique() order of sources
+    source_codes, source_values = pd.factorize(df["Water Source"])
+    severe_by_pair = (
+        pd.Series(severe_exact, index=df.index)
+        .groupby(keys + [pd.Series(source_codes, index=df.index)], sort=False, dropna=False)
+        .sum()
+    )
+
+    partitions = {}
+    for key, row in zip(sums.index, sums.itertuples(index=False)):
+        counts = {name: int(value) for name, value in zip(sums.columns, row)}
+        counts["severe_by_source"] = {}
+        partitions[_partition_key(key)] = counts
+
+    for pair, n in severe_by_pair.items():
+        *key, code = pair
+        if code >= 0:
+            partitions[_partition_key(key)]["severe_by_source"][source_values[code]] = int(n)
+    return partitions
+
+
+def evaluate_rules(counts: dict) -> list[RuleResult]:
+    """Apply the thresholds to compute_rule_counts() output, in the order alerts are reported"""
+    total = counts["total"]
+    results = []
 
     # --- Rule 1: Diarrhea / Vomiting cluster (possible waterborne outbreak) ---
-    waterborne_count = df[df["Symptoms"].str.contains("Diarrhea|Vomiting", case=False, na=False)].shape[0]
-    if waterborne_count >= 0.1 * len(df):  # >10% population
-        alerts.append(f"Possible Waterborne Outbreak: {waterborne_count} cases of Diarrhea/Vomiting detected")
+    threshold = 0.1 * total  # >10% population
+    results.append(RuleResult(
+        rule_id="waterborne_outbreak",
+        triggered=counts["waterborne"] >= threshold,
+        counts={"waterborne": counts["waterborne"], "total": total},
+        threshold=threshold,
+        message=f"Possible Waterborne Outbreak: {counts['waterborne']} cases of Diarrhea/Vomiting detected",
+    ))
 
     # --- Rule 2: Fever + Cough cluster (flu/viral outbreak) ---
-    flu_count = df[df["Symptoms"].str.contains("Fever", case=False, na=False)].shape[0]
-    cough_count = df[df["Symptoms"].str.contains("Cough", case=False, na=False)].shape[0]
-    if (flu_count + cough_count) >= 0.15 * len(df):  # >15% population
-        alerts.append(f"Possible Flu/Viral Outbreak: {flu_count} fever + {cough_count} cough cases")
+    threshold = 0.15 * total  # >15% population
+    results.append(RuleResult(
+        rule_id="flu_outbreak",
+        triggered=(counts["fever"] + counts["cough"]) >= threshold,
+        counts={"fever": counts["fever"], "cough": counts["cough"], "total": total},
+        threshold=threshold,
+        message=f"Possible Flu/Viral Outbreak: {counts['fever']} fever + {counts['cough']} cough cases",
+    ))
 
     # --- Rule 3: Multiple Severe cases (>5%) ---
-    severe_cases = df[df["Severity"].str.contains("Severe", case=False, na=False)].shape[0]
-    if severe_cases >= 0.05 * len(df):
-        alerts.append(f"High Severity Alert: {severe_cases} severe cases found")
+    threshold = 0.05 * total
+    results.append(RuleResult(
+        rule_id="high_severity",
+        triggered=counts["severe"] >= threshold,
+        counts={"severe": counts["severe"], "total": total},
+        threshold=threshold,
+        message=f"High Severity Alert: {counts['severe']} severe cases found",
+    ))
 
     # --- Rule 4: Water Source Specific Outbreak ---
-    for source in df["Water Source"].unique():
-        subset = df[df["Water Source"] == source]
-        severe_in_source = subset[subset["Severity"] == "Severe"].shape[0]
-        if severe_in_source >= 3:  # threshold
-            alerts.append(f"Outbreak Alert in {source}: {severe_in_source} severe cases")
+    for source, severe_in_source in counts["severe_by_source"].items():
+        results.append(RuleResult(
+            rule_id="water_source_outbreak",
+            triggered=severe_in_source >= 3,  # threshold
+            counts={"severe": severe_in_source},
+            threshold=3,
+            message=f"Outbreak Alert in {source}: {severe_in_source} severe cases",
+            water_source=str(source),
+        ))
 
     # --- Rule 5: Poor water quality + many illnesses ---
-    poor_water = df[df["Water Quality"].str.contains("Poor", case=False, na=False)].shape[0]
-    if poor_water >= 0.2 * len(df):  # 20% data has poor water
-        alerts.append(f"Poor Water Quality Alert: {poor_water} entries marked poor")
+    threshold = 0.2 * total  # 20% data has poor water
+    results.append(RuleResult(
+        rule_id="poor_water_quality",
+        triggered=counts["poor_water"] >= threshold,
+        counts={"poor_water": counts["poor_water"], "total": total},
+        threshold=threshold,
+        message=f"Poor Water Quality Alert: {counts['poor_water']} entries marked poor",
+    ))
 
     # --- Rule 6: Lack of Treatment cases ---
-    no_treatment = df[df["Treatment Given"].str.contains("No Treatment", case=False, na=False)].shape[0]
-    if no_treatment >= 0.1 * len(df):  # >10% not treated
-        alerts.append(f"Health Risk: {no_treatment} people received no treatment")
+    threshold = 0.1 * total  # >10% not treated
+    results.append(RuleResult(
+        rule_id="no_treatment",
+        triggered=counts["no_treatment"] >= threshold,
+        counts={"no_treatment": counts["no_treatment"], "total": total},
+        threshold=threshold,
+        message=f"Health Risk: {counts['no_treatment']} people received no treatment",
+    ))
 
     # --- Rule 7: Children at risk (<10 age + severe symptoms) ---
-    children_severe = df[(df["Age"] < 10) & (df["Severity"] == "Severe")].shape[0]
-    if children_severe > 0:
-        alerts.append(f"Child Health Risk: {children_severe} severe cases in children (<10 yrs)")
-
-    # --- Final Output ---
-    if alerts:
-        return "\n".join(alerts)
-    else:
-        return "No outbreak alerts. Situation normal."
+    results.append(RuleResult(
+        rule_id="child_risk",
+        triggered=counts["children_severe"] > 0,
+        counts={"children_severe": counts["children_severe"]},
+        threshold=0,
+        message=f"Child Health Risk: {counts['children_severe']} severe cases in children (<10 yrs)",
+    ))
+
+    return results
+
+
+def alerts_text(results: list[RuleResult]) -> str:
+    """The newline-joined messages of the rules that fired"""
+    alerts = [r.message for r in results if r.triggered]
+    return "\n".join(alerts) if alerts else NORMAL_MESSAGE
+
+
+def evaluate_health_rules(df: pd.DataFrame) -> list[RuleResult]:
+    return evaluate_rules(compute_rule_counts(df))
+
+
+def generate_health_alerts(df: pd.DataFrame) -> str:
+    return alerts_text(evaluate_health_rules(df))